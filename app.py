@@ -1,6 +1,14 @@
+from config import config
 from src.frontend.frontend import create_app
 
 app = create_app()
 
 if __name__ == "__main__":
-    app.run(host='0.0.0.0', port=8080, debug=False)
\ No newline at end of file
+    if config.SERVER_MODE == "asgi":
+        import uvicorn
+        from src.frontend.asgi import create_asgi_app
+
+        # loop="auto" uses uvloop and httptools when they are installed (not available on Windows)
+        uvicorn.run(create_asgi_app(app), host='0.0.0.0', port=config.SERVER_PORT, loop="auto", http="auto")
+    else:
+        app.run(host='0.0.0.0', port=config.SERVER_PORT, debug=False)
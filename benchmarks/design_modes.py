@@ -0,0 +1,111 @@
+"""
+Compare the two design modes ("two_step" CEO -> CPO vs. "single" structured call):
+design latency, and the pass rate / fix attempts of the downstream fix loop.
+
+Usage:
+    python -m benchmarks.design_modes --provider openai --model gpt-4o-mini --runs 3
+    python -m benchmarks.design_modes --skip-fix   # design latency only
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from config import config
+from src.design.chains import DESIGN_MODES, run_design_phase
+from src.generation.core import run_core_phase
+from src.llm.errors import LLMCallError
+from src.testing.fixer import run_fix_loop
+
+
+DEFAULT_IDEAS = [
+    "A snake game",
+    "A platformer where a red square jumps over spikes to reach the green door",
+    "8 Ball Pool",
+    "Breakout with power-ups",
+    "A space shooter with waves of enemies",
+]
+
+
+def run_once(idea: str, mode: str, provider: str, model: str, skip_fix: bool) -> dict:
+    record = {"mode": mode, "idea": idea, "design_seconds": None, "passed": False, "fix_attempts": 0, "error": None}
+    try:
+        started = time.perf_counter()
+        gdd = run_design_phase(idea, provider, model, mode=mode)
+        record["design_seconds"] = time.perf_counter() - started
+
+        if skip_fix:
+            return record
+
+        output_dir = tempfile.mkdtemp(prefix=f"bench_{mode}_")
+        file_path = run_core_phase(gdd, provider, model, output_dir=output_dir)
+        if not file_path:
+            record["error"] = "no code"
+            return record
+
+        for message in run_fix_loop(gdd, file_path, provider, model):
+            if "嘗試修復中" in message:
+                record["fix_attempts"] += 1
+            if "RESULT_SUCCESS" in message:
+                record["passed"] = True
+    except LLMCallError as e:
+        record["error"] = str(e)
+    return record
+
+
+def summarize(records: list[dict], skip_fix: bool):
+    print()
+    print(f"{'mode':<10} {'runs':>5} {'design p50 (s)':>15} {'design mean (s)':>16} {'pass rate':>10} {'avg fixes':>10} {'errors':>7}")
+    for mode in DESIGN_MODES:
+        rows = [r for r in records if r["mode"] == mode]
+        if not rows:
+            continue
+        latencies = [r["design_seconds"] for r in rows if r["design_seconds"] is not None]
+        p50 = statistics.median(latencies) if latencies else float("nan")
+        mean = statistics.mean(latencies) if latencies else float("nan")
+        errors = sum(1 for r in rows if r["error"])
+        if skip_fix:
+            pass_rate, avg_fixes = "-", "-"
+        else:
+            pass_rate = f"{sum(r['passed'] for r in rows) / len(rows):.0%}"
+            avg_fixes = f"{statistics.mean(r['fix_attempts'] for r in rows):.2f}"
+        print(f"{mode:<10} {len(rows):>5} {p50:>15.2f} {mean:>16.2f} {pass_rate:>10} {avg_fixes:>10} {errors:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the design modes")
+    parser.add_argument("--provider", default="openai")
+    parser.add_argument("--model", default=None, help="Default: <PROVIDER>_MODEL_NAME from .env")
+    parser.add_argument("--runs", type=int, default=1, help="Runs per idea and mode")
+    parser.add_argument("--ideas", default=None, help="Text file with one game idea per line")
+    parser.add_argument("--skip-fix", action="store_true", help="Only measure the design phase")
+    args = parser.parse_args()
+
+    # Every run does all the work, a repeated idea must not reuse the design or the verdicts of a previous run
+    config.CHECKPOINTS_ENABLED = False
+    config.SEMANTIC_CACHE_ENABLED = False
+    config.VALIDATION_CACHE_ENABLED = False
+    config.RAG_ENABLED = False
+
+    model = args.model or os.getenv(f"{args.provider.upper()}_MODEL_NAME", "gpt-4o-mini")
+    ideas = DEFAULT_IDEAS
+    if args.ideas:
+        with open(args.ideas, "r", encoding="utf-8") as f:
+            ideas = [line.strip() for line in f if line.strip()]
+
+    records = []
+    for _ in range(args.runs):
+        for idea in ideas:
+            # Alternate the modes so provider latency drift affects both equally
+            for mode in DESIGN_MODES:
+                record = run_once(idea, mode, args.provider, model, args.skip_fix)
+                print(f"[Bench] {mode:<9} {idea[:40]:<40} design={record['design_seconds']} "
+                      f"passed={record['passed']} fixes={record['fix_attempts']} error={record['error']}")
+                records.append(record)
+
+    summarize(records, args.skip_fix)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+A local stand-in LLM provider for the benchmarks: replays recorded (or built-in) responses per pipeline stage,
+with configurable latency, token rate and error injection, so the pipeline can be measured without API calls.
+"""
+import json
+import random
+import threading
+import time
+
+from src.design.prompts import CEO_PROMPT, CPO_PROMPT, DESIGN_PROMPT
+from src.generation.prompts import ART_PROMPT, PROGRAMMER_PROMPT_TEMPLATE, FUZZER_GENERATION_PROMPT
+from src.llm.errors import LLMCallError, RateLimitedError
+from src.llm.result import LLMResult
+from src.llm.tokens import count_tokens
+from src.testing.prompts import FIXER_PROMPT, LOGIC_REVIEW_PROMPT, LOGIC_FIXER_PROMPT, PERFORMANCE_FIXER_PROMPT
+from src.utils import _dispatch_llm, register_provider
+
+
+FAKE_PROVIDER = "fake"
+RECORD_PROVIDER = "record"
+
+# The stage of a request is recognized by its (static) system prompt
+STAGE_BY_PROMPT = {
+    CEO_PROMPT: "ceo",
+    CPO_PROMPT: "cpo",
+    DESIGN_PROMPT: "design",
+    ART_PROMPT: "art",
+    PROGRAMMER_PROMPT_TEMPLATE: "code",
+    FUZZER_GENERATION_PROMPT: "fuzzer_logic",
+    FIXER_PROMPT: "fix",
+    LOGIC_REVIEW_PROMPT: "review",
+    LOGIC_FIXER_PROMPT: "logic_fix",
+    PERFORMANCE_FIXER_PROMPT: "performance_fix",
+}
+
+_GDD = {
+    "title": "Paddle Bounce",
+    "core_loop": "A start screen shows the title. The player moves a paddle to keep a ball in play; "
+                 "missing the ball ends the game.",
+    "states": ["START", "PLAYING", "GAME_OVER"],
+    "controls": [{"input": "Left / Right Arrow Keys", "action": "Move the paddle"}],
+    "constraints": ["The paddle stays inside the screen"],
+    "entities": [{"name": "Paddle", "description": "Controlled by the player, bounces the ball"},
+                 {"name": "Ball", "description": "Bounces off the walls and the paddle"}],
+    "win_conditions": ["Bounce the ball 20 times, show a yellow 'YOU WIN' text"],
+    "loss_conditions": ["The ball falls below the paddle, show a yellow 'GAME OVER' text"],
+}
+
+_GAME_CODE = '''```python
+import pygame
+import sys
+
+WIDTH, HEIGHT = 800, 600
+FPS = 60
+
+
+class Paddle(pygame.sprite.Sprite):
+    def __init__(self):
+        super().__init__()
+        self.rect = pygame.Rect(WIDTH // 2 - 50, HEIGHT - 40, 100, 15)
+
+    def update(self, *args):
+        keys = pygame.key.get_pressed()
+        if keys[pygame.K_LEFT]:
+            self.rect.x -= 7
+        if keys[pygame.K_RIGHT]:
+            self.rect.x += 7
+        self.rect.clamp_ip(pygame.Rect(0, 0, WIDTH, HEIGHT))
+
+
+def draw_text(screen, text, size, color, x, y):
+    font = pygame.font.Font(None, size)
+    surface = font.render(text, True, color)
+    screen.blit(surface, surface.get_rect(center=(x, y)))
+
+
+def main():
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    clock = pygame.time.Clock()
+    game_state = "START"
+    paddle = Paddle()
+    ball = pygame.Rect(WIDTH // 2, HEIGHT // 2, 12, 12)
+    velocity = [4, -4]
+    bounces = 0
+
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            if game_state == "START" and event.type in (pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN):
+                game_state = "PLAYING"
+            elif game_state == "GAME_OVER" and event.type == pygame.KEYDOWN and event.key == pygame.K_r:
+                game_state, bounces = "START", 0
+                ball.center = (WIDTH // 2, HEIGHT // 2)
+
+        screen.fill((0, 0, 0))
+        if game_state == "START":
+            draw_text(screen, "PADDLE BOUNCE", 64, (255, 255, 255), WIDTH // 2, HEIGHT // 2)
+        elif game_state == "PLAYING":
+            paddle.update()
+            ball.x += velocity[0]
+            ball.y += velocity[1]
+            if ball.left <= 0 or ball.right >= WIDTH:
+                velocity[0] = -velocity[0]
+            if ball.top <= 0:
+                velocity[1] = -velocity[1]
+            if ball.colliderect(paddle.rect) and velocity[1] > 0:
+                velocity[1] = -velocity[1]
+                bounces += 1
+            if ball.top > HEIGHT or bounces >= 20:
+                game_state = "GAME_OVER"
+            pygame.draw.rect(screen, (0, 255, 0), paddle.rect)
+            pygame.draw.circle(screen, (255, 0, 0), ball.center, 6)
+        elif game_state == "GAME_OVER":
+            text = "YOU WIN" if bounces >= 20 else "GAME OVER"
+            draw_text(screen, text, 64, (255, 255, 0), WIDTH // 2, HEIGHT // 2)
+
+        pygame.display.flip()
+        clock.tick(FPS)
+
+    pygame.quit()
+    sys.exit()
+
+
+if __name__ == "__main__":
+    main()
+```'''
+
+# Built-in responses, used for the stages missing from the recording
+DEFAULT_RESPONSES = {
+    "ceo": ["- Core fun: keeping a ball alive\n- Loop: move, bounce, score\n- Goal: 20 bounces"],
+    "cpo": [json.dumps(_GDD)],
+    "design": [json.dumps({"analysis": "- Core fun: keeping a ball alive", "gdd": _GDD})],
+    "art": [json.dumps({"background_color": [0, 0, 0],
+                        "player": {"shape": "rect", "color": [0, 255, 0], "size": [100, 15]},
+                        "ball": {"shape": "circle", "color": [255, 0, 0], "size": [12, 12]}})],
+    "code": [_GAME_CODE],
+    "fuzzer_logic": ["```python\nif random.random() < 0.2:\n"
+                     "    _k = random.choice([pygame.K_LEFT, pygame.K_RIGHT])\n"
+                     "    pygame.event.post(pygame.event.Event(pygame.KEYDOWN, {'key': _k, 'unicode': ''}))\n```"],
+    "fix": [_GAME_CODE],
+    "review": ["PASS"],
+    "logic_fix": [_GAME_CODE],
+    "performance_fix": [_GAME_CODE],
+}
+
+
+class FakeProvider:
+    """
+    Replay responses by stage with a simulated latency:
+    latency + completion tokens / token_rate seconds (time to first token + generation time).
+    """
+
+    def __init__(self, responses: dict[str, list[str]] | None = None, latency: float = 0.5,
+                 token_rate: float = 100.0, error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 seed: int | None = None):
+        self.responses = {**DEFAULT_RESPONSES, **(responses or {})}
+        self.latency = latency
+        self.token_rate = token_rate
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self._random = random.Random(seed)
+        self._counters: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _next_response(self, stage: str) -> str:
+        candidates = self.responses.get(stage) or [""]
+        with self._lock:
+            index = self._counters.get(stage, 0)
+            self._counters[stage] = index + 1
+        return candidates[index % len(candidates)]
+
+    def __call__(self, system_prompt: str, user_prompt: str, model: str, temperature: float,
+                 max_tokens: int) -> LLMResult:
+        stage = STAGE_BY_PROMPT.get(system_prompt, "unknown")
+        with self._lock:
+            roll = self._random.random()
+
+        if roll < self.rate_limit_rate:
+            time.sleep(self.latency / 10)
+            raise RateLimitedError(f"Fake 429 ({stage})", retry_after=1.0)
+        if roll < self.rate_limit_rate + self.error_rate:
+            time.sleep(self.latency)
+            raise LLMCallError(f"LLM Call Error ({FAKE_PROVIDER}): injected error ({stage})")
+
+        content = self._next_response(stage)
+        prompt_tokens = count_tokens(system_prompt) + count_tokens(user_prompt)
+        completion_tokens = min(count_tokens(content), max_tokens)
+        time.sleep(self.latency + (completion_tokens / self.token_rate if self.token_rate > 0 else 0))
+
+        return LLMResult(content=content, provider=FAKE_PROVIDER, model=model, finish_reason="stop",
+                         usage={"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                                "total_tokens": prompt_tokens + completion_tokens})
+
+
+class RecordingProvider:
+    """Forward the requests to a real provider/model and keep the responses by stage, for later replay."""
+
+    def __init__(self, provider: str, model: str):
+        self.provider = provider
+        self.model = model
+        self.recorded: dict[str, list[str]] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, system_prompt: str, user_prompt: str, model: str, temperature: float,
+                 max_tokens: int) -> LLMResult:
+        result = _dispatch_llm(system_prompt, user_prompt, self.provider, self.model, temperature, max_tokens)
+        stage = STAGE_BY_PROMPT.get(system_prompt, "unknown")
+        with self._lock:
+            self.recorded.setdefault(stage, []).append(result.content)
+        return result
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.recorded, f, ensure_ascii=False, indent=2)
+
+
+def load_responses(path: str | None) -> dict[str, list[str]]:
+    """Load recorded responses ({"stage": ["response", ...]}), the format written by RecordingProvider.save."""
+    if not path:
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return {stage: responses if isinstance(responses, list) else [responses] for stage, responses in data.items()}
+
+
+def register_fake_provider(**kwargs) -> FakeProvider:
+    """Register a FakeProvider as the "fake" provider of call_llm."""
+    provider = FakeProvider(**kwargs)
+    register_provider(FAKE_PROVIDER, provider, context_window=128000)
+    return provider
+
+
+def register_recording_provider(provider: str, model: str) -> RecordingProvider:
+    """Register a RecordingProvider as the "record" provider of call_llm."""
+    recorder = RecordingProvider(provider, model)
+    register_provider(RECORD_PROVIDER, recorder, context_window=128000)
+    return recorder
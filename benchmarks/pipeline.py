@@ -0,0 +1,190 @@
+"""
+End-to-end pipeline benchmark: design -> core -> fix loop at a given concurrency, against the local fake provider
+(no API cost) or a real one. Reports p50/p95/p99 per stage, runs/minute and peak RSS.
+
+Usage:
+    python -m benchmarks.pipeline --runs 20 --concurrency 4 --latency 0.5 --token-rate 80
+    python -m benchmarks.pipeline --runs 20 --concurrency 8 --error-rate 0.05 --rate-limit-rate 0.1
+    python -m benchmarks.pipeline --responses recorded.json --fuzz-seconds 5
+    # Route the small stages to another model
+    python -m benchmarks.pipeline --provider openai --model gpt-4o --route review=ollama:llama3:8b \
+        --route fuzz_logic=ollama:llama3:8b
+    # Record real responses for later replay
+    python -m benchmarks.pipeline --record recorded.json --provider openai --model gpt-4o-mini --runs 3
+"""
+import argparse
+import math
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import config
+from benchmarks.design_modes import DEFAULT_IDEAS
+from benchmarks.fake_provider import FAKE_PROVIDER, RECORD_PROVIDER, load_responses, register_fake_provider, \
+    register_recording_provider
+from src.design.chains import run_design_phase
+from src.generation.core import run_core_phase
+from src.llm.errors import LLMCallError
+from src.llm.routing import ModelRouting, ROUTE_DESIGN, format_stage_routes, parse_stage_routes
+from src.testing.fixer import run_fix_loop
+
+
+STAGES = ("design", "core", "fix", "total")
+
+
+def percentile(samples: list[float], percent: float) -> float:
+    """Nearest-rank percentile."""
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    rank = math.ceil(percent / 100 * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+def peak_rss_mb() -> tuple[float, float]:
+    """
+    :return: (peak RSS of this process, peak RSS of the largest child process e.g. a fuzzed game) in MB
+    :rtype: tuple[float, float]
+    """
+    try:
+        import resource
+    except ImportError:
+        # Not available on Windows
+        return float("nan"), float("nan")
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale)
+
+
+def run_pipeline(index: int, idea: str, provider: str, model: str, skip_fix: bool,
+                 stage_models: dict | None = None) -> dict:
+    record = {"index": index, "timings": {}, "passed": False, "error": None}
+    output_dir = tempfile.mkdtemp(prefix=f"bench_run{index}_")
+    routing = ModelRouting(provider, model, stage_models)
+    designer = routing.route(ROUTE_DESIGN)
+    started = time.perf_counter()
+    try:
+        stage_started = time.perf_counter()
+        gdd = run_design_phase(idea, designer.provider, designer.model, fallbacks=designer.fallbacks)
+        record["timings"]["design"] = time.perf_counter() - stage_started
+
+        stage_started = time.perf_counter()
+        file_path = run_core_phase(gdd, provider, model, output_dir=output_dir, routing=routing)
+        record["timings"]["core"] = time.perf_counter() - stage_started
+        if not file_path:
+            record["error"] = "no code"
+            return record
+
+        if not skip_fix:
+            stage_started = time.perf_counter()
+            for message in run_fix_loop(gdd, file_path, provider, model, routing=routing):
+                if "RESULT_SUCCESS" in message:
+                    record["passed"] = True
+            record["timings"]["fix"] = time.perf_counter() - stage_started
+
+        record["timings"]["total"] = time.perf_counter() - started
+    except LLMCallError as e:
+        record["error"] = str(e)
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+    return record
+
+
+def report(records: list[dict], wall_seconds: float, concurrency: int):
+    completed = [r for r in records if not r["error"]]
+    print()
+    print(f"Runs: {len(records)}  completed: {len(completed)}  errors: {len(records) - len(completed)}  "
+          f"passed: {sum(r['passed'] for r in records)}  concurrency: {concurrency}")
+    print(f"Wall time: {wall_seconds:.1f}s  throughput: {len(completed) / wall_seconds * 60:.2f} runs/min")
+
+    print(f"\n{'stage':<8} {'n':>4} {'p50 (s)':>9} {'p95 (s)':>9} {'p99 (s)':>9} {'max (s)':>9}")
+    for stage in STAGES:
+        samples = [r["timings"][stage] for r in records if stage in r["timings"]]
+        if not samples:
+            continue
+        print(f"{stage:<8} {len(samples):>4} {percentile(samples, 50):>9.2f} {percentile(samples, 95):>9.2f} "
+              f"{percentile(samples, 99):>9.2f} {max(samples):>9.2f}")
+
+    errors = {}
+    for r in records:
+        if r["error"]:
+            errors[r["error"][:80]] = errors.get(r["error"][:80], 0) + 1
+    for error, count in sorted(errors.items(), key=lambda item: -item[1]):
+        print(f"  {count} x {error}")
+
+    self_rss, child_rss = peak_rss_mb()
+    print(f"\nPeak RSS: {self_rss:.1f} MB (harness)  {child_rss:.1f} MB (largest child process)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the generation pipeline")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--provider", default=FAKE_PROVIDER, help="fake (default) or a real provider")
+    parser.add_argument("--model", default="fake-model")
+    parser.add_argument("--responses", default=None, help="Recorded responses to replay (JSON)")
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake time to first token (s)")
+    parser.add_argument("--token-rate", type=float, default=100.0, help="Fake output tokens per second")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of failing fake requests")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of fake HTTP 429 answers")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--fuzz-seconds", type=int, default=5, help="Duration of each fuzz test")
+    parser.add_argument("--skip-fix", action="store_true", help="Do not run the fix loop")
+    parser.add_argument("--record", default=None, help="Record the responses of --provider/--model to this file")
+    parser.add_argument("--route", action="append", default=[], metavar="STAGE=PROVIDER:MODEL",
+                        help="Route a stage (design, art, code, fuzz_logic, review, fix) to another model")
+    args = parser.parse_args()
+    try:
+        stage_models = parse_stage_routes(dict(route.split("=", 1) for route in args.route))
+    except ValueError as e:
+        parser.error(f"--route: {e}")
+
+    # Measure the pipeline itself: every run does all the work
+    config.CHECKPOINTS_ENABLED = False
+    config.SEMANTIC_CACHE_ENABLED = False
+    config.VALIDATION_CACHE_ENABLED = False
+    config.RAG_ENABLED = False
+    config.LLM_FALLBACKS = []
+    config.LLM_HEDGE_ENABLED = False
+    config.FUZZER_RUNNING_TIME = args.fuzz_seconds
+
+    provider, model = args.provider, args.model
+    recorder = None
+    if args.record:
+        recorder = register_recording_provider(args.provider, args.model)
+        provider = RECORD_PROVIDER
+    elif provider == FAKE_PROVIDER:
+        register_fake_provider(responses=load_responses(args.responses), latency=args.latency,
+                               token_rate=args.token_rate, error_rate=args.error_rate,
+                               rate_limit_rate=args.rate_limit_rate, seed=args.seed)
+
+    lock = threading.Lock()
+    records = []
+
+    def task(index: int):
+        record = run_pipeline(index, DEFAULT_IDEAS[index % len(DEFAULT_IDEAS)], provider, model, args.skip_fix,
+                              format_stage_routes(stage_models))
+        with lock:
+            records.append(record)
+            print(f"[Bench] run {index}: {', '.join(f'{k}={v:.2f}s' for k, v in record['timings'].items())} "
+                  f"passed={record['passed']} error={record['error']}")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(task, range(args.runs)))
+    wall_seconds = time.perf_counter() - started
+
+    report(records, wall_seconds, args.concurrency)
+    if recorder is not None:
+        recorder.save(args.record)
+        print(f"Recorded responses saved to {args.record}")
+
+
+if __name__ == "__main__":
+    main()
@@ -20,6 +20,42 @@ def get_env_int(var_name, default=0):
         return default
 
 
+def get_env_float(var_name, default=0.0):
+    """將環境變數轉換為 Float"""
+    try:
+        return float(os.getenv(var_name, default))
+    except (ValueError, TypeError):
+        return default
+
+
+def get_env_rate_limit(provider, rpm=0, tpm=0, max_concurrency=0):
+    """
+    讀取 Provider 的速率限制 (requests/min, tokens/min, 最大同時請求數)，0 代表不限制
+    可用 <PROVIDER>_RPM, <PROVIDER>_TPM, <PROVIDER>_MAX_CONCURRENCY 覆蓋預設值
+    """
+    prefix = provider.upper()
+    return (
+        get_env_int(f"{prefix}_RPM", rpm),
+        get_env_int(f"{prefix}_TPM", tpm),
+        get_env_int(f"{prefix}_MAX_CONCURRENCY", max_concurrency),
+    )
+
+
+def parse_route_list(value):
+    """
+    解析 "provider:model,provider:model" 格式的 LLM 路由清單
+    只用第一個冒號分隔 provider，因此 model 名稱可以包含冒號 (例如 ollama:llama3:8b)
+    """
+    routes = []
+    for item in (value or "").split(","):
+        item = item.strip()
+        if not item or ":" not in item:
+            continue
+        provider, model = item.split(":", 1)
+        routes.append((provider.strip().lower(), model.strip()))
+    return routes
+
+
 def get_env_ssl_verify(var_name, default=True):
     """
     處理特殊的 SSL_VERIFY:
@@ -60,13 +96,94 @@ class Config:
     DEEPSEEK_MODEL_NAME = os.getenv("DEEPSEEK_MODEL_NAME", "deepseek-chat")
     INCEPTION_MODEL_NAME = os.getenv("INCEPTION_MODEL_NAME", "inception")
 
+    # LLM rate limits: (requests/min, tokens/min, max concurrent requests) per provider
+    LLM_RATE_LIMITS = {
+        "openai": get_env_rate_limit("openai", 500, 200000, 8),
+        "groq": get_env_rate_limit("groq", 30, 30000, 4),
+        "google": get_env_rate_limit("google", 15, 1000000, 4),
+        "mistral": get_env_rate_limit("mistral", 60, 500000, 4),
+        "deepseek": get_env_rate_limit("deepseek", 0, 0, 8),
+        "inception": get_env_rate_limit("inception", 60, 0, 4),
+        "ollama": get_env_rate_limit("ollama", 0, 0, 2),
+    }
+    # Retries on HTTP 429 (Retry-After is honored, otherwise exponential backoff)
+    LLM_MAX_RETRIES = get_env_int("LLM_MAX_RETRIES", 5)
+    # Retries of connection errors / HTTP 5xx, kept low so a provider which is down fails over quickly
+    LLM_TRANSIENT_RETRIES = get_env_int("LLM_TRANSIENT_RETRIES", 2)
+    LLM_BACKOFF_MAX_SECONDS = get_env_int("LLM_BACKOFF_MAX_SECONDS", 60)
+    # Completion tokens reserved in the tokens/min bucket per request
+    LLM_COMPLETION_TOKEN_ESTIMATE = get_env_int("LLM_COMPLETION_TOKEN_ESTIMATE", 2048)
+
+    # Failover / hedged requests, e.g. LLM_FALLBACKS="groq:llama-3.1-8b-instant,ollama:llama3:8b"
+    LLM_FALLBACKS = parse_route_list(os.getenv("LLM_FALLBACKS"))
+    LLM_HEDGE_ENABLED = get_env_bool("LLM_HEDGE_ENABLED", False)
+    LLM_HEDGE_PERCENTILE = get_env_float("LLM_HEDGE_PERCENTILE", 95)
+    LLM_HEDGE_DEFAULT_DELAY = get_env_float("LLM_HEDGE_DEFAULT_DELAY", 60)
+    LLM_HEDGE_MIN_DELAY = get_env_float("LLM_HEDGE_MIN_DELAY", 2)
+    LLM_HEDGE_WORKERS = get_env_int("LLM_HEDGE_WORKERS", 16)
+
+    # Per-stage model routing (design, art, code, fuzz_logic, review, fix), e.g. LLM_ROUTE_REVIEW="ollama:llama3:8b"
+    # The first route is the model of the stage, the others are its fallbacks. Unset stages use the model of the form
+    LLM_STAGE_ROUTES = {stage: parse_route_list(os.getenv(f"LLM_ROUTE_{stage.upper()}"))
+                        for stage in ("design", "art", "code", "fuzz_logic", "review", "fix")}
+
     # OLLAMA
     OLLAMA_BASE_URL =  os.getenv("OLLAMA_BASE_URL", "http://localhost:11434/v1")
     OLLAMA_API_KEY = os.getenv("OLLAMA_API_KEY")
     OLLAMA_MODEL_NAME = os.getenv("OLLAMA_MODEL_NAME", "llama3:8b")
+    # Keep the model loaded between calls so the KV cache of the static prompts can be reused
+    OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+    # num_ctx starts at OLLAMA_NUM_CTX and doubles (up to OLLAMA_MAX_NUM_CTX) only when a prompt needs it
+    OLLAMA_NUM_CTX = get_env_int("OLLAMA_NUM_CTX", 8192)
+    OLLAMA_MAX_NUM_CTX = get_env_int("OLLAMA_MAX_NUM_CTX", 32768)
+
+    # Tokenizer for prompt token accounting (tokenizer.json path or Hugging Face name), estimated when unset
+    LLM_TOKENIZER = os.getenv("LLM_TOKENIZER")
+
+    # Design phase: "two_step" (CEO -> CPO) or "single" (one structured call)
+    DESIGN_MODE = os.getenv("DESIGN_MODE", "two_step")
+
+    # Web server: "wsgi" (Flask server, a thread per request) or "asgi" (uvicorn, async job streams)
+    SERVER_MODE = os.getenv("SERVER_MODE", "wsgi")
+    SERVER_PORT = get_env_int("SERVER_PORT", 8080)
+
+    # Output directory of the generated games
+    OUTPUT_DIR = os.getenv("OUTPUT_DIR", "output")
+    # Content-addressed store of the GDD / code / fix history of each run
+    ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", os.path.join(OUTPUT_DIR, "artifacts"))
+    # Reuse the output of completed pipeline stages for the same input (resume after a restart / failure)
+    CHECKPOINTS_ENABLED = get_env_bool("CHECKPOINTS_ENABLED", True)
 
     # Fuzzer
     FUZZER_RUNNING_TIME = 30
+    # Scripted START -> PLAYING -> GAME_OVER -> R (restart) check in fast-forward, before the fuzz test
+    CONFORMANCE_ENABLED = get_env_bool("CONFORMANCE_ENABLED", True)
+    CONFORMANCE_TIMEOUT = get_env_int("CONFORMANCE_TIMEOUT", 20)
+    # Cache of the check verdicts by sha256(code + fuzz logic + check version), shared through the artifact store
+    VALIDATION_CACHE_ENABLED = get_env_bool("VALIDATION_CACHE_ENABLED", True)
+    # Run the fuzz test and the LLM logic review of the fix loop concurrently
+    FIX_PARALLEL_CHECKS = get_env_bool("FIX_PARALLEL_CHECKS", True)
+    # Budget of one fix loop run (0 = unlimited): wall time, LLM tokens, number of fixes
+    FIX_MAX_SECONDS = get_env_int("FIX_MAX_SECONDS", 600)
+    FIX_MAX_TOKENS = get_env_int("FIX_MAX_TOKENS", 100000)
+    FIX_MAX_ATTEMPTS = get_env_int("FIX_MAX_ATTEMPTS", 3)
+    # LLM logic review in the fix loop: "gated" (only when the fuzz run could not verify a live game), "always", "never"
+    LOGIC_REVIEW_MODE = os.getenv("LOGIC_REVIEW_MODE", "gated")
+    # Collect the coverage of the game and bias the random inputs toward code not reached yet
+    FUZZER_COVERAGE_GUIDED = get_env_bool("FUZZER_COVERAGE_GUIDED", True)
+    # Profile frame time / sprite groups / memory while fuzzing, findings are sent to the fixer as performance errors
+    FUZZER_PROFILE_ENABLED = get_env_bool("FUZZER_PROFILE_ENABLED", True)
+    # p95 update + draw time per frame (33.3 ms = 30 FPS on a weak laptop)
+    FUZZER_FRAME_BUDGET_MS = get_env_float("FUZZER_FRAME_BUDGET_MS", 33.3)
+    # Steady growth of the traced Python memory flagged as a leak
+    FUZZER_MEMORY_GROWTH_MB = get_env_float("FUZZER_MEMORY_GROWTH_MB", 20.0)
+
+    # Background generation jobs (SQLite backed queue)
+    JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join(OUTPUT_DIR, "jobs.sqlite3"))
+    JOB_WORKERS = get_env_int("JOB_WORKERS", 2)
+    # A running job is requeued when its worker sent no heartbeat for JOB_LEASE_SECONDS (hung or dead process)
+    JOB_LEASE_SECONDS = get_env_int("JOB_LEASE_SECONDS", 60)
+    JOB_HEARTBEAT_SECONDS = get_env_int("JOB_HEARTBEAT_SECONDS", 10)
 
     # Embedding model
     LLM_EMBEDDING_PROVIDER = os.getenv("LLM_EMBEDDING_PROVIDER")
@@ -96,4 +213,16 @@ class Config:
     CF_ACCESS_CLIENT_ID = os.getenv("CF_ACCESS_CLIENT_ID", None)
     CF_ACCESS_CLIENT_SECRET = os.getenv("CF_ACCESS_CLIENT_SECRET", None)
 
+    # RAG (few-shot examples for code generation)
+    RAG_ENABLED = get_env_bool("RAG_ENABLED", False)
+    RAG_TOP_K = get_env_int("RAG_TOP_K", 3)
+    RAG_TOKEN_BUDGET = get_env_int("RAG_TOKEN_BUDGET", 1500)
+    # After a failed connection to Chroma, RAG and the semantic cache are skipped for this many seconds
+    RAG_RETRY_SECONDS = get_env_float("RAG_RETRY_SECONDS", 60.0)
+
+    # Semantic cache of validated generations (mode: "full" returns the cached game, "gdd" only reuses its GDD)
+    SEMANTIC_CACHE_ENABLED = get_env_bool("SEMANTIC_CACHE_ENABLED", False)
+    SEMANTIC_CACHE_THRESHOLD = get_env_float("SEMANTIC_CACHE_THRESHOLD", 0.92)
+    SEMANTIC_CACHE_MODE = os.getenv("SEMANTIC_CACHE_MODE", "full")
+
 config = Config()
\ No newline at end of file
@@ -0,0 +1,105 @@
+import hashlib
+from typing import Callable
+
+from config import config
+from src.artifacts.store import ArtifactStore, get_artifact_store
+
+
+# Pipeline stages with a checkpoint
+STAGE_DESIGN = "design"
+STAGE_ASSETS = "assets"
+STAGE_CODE = "code"
+STAGE_FUZZER_LOGIC = "fuzzer_logic"
+STAGE_FIX = "fix"
+
+
+def checkpoint_key(stage: str, *inputs: str) -> str:
+    """
+    :return: The hash of the stage name and every input which changes the stage output
+    :rtype: str
+    """
+    digest = hashlib.sha256(stage.encode("utf-8"))
+    for value in inputs:
+        digest.update(b"\0")
+        digest.update(str(value or "").encode("utf-8"))
+    return digest.hexdigest()
+
+
+class Checkpoints:
+    """
+    Stage outputs of one run, saved in the artifact store and keyed by the input hash of the stage.
+    A restarted run resumes after its last completed stage, and a new run with the same input
+    (the user clicking "generate" again) reuses the outputs instead of calling the LLM again.
+    The job of a crashed or redeployed process is requeued as soon as a process of the same host restarts,
+    otherwise once its lease expired (Config.JOB_LEASE_SECONDS, see JobQueue), and resumes from here.
+    With regenerate, the outputs of other runs are ignored (the user asked for a new game) and replaced
+    by the new ones, a restarted run still resumes from its own checkpoints.
+    """
+
+    def __init__(self, run_id: str, store: ArtifactStore | None = None, enabled: bool | None = None,
+                 regenerate: bool = False):
+        self.run_id = run_id
+        self.store = store or get_artifact_store()
+        self.enabled = config.CHECKPOINTS_ENABLED if enabled is None else enabled
+        self.regenerate = regenerate
+        # Stages restored from a checkpoint during this run
+        self.hits: list[str] = []
+
+    @staticmethod
+    def _scope(input_hash: str) -> str:
+        return f"ckpt-{input_hash[:48]}"
+
+    def _load_scope(self, input_hash: str) -> str:
+        if self.regenerate:
+            # Only the checkpoints of this run (run ids are 32 hex characters, scopes are at most 64)
+            return f"ckpt-{self.run_id}-{input_hash[:26]}"
+        return self._scope(input_hash)
+
+    def load(self, stage: str, input_hash: str) -> str | None:
+        """Return the saved output of the stage for this input, or None."""
+        if not self.enabled:
+            return None
+        artifact = self.store.get_run_artifact(self._load_scope(input_hash), stage)
+        return artifact[1] if artifact else None
+
+    def save(self, stage: str, input_hash: str, output: str):
+        """
+        Save the output of a completed stage, for this run and for later runs with the same input
+        (a regenerated output replaces the previous one).
+        """
+        if not self.enabled:
+            return
+        try:
+            refs = self.store.save_run_artifacts(self._scope(input_hash), **{stage: output})
+            if self.regenerate:
+                self.store.save_run_artifacts(self._load_scope(input_hash), **{stage: output})
+            self.store.save_run_artifacts(self.run_id, **{f"checkpoint.{stage}": refs[stage]})
+        except (OSError, ValueError) as e:
+            # A missing checkpoint only costs a rerun of the stage
+            print(f"[Checkpoint] 無法儲存 {stage} 檢查點: {e}")
+
+    def run(self, stage: str, inputs: tuple, produce: Callable[[], str]) -> str:
+        """
+        Return the checkpointed output of the stage, or run it and checkpoint the output.
+        :param stage: The stage name
+        :type stage: str
+
+        :param inputs: Every input which changes the stage output (prompt inputs, provider, model...)
+        :type inputs: tuple
+
+        :param produce: Runs the stage, raising on failure (failures are not checkpointed)
+        :type produce: Callable[[], str]
+
+        :return: The stage output
+        :rtype: str
+        """
+        input_hash = checkpoint_key(stage, *inputs)
+        output = self.load(stage, input_hash)
+        if output is not None:
+            print(f"[Checkpoint] 重複使用 {stage} 階段的結果")
+            self.hits.append(stage)
+            return output
+
+        output = produce()
+        self.save(stage, input_hash, output)
+        return output
@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+
+from config import config
+
+
+# Artifact names of a generation run
+ARTIFACT_GDD = "gdd"
+ARTIFACT_CODE = "code"
+ARTIFACT_FIX_HISTORY = "fix_history"
+
+_ARTIFACT_ID_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+_RUN_ID_PATTERN = re.compile(r"^[0-9A-Za-z_-]{1,64}$")
+
+
+def _atomic_write(path: str, data: bytes):
+    """Write to a temporary file and rename it, so readers never see a partial file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class ArtifactStore:
+    """
+    Content-addressed store of the run artifacts (GDD, code, fix history).
+    An artifact is saved once under its sha256, identical content is never written twice,
+    and each run keeps a small ref file mapping artifact names to ids. The session only holds the run id.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _object_path(self, artifact_id: str) -> str:
+        if not _ARTIFACT_ID_PATTERN.match(artifact_id or ""):
+            raise ValueError(f"Invalid artifact id: {artifact_id}")
+        return os.path.join(self.root, "objects", artifact_id[:2], artifact_id[2:])
+
+    def _refs_path(self, run_id: str) -> str:
+        if not _RUN_ID_PATTERN.match(run_id or ""):
+            raise ValueError(f"Invalid run id: {run_id}")
+        return os.path.join(self.root, "refs", f"{run_id}.json")
+
+    def put(self, content: str | bytes) -> str:
+        """
+        Save the content.
+        :param content: The artifact content, text is stored as UTF-8
+        :type content: str | bytes
+
+        :return: The artifact id (sha256 of the content)
+        :rtype: str
+        """
+        data = content.encode("utf-8") if isinstance(content, str) else content
+        artifact_id = hashlib.sha256(data).hexdigest()
+        path = self._object_path(artifact_id)
+        if not os.path.exists(path):
+            _atomic_write(path, data)
+        return artifact_id
+
+    def get(self, artifact_id: str) -> bytes | None:
+        """Return the content of the artifact, or None when it does not exist."""
+        try:
+            with open(self._object_path(artifact_id), "rb") as f:
+                return f.read()
+        except (OSError, ValueError):
+            return None
+
+    def get_text(self, artifact_id: str) -> str | None:
+        data = self.get(artifact_id)
+        return data.decode("utf-8") if data is not None else None
+
+    def refs(self, run_id: str) -> dict[str, str]:
+        """
+        :return: The artifact ids of the run by name, empty for an unknown run
+        :rtype: dict[str, str]
+        """
+        try:
+            with open(self._refs_path(run_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_run_artifacts(self, run_id: str, **contents: str | bytes) -> dict[str, str]:
+        """
+        Save artifacts of a run and point its refs to them, e.g. save_run_artifacts(run_id, code=..., gdd=...).
+        :return: The updated refs of the run
+        :rtype: dict[str, str]
+        """
+        artifact_ids = {name: self.put(content) for name, content in contents.items()}
+        path = self._refs_path(run_id)
+        with self._lock:
+            refs = self.refs(run_id)
+            refs.update(artifact_ids)
+            _atomic_write(path, json.dumps(refs).encode("utf-8"))
+        return refs
+
+    def get_run_artifact(self, run_id: str, name: str) -> tuple[str, str] | None:
+        """
+        :return: (artifact id, text content) of the named artifact of the run, or None
+        :rtype: tuple[str, str] | None
+        """
+        artifact_id = self.refs(run_id).get(name)
+        if not artifact_id:
+            return None
+        content = self.get_text(artifact_id)
+        if content is None:
+            return None
+        return artifact_id, content
+
+
+_artifact_store: ArtifactStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_artifact_store() -> ArtifactStore:
+    """Return the shared ArtifactStore instance."""
+    global _artifact_store
+    with _store_lock:
+        if _artifact_store is None:
+            _artifact_store = ArtifactStore(config.ARTIFACT_DIR)
+        return _artifact_store
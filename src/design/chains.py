@@ -1,19 +1,117 @@
+import json
+import re
+
+from config import config
 from src.utils import call_llm
-from src.design.prompts import CEO_PROMPT, CPO_PROMPT
+from src.design.gdd import GameDesign
+from src.design.prompts import CEO_PROMPT, CPO_PROMPT, DESIGN_PROMPT, GDD_REPAIR_INPUT
+
+
+DESIGN_MODE_TWO_STEP = "two_step"
+DESIGN_MODE_SINGLE = "single"
+DESIGN_MODES = (DESIGN_MODE_TWO_STEP, DESIGN_MODE_SINGLE)
+
+# Output budgets of the design calls: the CEO writes a short analysis, the CPO a GDD JSON.
+# Small budgets keep prompt + output under OLLAMA_NUM_CTX, so Ollama does not allocate a larger KV cache
+CEO_MAX_TOKENS = 1024
+GDD_MAX_TOKENS = 4096
 
 
-def run_design_phase(user_input, provider="openai", model="gpt-4o-mini"):
+def run_design_phase(user_input, provider="openai", model="gpt-4o-mini", mode=None, fallbacks=None) -> GameDesign:
     """
-    流程：User -> CEO (分析) -> CPO (規則化) -> GDD
+    流程：User -> CEO (分析) -> CPO (規則化) -> GDD (GameDesign)
+    mode="single" 時 CEO 分析與 GDD 在同一個 LLM 呼叫中產生，少一次循序的 round-trip
+    fallbacks 為此階段的備援模型 (見 ModelRouting)，None 時使用 Config.LLM_FALLBACKS
+    任一 LLM 呼叫失敗時丟出 LLMCallError，不再把錯誤訊息當成 GDD 往下傳
     """
     print(f"[Member 1] 收到需求: {user_input}")
 
+    mode = mode or config.DESIGN_MODE
+    if mode == DESIGN_MODE_SINGLE:
+        return run_single_call_design(user_input, provider, model, fallbacks)
+
     # 1. CEO 分析
-    ceo_response = call_llm(CEO_PROMPT, user_input, provider=provider, model=model)
+    ceo_response = call_llm(CEO_PROMPT, user_input, provider=provider, model=model, max_tokens=CEO_MAX_TOKENS,
+                            fallbacks=fallbacks).unwrap()
     print(f"[Member 1] CEO 分析完成: {ceo_response[:50]}...")
 
-    # 2. CPO 產出文件
+    # 2. CPO 產出文件 (JSON)
     cpo_input = f"用戶想法: {user_input}\nCEO 分析: {ceo_response}"
-    gdd_context = call_llm(CPO_PROMPT, cpo_input, provider=provider, model=model)
+    cpo_response = call_llm(CPO_PROMPT, cpo_input, provider=provider, model=model, max_tokens=GDD_MAX_TOKENS,
+                            fallbacks=fallbacks).unwrap()
+
+    return validate_design(cpo_response, provider, model, fallbacks)
+
+
+def validate_design(response: str, provider: str = "openai", model: str = "gpt-4o-mini",
+                    fallbacks: list[tuple[str, str]] | None = None) -> GameDesign:
+    """
+    Parse the GDD JSON of the CPO and check it against the schema.
+    An invalid GDD is sent back to the CPO once; if it is still invalid the answer is kept as a raw text GDD,
+    which the later stages receive as a whole.
+    :param response: The raw CPO response
+    :type response: str
+
+    :return: The GDD
+    :rtype: GameDesign
+
+    :raises LLMCallError: If the repair call failed
+    """
+    problems = _design_problems(response)
+    if not problems:
+        return GameDesign.from_json(response)
+
+    print(f"[Member 1] GDD 格式不符，要求 CPO 修正: {problems}")
+    repair_input = GDD_REPAIR_INPUT.format(problems="; ".join(problems), response=response)
+    repaired = call_llm(CPO_PROMPT, repair_input, provider=provider, model=model, temperature=0.2,
+                        max_tokens=GDD_MAX_TOKENS, fallbacks=fallbacks).unwrap()
+    if not _design_problems(repaired):
+        return GameDesign.from_json(repaired)
+
+    print("[Member 1] 無法取得結構化 GDD，改用原始文字")
+    return GameDesign(raw=response)
+
+
+def _design_problems(response: str) -> list[str]:
+    try:
+        return GameDesign.from_json(response).validate()
+    except ValueError as e:
+        return [str(e)]
+
+
+def parse_design_response(response: str) -> tuple[str, str]:
+    """
+    Split the JSON answer of the single-call design prompt.
+    :param response: The raw LLM response
+    :type response: str
+
+    :return: (CEO analysis, GDD JSON text). When the answer has no "gdd" field the whole response is returned
+             as the GDD, and validated as such.
+    :rtype: tuple[str, str]
+    """
+    json_match = re.search(r"\{.*\}", response, re.DOTALL)
+    if json_match:
+        try:
+            # strict=False accepts raw newlines inside strings
+            data = json.loads(json_match.group(0), strict=False)
+            if isinstance(data, dict) and data.get("gdd"):
+                gdd = data["gdd"]
+                gdd_text = json.dumps(gdd, ensure_ascii=False) if isinstance(gdd, dict) else str(gdd)
+                return str(data.get("analysis", "")), gdd_text
+        except json.JSONDecodeError:
+            pass
+
+    print("[Member 1] 無法解析設計 JSON，直接使用完整回應作為 GDD")
+    return "", response
+
+
+def run_single_call_design(user_input, provider="openai", model="gpt-4o-mini", fallbacks=None) -> GameDesign:
+    """
+    流程：User -> CEO + CPO (單一呼叫，JSON 輸出) -> GDD (GameDesign)
+    """
+    response = call_llm(DESIGN_PROMPT, user_input, provider=provider, model=model,
+                        max_tokens=CEO_MAX_TOKENS + GDD_MAX_TOKENS, fallbacks=fallbacks).unwrap()
+    analysis, gdd_text = parse_design_response(response)
+    print(f"[Member 1] CEO 分析完成: {analysis[:50]}...")
 
-    return gdd_context
\ No newline at end of file
+    return validate_design(gdd_text, provider, model, fallbacks)
@@ -0,0 +1,192 @@
+import json
+import re
+from dataclasses import dataclass, field, asdict, fields
+
+
+# The state machine every generated game must implement (see PROGRAMMER_PROMPT_TEMPLATE)
+REQUIRED_STATES = ["START", "PLAYING", "GAME_OVER"]
+
+# GDD fields sent to each pipeline stage; stages not listed here get the whole document
+STAGE_FIELDS = {
+    "assets": ("title", "entities"),
+    "code": ("title", "core_loop", "states", "controls", "constraints", "entities",
+             "win_conditions", "loss_conditions"),
+    "fuzzer": ("controls", "constraints", "states", "win_conditions", "loss_conditions"),
+    "fix": ("controls", "constraints", "entities", "states", "win_conditions", "loss_conditions"),
+    "retrieval": ("title", "core_loop", "controls", "entities"),
+}
+
+
+@dataclass
+class GameDesign:
+    """
+    Structured Game Design Document produced by the design phase.
+    Later stages render only the fields they need (see STAGE_FIELDS) instead of the whole document.
+    `raw` holds the Markdown text of a GDD which could not be parsed into fields, it is then sent as is.
+    """
+    title: str = ""
+    core_loop: str = ""
+    states: list[str] = field(default_factory=lambda: list(REQUIRED_STATES))
+    # [{"input": "Arrow Keys", "action": "Move the paddle"}]
+    controls: list[dict] = field(default_factory=list)
+    # Limits such as speed, cooldown, boundaries
+    constraints: list[str] = field(default_factory=list)
+    # [{"name": "Ball", "description": "Bounces off walls and the paddle"}]
+    entities: list[dict] = field(default_factory=list)
+    win_conditions: list[str] = field(default_factory=list)
+    loss_conditions: list[str] = field(default_factory=list)
+    raw: str = ""
+
+    @property
+    def structured(self) -> bool:
+        return not self.raw
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "GameDesign":
+        """
+        Build a GameDesign from the JSON answer of the design prompt, coercing loose types
+        (a string instead of a list, "key"/"description" instead of "input"/"action"...).
+        """
+        def as_list(value) -> list:
+            if value is None or value == "":
+                return []
+            if isinstance(value, (list, tuple)):
+                return list(value)
+            return [value]
+
+        def as_text_list(value) -> list[str]:
+            return [str(item).strip() for item in as_list(value) if str(item).strip()]
+
+        def as_pairs(value, first: str, second: str, aliases: tuple[str, ...]) -> list[dict]:
+            pairs = []
+            for item in as_list(value):
+                if isinstance(item, dict):
+                    key = item.get(first) or next((item[a] for a in aliases if item.get(a)), "")
+                    description = item.get(second) or item.get("description") or item.get("purpose") or ""
+                    pairs.append({first: str(key).strip(), second: str(description).strip()})
+                elif str(item).strip():
+                    # "Arrow Keys → Move" / "Ball: bounces"
+                    parts = re.split(r"\s*(?:→|->|:)\s*", str(item).strip(), maxsplit=1)
+                    pairs.append({first: parts[0], second: parts[1] if len(parts) > 1 else ""})
+            return [pair for pair in pairs if pair[first]]
+
+        states = [state.upper().replace(" ", "_") for state in as_text_list(data.get("states"))]
+        # The code template always implements these states, keep them in order in front
+        states = REQUIRED_STATES + [state for state in states if state not in REQUIRED_STATES]
+
+        return cls(
+            title=str(data.get("title") or "").strip(),
+            core_loop=str(data.get("core_loop") or "").strip(),
+            states=states,
+            controls=as_pairs(data.get("controls"), "input", "action", ("key", "control")),
+            constraints=as_text_list(data.get("constraints")),
+            entities=as_pairs(data.get("entities"), "name", "description", ("entity",)),
+            win_conditions=as_text_list(data.get("win_conditions")),
+            loss_conditions=as_text_list(data.get("loss_conditions")),
+        )
+
+    @classmethod
+    def from_json(cls, text: str) -> "GameDesign":
+        """
+        Parse a GDD from JSON text (a raw LLM answer may wrap it in prose or a code block).
+        :raises ValueError: If the text holds no JSON object
+        """
+        json_match = re.search(r"\{.*\}", text, re.DOTALL)
+        if not json_match:
+            raise ValueError("GDD 回應中沒有 JSON 物件")
+        try:
+            # strict=False accepts raw newlines inside strings
+            data = json.loads(json_match.group(0), strict=False)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"GDD JSON 格式錯誤: {e}") from e
+        if not isinstance(data, dict):
+            raise ValueError("GDD JSON 必須是物件")
+        return cls.coerce(data)
+
+    @classmethod
+    def coerce(cls, value) -> "GameDesign":
+        """
+        Accept a GameDesign, its dict / JSON form, or a legacy Markdown GDD (kept as `raw`).
+        """
+        if isinstance(value, GameDesign):
+            return value
+        if isinstance(value, dict):
+            if "raw" in value and not value.get("title"):
+                return cls(raw=str(value["raw"]))
+            return cls.from_dict(value)
+        text = str(value or "")
+        if text.lstrip().startswith("{"):
+            try:
+                return cls.from_json(text)
+            except ValueError:
+                pass
+        return cls(raw=text)
+
+    def validate(self) -> list[str]:
+        """
+        :return: The schema problems, empty when the GDD is usable by every stage
+        :rtype: list[str]
+        """
+        if not self.structured:
+            return ["GDD 不是結構化格式"]
+        problems = []
+        if not self.title:
+            problems.append("title is empty")
+        if not self.core_loop:
+            problems.append("core_loop is empty")
+        if not self.controls:
+            problems.append("controls is empty")
+        if not self.entities:
+            problems.append("entities is empty")
+        if not self.win_conditions and not self.loss_conditions:
+            problems.append("win_conditions and loss_conditions are both empty")
+        return problems
+
+    def to_dict(self) -> dict:
+        if not self.structured:
+            return {"raw": self.raw}
+        data = asdict(self)
+        data.pop("raw")
+        return data
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+
+    def to_markdown(self, field_names: tuple[str, ...] | None = None) -> str:
+        """
+        Render the GDD (or only the given fields) as Markdown for the prompts and the web page.
+        """
+        if not self.structured:
+            return self.raw
+
+        wanted = set(field_names or (f.name for f in fields(self)))
+        sections = []
+        if "title" in wanted and self.title:
+            sections.append(f"### Game Title\n{self.title}")
+        if "core_loop" in wanted and self.core_loop:
+            sections.append(f"### Core Gameplay Loop\n{self.core_loop}")
+        if "states" in wanted and self.states:
+            sections.append("### Game States\n" + " → ".join(self.states))
+        if "controls" in wanted and (self.controls or self.constraints):
+            lines = [f"- {c['input']} → {c['action']}" if c["action"] else f"- {c['input']}" for c in self.controls]
+            if "constraints" in wanted:
+                lines += [f"- Limit: {constraint}" for constraint in self.constraints]
+            sections.append("### Player Controls\n" + "\n".join(lines))
+        if "entities" in wanted and self.entities:
+            lines = [f"- **{e['name']}**: {e['description']}" if e["description"] else f"- **{e['name']}**"
+                     for e in self.entities]
+            sections.append("### Entities\n" + "\n".join(lines))
+        if ("win_conditions" in wanted or "loss_conditions" in wanted) and (self.win_conditions or self.loss_conditions):
+            lines = []
+            if "win_conditions" in wanted:
+                lines += [f"- Win: {condition}" for condition in self.win_conditions]
+            if "loss_conditions" in wanted:
+                lines += [f"- Lose: {condition}" for condition in self.loss_conditions]
+            sections.append("### Win and Loss Conditions\n" + "\n".join(lines))
+        return "\n\n".join(sections)
+
+    def for_stage(self, stage: str) -> str:
+        """
+        Render the subset of the GDD used by a pipeline stage (assets, code, fuzzer, fix, retrieval).
+        """
+        return self.to_markdown(STAGE_FIELDS.get(stage))
@@ -14,36 +14,59 @@ Output Format:
 - Avoid technical implementation details; focus on concept.
 """
 
+# GDD schema (JSON), parsed into src.design.gdd.GameDesign
+GDD_JSON_FORMAT = """
+{
+  "title": "<game title>",
+  "core_loop": "<what the player sees at the start, how the screen changes during gameplay, what is shown when the game ends>",
+  "states": ["START", "PLAYING", "GAME_OVER"],
+  "controls": [{"input": "<e.g. Arrow Keys, Left Mouse Button, Mouse Drag>", "action": "<its purpose, e.g. Move Character>"}],
+  "constraints": ["<limits such as speed, cooldown, boundaries>"],
+  "entities": [{"name": "<player / enemy / item>", "description": "<how the player interacts with it and how it interacts with other entities>"}],
+  "win_conditions": ["<how the player wins, incl. score / timeout / survival conditions; show a yellow 'YOU WIN' text>"],
+  "loss_conditions": ["<how the player loses; show a yellow 'GAME OVER' text>"]
+}
+"""
+
 # CPO
 CPO_PROMPT = """
-You are the Chief Product Officer (CPO) of a game company. Based on the CEO’s analysis, create a detailed Game Design Document (GDD) for a Minimum Viable Product (MVP).
+You are the Chief Product Officer (CPO) of a game company. Based on the CEO’s analysis, create a Game Design Document (GDD) for a Minimum Viable Product (MVP).
 
 Instructions:
-1. Write in Markdown format.
-2. Include the following sections:
+1. Core Gameplay Loop: describe the game flow from the start screen to the end screen.
+2. Player Controls: list ALL player inputs (mouse movement, arrow keys...) with their purpose, plus any limits (speed, cooldown, boundaries).
+3. Entities: list the main entities (player, enemies, items) and how they interact with the player and with each other.
+4. Win and Loss Conditions: explain how the player can win or lose. If the game has no win state, leave win_conditions empty.
+5. States: the game always has "START", "PLAYING" and "GAME_OVER"; add other states only when the game needs them.
+6. Keep it simple and focused on an MVP version of the game. Avoid technical details; focus on design and rules.
 
-### 1. Game Title
+Output Format: Valid JSON only, following this schema:
+""" + GDD_JSON_FORMAT
 
-### 2. Core Gameplay Loop
-- Describe the game flow: what the player sees at the start, how the screen changes during gameplay, and what is shown when the game ends.
+# CEO + CPO in a single call (design_mode="single")
+DESIGN_PROMPT = """
+You are both the CEO and the Chief Product Officer (CPO) of a game company.
+Transform the user's vague game idea into a concept AND a Game Design Document (GDD) for a Minimum Viable Product (MVP), in one answer.
 
-### 3. Player Controls
-- List all player inputs used in the game, such as mouse movement, arrow keys... 
-- For each input, describe its purpose in the game, e.g., "Left Mouse Button → Shoot", "Arrow Keys → Move Character".  
-- Present the inputs and their functions in a list or table format.
-- Define any limits or constraints (speed, cooldown, boundaries).
+Step 1 (CEO analysis), 3-5 short bullet points:
+- The core fun, the main gameplay loop, the key mechanics and the primary goal. No technical details.
 
-### 4. Description of Entities
-- List the main entities in the game (player, enemies, items).
-- Describe how the player interacts with each game entity, and how the entities interact each other.
+Step 2 (CPO GDD), based on your analysis:
+- Core gameplay loop (start screen, gameplay, end screen), every player input with its purpose and limits,
+  the main entities and their interactions, and the win / loss conditions.
+- The states always include "START", "PLAYING" and "GAME_OVER".
 
-### 5. Win and Loss Conditions
-- Does the game has Win / Lose state?
-- Explain how the player can win or lose.
-- Include any score, timeout, or survival conditions.
-- If the player win, the game should show a yellow text on the screen "YOU WIN", If the player lose, a yellow text "GAME OVER" should be shown.
+Keep it simple and focused on an MVP. Avoid unnecessary technical details.
 
+Output Format: Valid JSON only, with two fields: {"analysis": "<Step 1 bullet points>", "gdd": <Step 2 GDD object>}
+The GDD object follows this schema:
+""" + GDD_JSON_FORMAT
 
-3. Keep it simple and focused on an MVP version of the game.
-4. Avoid unnecessary technical details; focus on design and rules.
-"""
\ No newline at end of file
+# Sent back to the CPO when its GDD did not match the schema
+GDD_REPAIR_INPUT = """
+Your GDD JSON is invalid: {problems}
+Answer again with the complete, corrected GDD as valid JSON only.
+
+Previous answer:
+{response}
+"""
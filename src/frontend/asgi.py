@@ -0,0 +1,218 @@
+import asyncio
+import json
+import re
+
+from uvicorn.middleware.wsgi import WSGIMiddleware
+
+from src.frontend.frontend import (create_app, generation_payload, job_final_message, parse_last_event_id,
+                                   resolve_model)
+from src.frontend.sse import format_sse
+from src.jobs.pipeline import JOB_KIND_GENERATE
+from src.jobs.worker import get_job_queue
+
+
+STREAM_ROUTE = re.compile(r"^/jobs/([0-9a-f]{32})/stream$")
+KEEP_ALIVE_SECONDS = 15
+# The database is still polled at this interval, for events written by the workers of another process
+POLL_SECONDS = 2.0
+
+
+class JobEventNotifier:
+    """
+    Wake up the coroutines streaming a job when the job queue of this process reports a new event.
+    The job queue calls notify() from the worker threads, the events are set on the event loop.
+    """
+
+    def __init__(self):
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._waiters: dict[str, set[asyncio.Event]] = {}
+
+    @property
+    def bound(self) -> bool:
+        return self._loop is not None
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    def notify(self, job_id: str):
+        loop = self._loop
+        if loop is not None and job_id in self._waiters:
+            loop.call_soon_threadsafe(self._wake, job_id)
+
+    def _wake(self, job_id: str):
+        for event in self._waiters.get(job_id, ()):
+            event.set()
+
+    def subscribe(self, job_id: str) -> asyncio.Event:
+        event = asyncio.Event()
+        self._waiters.setdefault(job_id, set()).add(event)
+        return event
+
+    def unsubscribe(self, job_id: str, event: asyncio.Event):
+        waiters = self._waiters.get(job_id)
+        if waiters is not None:
+            waiters.discard(event)
+            if not waiters:
+                self._waiters.pop(job_id, None)
+
+
+class AsgiApp:
+    """
+    ASGI entry point: job submission and the SSE job streams are async handlers, so an idle stream
+    costs a coroutine instead of a thread. Every other route is served by the Flask app through
+    uvicorn's WSGI adapter.
+    """
+
+    def __init__(self, flask_app):
+        self.wsgi_app = WSGIMiddleware(flask_app)
+        self.job_queue = get_job_queue()
+        self.notifier = JobEventNotifier()
+        self.job_queue.add_listener(self.notifier.notify)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+
+        if scope["type"] == "http":
+            if not self.notifier.bound:
+                self.notifier.bind(asyncio.get_running_loop())
+
+            path, method = scope["path"], scope["method"]
+            match = STREAM_ROUTE.match(path)
+            if match and method == "GET":
+                await self._job_stream(scope, receive, send, match.group(1))
+                return
+            if path == "/jobs" and method == "POST":
+                await self._submit_job(receive, send)
+                return
+
+        await self.wsgi_app(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self.notifier.bind(asyncio.get_running_loop())
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    @staticmethod
+    async def _send_json(send, status: int, data: dict):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def _submit_job(self, receive, send):
+        """Async version of the POST /jobs JSON API of the Flask app."""
+        body = b""
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        try:
+            data = json.loads(body or b"{}")
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            await self._send_json(send, 400, {"error": "invalid JSON body"})
+            return
+
+        user_input = str(data.get("user_input", "")).strip()
+        provider = str(data.get("provider", "openai")).lower()
+        if not user_input:
+            await self._send_json(send, 400, {"error": "user_input is required"})
+            return
+        model_name, error = resolve_model(provider)
+        if error:
+            await self._send_json(send, 400, {"error": error})
+            return
+
+        try:
+            payload = generation_payload(user_input, provider, model_name, data.get("design_mode"),
+                                         data.get("stage_models"), data.get("regenerate") is True)
+        except ValueError as e:
+            await self._send_json(send, 400, {"error": str(e)})
+            return
+        job_id = await asyncio.to_thread(self.job_queue.submit, JOB_KIND_GENERATE, payload)
+        await self._send_json(send, 202, {"job_id": job_id})
+
+    async def _job_stream(self, scope, receive, send, job_id: str):
+        """Async version of /jobs/<job_id>/stream, resumable with Last-Event-ID."""
+        if await asyncio.to_thread(self.job_queue.get, job_id) is None:
+            await self._send_json(send, 404, {"error": "job not found"})
+            return
+
+        headers = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope["headers"]}
+        after_seq = parse_last_event_id(headers.get("last-event-id"))
+
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache"),
+                        (b"x-accel-buffering", b"no")],
+        })
+
+        async def wait_for_disconnect():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+
+        stream = asyncio.create_task(self._stream_events(send, job_id, after_seq))
+        watcher = asyncio.create_task(wait_for_disconnect())
+        done, pending = await asyncio.wait({stream, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        if stream in done:
+            stream.result()
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def _stream_events(self, send, job_id: str, after_seq: int):
+        loop = asyncio.get_running_loop()
+        last_sent = loop.time()
+        wakeup = self.notifier.subscribe(job_id)
+        try:
+            while True:
+                # Cleared before reading, so an event written during the read wakes the next wait
+                wakeup.clear()
+                job = await asyncio.to_thread(self.job_queue.get, job_id)
+                events = await asyncio.to_thread(self.job_queue.events_since, job_id, after_seq)
+                for seq, message in events:
+                    after_seq = seq
+                    last_sent = loop.time()
+                    await send({"type": "http.response.body", "body": format_sse(message, seq).encode("utf-8"),
+                                "more_body": True})
+
+                if job.finished:
+                    await send({"type": "http.response.body",
+                                "body": format_sse(job_final_message(job)).encode("utf-8"), "more_body": True})
+                    return
+
+                try:
+                    await asyncio.wait_for(wakeup.wait(), POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+
+                if loop.time() - last_sent > KEEP_ALIVE_SECONDS:
+                    # Comment line as keep-alive for proxies
+                    last_sent = loop.time()
+                    await send({"type": "http.response.body", "body": b": keep-alive\n\n", "more_body": True})
+        finally:
+            self.notifier.unsubscribe(job_id, wakeup)
+
+
+def create_asgi_app(flask_app=None) -> AsgiApp:
+    """
+    Build the ASGI app, e.g. `uvicorn --factory src.frontend.asgi:create_asgi_app --loop uvloop`.
+    :param flask_app: The Flask app serving the other routes, created with create_app() when None
+    """
+    return AsgiApp(flask_app or create_app())
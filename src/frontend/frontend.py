@@ -1,42 +1,74 @@
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash, session, Response, stream_with_context
-from flask_session import Session
+import time
+from flask import Flask, render_template, request, redirect, url_for, flash, session, Response, stream_with_context, jsonify, abort
 from config import config
 
-from src.design.chains import run_design_phase
-from src.generation.core import run_core_phase
 from src.testing.runner import launch_game
-from src.testing.fixer import run_fix_loop
+from src.frontend.sse import format_sse
+from src.jobs.job_queue import JOB_SUCCEEDED
+from src.jobs.pipeline import JOB_HANDLERS, JOB_KIND_FIX, JOB_KIND_GENERATE
+from src.jobs.worker import get_job_queue, start_workers
+from src.design.chains import DESIGN_MODES
+from src.design.gdd import GameDesign
+from src.llm.routing import format_stage_routes, parse_stage_routes
+from src.artifacts.store import ARTIFACT_CODE, ARTIFACT_FIX_HISTORY, ARTIFACT_GDD, get_artifact_store
 
 app = Flask(__name__)
-# --- Flask session config ---
-app.config["SESSION_PERMANENT"] = True
-app.config["SESSION_TYPE"] = "filesystem"
-Session(app)
+# The session is the signed cookie of Flask and only holds ids (run id, job id) and small settings,
+# the GDD / code / fix history live in the artifact store.
 
 # Supporting providers
 PROVIDERS = ["mistral", "openai", "groq", "google", "ollama", "deepseek", "inception"]
 
+
+def resolve_model(provider: str) -> tuple[str | None, str | None]:
+    """
+    :return: (model name, error message) of the provider, the model name is None on error
+    :rtype: tuple[str | None, str | None]
+    """
+    if provider not in PROVIDERS:
+        return None, f"不支援的 Provider: {provider}"
+    api_key = os.getenv(f"{provider.upper()}_API_KEY")
+    model_name = os.getenv(f"{provider.upper()}_MODEL_NAME")
+    if not api_key or not model_name:
+        return None, f"{provider} API Key 或 Model Name 尚未設定！"
+    return model_name, None
+
+
+def generation_payload(user_input: str, provider: str, model_name: str, design_mode: str | None,
+                       stage_models: dict | None = None, regenerate: bool = False) -> dict:
+    """
+    The payload of a generation job (shared by the form, the JSON API and the ASGI handlers).
+    stage_models routes some stages to another provider / model for this request, e.g. {"review": "ollama:llama3:8b"}.
+    regenerate skips the results of earlier runs of the same idea (semantic cache, checkpoints).
+    :raises ValueError: On invalid stage_models
+    """
+    return {
+        "user_input": user_input,
+        "provider": provider,
+        "model_name": model_name,
+        "design_mode": design_mode if design_mode in DESIGN_MODES else config.DESIGN_MODE,
+        "stage_models": format_stage_routes(parse_stage_routes(stage_models)),
+        "regenerate": bool(regenerate),
+    }
+
+
 @app.route("/", methods=["GET", "POST"])
 def index():
     if request.method == "POST":
         provider = request.form.get("provider", "openai").lower()
         user_input = request.form.get("user_input", "").strip()
         action = request.form.get("action")
+        design_mode = request.form.get("design_mode", config.DESIGN_MODE)
+        regenerate = request.form.get("regenerate") == "1"
         session['provider'] = provider
 
-        if provider not in PROVIDERS:
-            flash(f"不支援的 Provider: {provider}", "danger")
-            return redirect(url_for("index"))
-
-        api_key = os.getenv(f"{provider.upper()}_API_KEY")
-        model_name = os.getenv(f"{provider.upper()}_MODEL_NAME")
+        model_name, error = resolve_model(provider)
         session['model_name'] = model_name
 
-        if not api_key or not model_name:
-            flash(f"{provider} API Key 或 Model Name 尚未設定！", "danger")
+        if error:
+            flash(error, "danger")
             return redirect(url_for("index"))
-        os.environ[f"{provider.upper()}_API_KEY"] = api_key
 
         try:
             if action == "generate":
@@ -44,19 +76,12 @@ def index():
                     flash("請輸入遊戲點子！", "warning")
                     return redirect(url_for("index"))
 
-                # --- Phase 1: Design ---
-                session['gdd_result_global'] = run_design_phase(user_input, provider, model_name)
-                # --- Phase 2: Core ---
-                session['game_file_path_global'] = run_core_phase(session.get('gdd_result_global'), provider, model_name)
-
-                print("[Member 2] Generation complete")
-
-                if session.get('game_file_path_global'):
-                    session['auto_start_fix'] = True
-                    flash("核心代碼生成完畢，準備開始驗證...", "info")
-                else:
-                    flash("❌ 程式碼生成失敗，未能解析出 Python Block。", "danger")
-
+                session['user_input'] = user_input
+                session['job_id'] = get_job_queue().submit(
+                    JOB_KIND_GENERATE, generation_payload(user_input, provider, model_name, design_mode,
+                                                          regenerate=regenerate)
+                )
+                flash("已提交生成任務，請稍候...", "info")
 
             elif action == "launch_game":
                 path = session.get('game_file_path_global')
@@ -72,41 +97,194 @@ def index():
 
         return redirect(url_for("index"))
     # --- Get ---
-    file_content = None
-    path = session.get('game_file_path_global')
-    if path and os.path.exists(path):
-        with open(path, "r", encoding="utf-8") as f:
-            file_content = f.read()
+    pending_job_id = _apply_finished_job()
+
+    run_id = session.get('run_id')
+    gdd_result = None
+    code_url = None
+    if run_id:
+        store = get_artifact_store()
+        gdd_artifact = store.get_run_artifact(run_id, ARTIFACT_GDD)
+        if gdd_artifact:
+            gdd_result = GameDesign.coerce(gdd_artifact[1]).to_markdown()
+        if ARTIFACT_CODE in store.refs(run_id):
+            # The code is fetched by the page with a conditional GET instead of being inlined on every load
+            code_url = url_for("run_artifact", run_id=run_id, name=ARTIFACT_CODE)
     auto_start_fix = session.pop('auto_start_fix', None)
 
     return render_template("index.html",
-                           gdd_result=session.get('gdd_result_global'),
+                           gdd_result=gdd_result,
                            game_file_path=session.get('game_file_path_global'),
-                           file_content=file_content,
+                           code_url=code_url,
                            providers=PROVIDERS,
-                           auto_start_fix=auto_start_fix
+                           design_modes=DESIGN_MODES,
+                           default_design_mode=config.DESIGN_MODE,
+                           auto_start_fix=auto_start_fix,
+                           pending_job_id=pending_job_id
     )
 
-@app.route('/fix_stream')
-def fix_stream():
-    """"
-    Use generator function to streamline the status output.
-    run_fix_loop is a generator function, which contains the message given by "yield".
-    When the frontend received the message format sent by run_fix_loop, it will show the message automatically.
+
+def _apply_finished_job():
+    """
+    Copy the result of the generation job of this session into the session once it has finished.
+    Return the job id while the job is still queued or running.
+    """
+    job_id = session.get('job_id')
+    if not job_id:
+        return None
+
+    job = get_job_queue().get(job_id)
+    if job is None:
+        session.pop('job_id', None)
+        return None
+    if not job.finished:
+        return job_id
+
+    session.pop('job_id', None)
+    if job.status == JOB_SUCCEEDED:
+        result = job.result or {}
+        session['run_id'] = job.id
+        session['game_file_path_global'] = result.get("game_file_path")
+        session['stage_models'] = job.payload.get("stage_models") or {}
+        print("[Member 2] Generation complete")
+        if result.get("auto_start_fix"):
+            session['auto_start_fix'] = True
+            flash("核心代碼生成完畢，準備開始驗證...", "info")
+        else:
+            flash("已使用快取的已驗證遊戲。", "success")
+    else:
+        flash(f"❌ 生成失敗: {job.error}", "danger")
+    return None
+
+
+@app.route('/jobs', methods=["POST"])
+def submit_job():
+    """
+    JSON API submitting a generation job: {"user_input", "provider", "design_mode", "stage_models", "regenerate"}
+    -> 202 {"job_id"}.
+    Follow it with /jobs/<job_id> or /jobs/<job_id>/stream.
+    """
+    data = request.get_json(silent=True) or {}
+    user_input = str(data.get("user_input", "")).strip()
+    provider = str(data.get("provider", "openai")).lower()
+    if not user_input:
+        return jsonify({"error": "user_input is required"}), 400
+    model_name, error = resolve_model(provider)
+    if error:
+        return jsonify({"error": error}), 400
+
+    try:
+        payload = generation_payload(user_input, provider, model_name, data.get("design_mode"),
+                                     data.get("stage_models"), data.get("regenerate") is True)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    job_id = get_job_queue().submit(JOB_KIND_GENERATE, payload)
+    return jsonify({"job_id": job_id}), 202
+
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Job status API."""
+    job = get_job_queue().get(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job.to_dict())
+
+
+@app.route('/runs/<run_id>/artifacts/<name>')
+def run_artifact(run_id, name):
+    """
+    An artifact of a run (code, gdd, fix_history). The artifact id is the ETag, so an unchanged
+    artifact is answered with 304 without reading it.
+    """
+    store = get_artifact_store()
+    artifact_id = store.refs(run_id).get(name)
+    if not artifact_id:
+        abort(404)
+
+    if artifact_id in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(artifact_id)
+        return response
+
+    content = store.get(artifact_id)
+    if content is None:
+        abort(404)
+    mimetype = "application/json" if name in (ARTIFACT_GDD, ARTIFACT_FIX_HISTORY) else "text/plain"
+    response = Response(content, mimetype=mimetype)
+    response.set_etag(artifact_id)
+    # Revalidate every time: the ref of the run changes when the code is fixed
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def parse_last_event_id(value: str | None) -> int:
+    """The sequence number a reconnecting EventSource sends in Last-Event-ID (0 for a new stream)."""
+    return int(value) if value and value.isdigit() else 0
+
+
+def job_final_message(job) -> str:
+    """The last SSE message of a finished job."""
+    return "JOB_DONE" if job.status == JOB_SUCCEEDED else f"JOB_FAIL: {job.error}"
+
+
+@app.route('/jobs/<job_id>/stream')
+def job_stream(job_id):
+    """
+    SSE progress of a job (generation or fix loop). The event id is the sequence number in the job event log,
+    so a reconnecting browser continues from its Last-Event-ID.
+    In ASGI mode this route is served by src.frontend.asgi without holding a thread per connection.
     """
-    if not session.get('game_file_path_global') or not session.get('gdd_result_global'):
-        def error_gen():
-            yield "data: 錯誤：尚未生成遊戲，無法開始驗證。\n\n"
-        return Response(error_gen(), mimetype='text/event-stream')
-    gdd = session.get('gdd_result_global')
+    job_queue = get_job_queue()
+    if job_queue.get(job_id) is None:
+        abort(404)
+
+    def event_gen(after_seq):
+        last_sent = time.monotonic()
+        while True:
+            job = job_queue.get(job_id)
+            for seq, message in job_queue.events_since(job_id, after_seq):
+                after_seq = seq
+                last_sent = time.monotonic()
+                yield format_sse(message, seq)
+
+            if job.finished:
+                yield format_sse(job_final_message(job))
+                return
+
+            if time.monotonic() - last_sent > 15:
+                # Comment line as keep-alive for proxies
+                last_sent = time.monotonic()
+                yield ": keep-alive\n\n"
+            time.sleep(0.5)
+
+    return Response(stream_with_context(event_gen(parse_last_event_id(request.headers.get("Last-Event-ID")))), mimetype='text/event-stream')
+
+@app.route('/fix_jobs', methods=["POST"])
+def submit_fix_job():
+    """
+    Start the fix loop of the generation of this session as a background job and return its id.
+    The page follows it with /jobs/<job_id>/stream, so a reconnect resumes the same job (Last-Event-ID),
+    and at most one fix loop runs per generation (the run id is the dedupe key).
+    The fix job of a dead process is requeued by the dedupe, so a new click resumes it instead of following it forever.
+    """
+    run_id = session.get('run_id')
     path = session.get('game_file_path_global')
-    provider = session.get('provider')
-    model_name = session.get('model_name')
-    return Response(
-        stream_with_context(run_fix_loop(gdd, path, provider, model_name)),
-        mimetype='text/event-stream'
-    )
+    if not run_id or not path:
+        return jsonify({"error": "錯誤：尚未生成遊戲，無法開始驗證。"}), 400
+
+    job_id = get_job_queue().submit(JOB_KIND_FIX, {
+        "run_id": run_id,
+        "game_file_path": path,
+        "provider": session.get('provider'),
+        "model_name": session.get('model_name'),
+        "user_input": session.get('user_input'),
+        "stage_models": session.get('stage_models') or {},
+    }, dedupe_key=run_id)
+    return jsonify({"job_id": job_id}), 202
 
 def create_app():
     app.secret_key = config.SECRET_KEY
+    start_workers(JOB_HANDLERS)
     return app
@@ -0,0 +1,21 @@
+from typing import Optional
+
+
+def format_sse(message: str, event_id: Optional[int] = None) -> str:
+    """
+    Format one Server-Sent Event.
+    Multi-line messages are split into several "data:" lines, otherwise the browser would cut the event.
+    :param message: The message to send
+    :type message: str
+
+    :param event_id: The event id, sent back by the browser as Last-Event-ID when it reconnects
+    :type event_id: Optional[int]
+
+    :return: The formatted event
+    :rtype: str
+    """
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.extend(f"data: {line}" for line in str(message).splitlines() or [""])
+    return "\n".join(lines) + "\n\n"
@@ -1,17 +1,20 @@
 import re
 from src.utils import call_llm
 from src.generation.prompts import ART_PROMPT
+from src.llm.tokens import PromptBuilder, compact_text
+from src.design.gdd import GameDesign
 
 
 def generate_assets(
-        gdd_context: str,
+        gdd: GameDesign,
         provider: str = "openai",
-        model: str = "gpt-4o-mini"
+        model: str = "gpt-4o-mini",
+        fallbacks: list[tuple[str, str]] | None = None
 ) -> str:
     """
-    Generate the art assets for this specific game.
-    :param gdd_context: The GDD context to use
-    :type gdd_context: str
+    Generate the art assets for this specific game, only the title and the entities of the GDD are sent.
+    :param gdd: The GDD to use
+    :type gdd: GameDesign
 
     :param provider: The LLM service provider
     :type provider: str
@@ -19,10 +22,21 @@ def generate_assets(
     :param model: The LLM model to use
     :type model: str
 
+    :param fallbacks: The fallback (provider, model) routes, None for Config.LLM_FALLBACKS
+    :type fallbacks: list[tuple[str, str]] | None
+
     :return: The generated assets json
     :rtype: str
+
+    :raises LLMCallError: If the LLM call failed
     """
-    response = call_llm(ART_PROMPT, f"GDD Content:\n{gdd_context}", provider=provider, model=model)
+    prompt, max_tokens = (
+        PromptBuilder(ART_PROMPT, provider, model, max_tokens=2048)
+        .add(f"GDD Content:\n{compact_text(gdd.for_stage('assets'))}", trim_priority=1)
+        .build()
+    )
+    response = call_llm(ART_PROMPT, prompt, provider=provider, model=model, max_tokens=max_tokens,
+                        fallbacks=fallbacks).unwrap()
 
     try:
         # Find {...} structure
@@ -1,20 +1,28 @@
 from src.utils import call_llm
-from src.generation.prompts import PROGRAMMER_PROMPT_TEMPLATE, FUZZER_GENERATION_PROMPT
+from src.generation.prompts import (PROGRAMMER_PROMPT_TEMPLATE, FUZZER_GENERATION_PROMPT, FUZZER_GENERATION_INPUT,
+                                    RAG_EXAMPLES_PROMPT)
 from src.generation.asset_gen import generate_assets
+from src.generation.retrieval import retrieve_code_examples, format_code_examples
 from src.generation.file_utils import save_code_to_file
-import os
+from src.rag_service.ingest import extract_game_tags
+from src.design.gdd import GameDesign
+from src.artifacts.checkpoints import Checkpoints, STAGE_ASSETS, STAGE_CODE, STAGE_FUZZER_LOGIC
+from src.llm.errors import LLMCallError
+from src.llm.tokens import PromptBuilder, compact_text
+from src.llm.routing import ModelRouting, ROUTE_ART, ROUTE_CODE, ROUTE_FUZZ_LOGIC
 
 
 def generate_code(
-        gdd_context: str,
+        gdd: GameDesign,
         asset_json: str,
         provider: str = "openai",
-        model: str = "gpt-4o-mini"
+        model: str = "gpt-4o-mini",
+        fallbacks: list[tuple[str, str]] | None = None
 ) -> str:
     """
-    Generate code according to the given gdd context and the given asset json.
-    :param gdd_context: The gdd context to generate code for
-    :type gdd_context: str
+    Generate code according to the given gdd and the given asset json.
+    :param gdd: The gdd to generate code for
+    :type gdd: GameDesign
 
     :param asset_json: The art asset json file
     :type asset_json: str
@@ -25,20 +33,31 @@ def generate_code(
     :param model: The LLM model to use
     :type model: str
 
+    :param fallbacks: The fallback (provider, model) routes, None for Config.LLM_FALLBACKS
+    :type fallbacks: list[tuple[str, str]] | None
+
     :return: The generated code
     :rtype: str
+
+    :raises LLMCallError: If the LLM call failed
     """
 
-    full_prompt = f"""
-    GDD:
-    {gdd_context}
+    examples_context = ""
+    examples = retrieve_code_examples(gdd.for_stage("retrieval"), tags=extract_game_tags(gdd))
+    if examples:
+        examples_context = RAG_EXAMPLES_PROMPT.replace("{examples}", format_code_examples(examples))
 
-    ASSETS (JSON):
-    {asset_json}
-
-    Write the full code now following the Template.
-    """
-    return call_llm(PROGRAMMER_PROMPT_TEMPLATE, full_prompt, provider=provider, model=model, temperature=0.2)
+    # The few-shot examples are dropped first, then the GDD is trimmed, when the prompt does not fit the model
+    full_prompt, max_tokens = (
+        PromptBuilder(PROGRAMMER_PROMPT_TEMPLATE, provider, model, max_tokens=8192)
+        .add(f"GDD:\n{compact_text(gdd.for_stage('code'))}", trim_priority=1)
+        .add(f"ASSETS (JSON):\n{asset_json}")
+        .add(examples_context.strip(), trim_priority=2)
+        .add("Write the full code now following the Template.")
+        .build()
+    )
+    return call_llm(PROGRAMMER_PROMPT_TEMPLATE, full_prompt, provider=provider, model=model, temperature=0.2,
+                    max_tokens=max_tokens, fallbacks=fallbacks).unwrap()
 
 
 def generate_structural_code(
@@ -70,14 +89,15 @@ def generate_structural_code(
 
 
 def generate_fuzzer_logic(
-        gdd_context: str,
+        gdd: GameDesign,
         provider: str = "openai",
-        model: str = "gpt-4o-mini"
+        model: str = "gpt-4o-mini",
+        fallbacks: list[tuple[str, str]] | None = None
 ) -> str:
     """
-    Generate a fuzzer logic according to the given gdd context.
-    :param gdd_context: The gdd context to generate code for
-    :type gdd_context: str
+    Generate a fuzzer logic according to the controls, states and win / loss conditions of the gdd.
+    :param gdd: The gdd to generate the fuzzer logic for
+    :type gdd: GameDesign
 
     :param provider: The LLM service provider
     :type provider: str
@@ -85,24 +105,39 @@ def generate_fuzzer_logic(
     :param model: The LLM model to use
     :type model: str
 
+    :param fallbacks: The fallback (provider, model) routes, None for Config.LLM_FALLBACKS
+    :type fallbacks: list[tuple[str, str]] | None
+
     :return: The generated code
     :rtype: str
+
+    :raises LLMCallError: If the LLM call failed
     """
     print("[Member 2] Start to generate fuzzer logic")
-    prompt = FUZZER_GENERATION_PROMPT.replace("{gdd}", gdd_context)
+    prompt, max_tokens = (
+        PromptBuilder(FUZZER_GENERATION_PROMPT, provider, model, max_tokens=1024)
+        .add(FUZZER_GENERATION_INPUT.replace("{gdd}", compact_text(gdd.for_stage("fuzzer"))), trim_priority=1)
+        .build()
+    )
     print("[Member 2] Generating the custom fuzzer test script (Fuzzer)...")
-    return call_llm("You are a QA Engineer.", prompt, provider=provider, model=model, temperature=0.2)
+    return call_llm(FUZZER_GENERATION_PROMPT, prompt, provider=provider, model=model, temperature=0.2,
+                    max_tokens=max_tokens, fallbacks=fallbacks).unwrap()
 
 
 def run_core_phase(
-        gdd_context: str,
+        gdd: GameDesign | str,
         provider: str = "openai",
-        model: str = "gpt-4o-mini"
+        model: str = "gpt-4o-mini",
+        output_dir: str = "output",
+        checkpoints: Checkpoints | None = None,
+        routing: ModelRouting | None = None
 ) -> str:
     """
     Run the game and the logic tester (game tester) codes generation routine.
-    :param gdd_context: The gdd context to generate code for
-    :type gdd_context: str
+    With checkpoints, the assets, code and fuzzer logic of an earlier run with the same input are reused.
+    The art, code and fuzzer logic stages use the model routed to them (ModelRouting), by default provider / model.
+    :param gdd: The gdd to generate code for (a Markdown GDD is used as a whole)
+    :type gdd: GameDesign | str
 
     :param provider: The LLM service provider
     :type provider: str
@@ -110,24 +145,51 @@ def run_core_phase(
     :param model: The LLM model to use
     :type model: str
 
+    :param output_dir: The directory to save the generated files
+    :type output_dir: str
+
+    :param checkpoints: The stage checkpoints of the run
+    :type checkpoints: Checkpoints | None
+
+    :param routing: The model of each stage, None for Config.LLM_STAGE_ROUTES
+    :type routing: ModelRouting | None
+
     :return: The file path of the generated code
     :rtype: str
+
+    :raises LLMCallError: If generating the assets or the code failed
     """
 
+    gdd = GameDesign.coerce(gdd)
+    gdd_json = gdd.to_json()
+    routing = ModelRouting.coerce(routing, provider, model)
+    art, coder, fuzz_logic = routing.route(ROUTE_ART), routing.route(ROUTE_CODE), routing.route(ROUTE_FUZZ_LOGIC)
+
+    def run_stage(stage, inputs, produce):
+        if checkpoints is None:
+            return produce()
+        return checkpoints.run(stage, inputs, produce)
+
     print("[Member 2] Start to generate the assets (JSON)...")
-    assets = generate_assets(gdd_context, provider, model)
+    assets = run_stage(STAGE_ASSETS, (gdd_json, art.provider, art.model),
+                       lambda: generate_assets(gdd, art.provider, art.model, art.fallbacks))
     print(f"[Member 2] Generation complete: {assets[:50]}...")
 
     print("[Member 2] Start to generate the code...")
-    raw_code = generate_code(gdd_context, assets, provider, model)
+    raw_code = run_stage(STAGE_CODE, (gdd_json, assets, coder.provider, coder.model),
+                         lambda: generate_code(gdd, assets, coder.provider, coder.model, coder.fallbacks))
 
     print("[Member 2] Saving file...")
-    file_path = save_code_to_file(raw_code)
+    file_path = save_code_to_file(raw_code, output_dir=output_dir)
 
     if file_path:
-        fuzzer_logic_code = generate_fuzzer_logic(gdd_context, provider, model)
-        output_dir = os.path.dirname(file_path)
-
-        save_code_to_file(fuzzer_logic_code, output_dir=output_dir, filename="fuzz_logic.py")
+        try:
+            fuzzer_logic_code = run_stage(STAGE_FUZZER_LOGIC, (gdd_json, fuzz_logic.provider, fuzz_logic.model),
+                                          lambda: generate_fuzzer_logic(gdd, fuzz_logic.provider, fuzz_logic.model,
+                                                                        fuzz_logic.fallbacks))
+            save_code_to_file(fuzzer_logic_code, output_dir=output_dir, filename="fuzz_logic.py")
+        except LLMCallError as e:
+            # The fuzzer falls back to its default random logic without fuzz_logic.py
+            print(f"[Member 2] Fuzzer logic generation failed, use the default logic: {e}")
 
     return file_path
@@ -145,13 +145,18 @@ if __name__ == "__main__":
 ```
 """
 
+# Few-shot context from the RAG store (verified snippets of previously passing games)
+RAG_EXAMPLES_PROMPT = """
+REFERENCE SNIPPETS (from previously generated games that passed all tests):
+Reuse their patterns where they fit this GDD. Do NOT copy unrelated game logic.
+
+{examples}
+"""
+
 # Fuzzer Script Generator Prompt (升級版：強力拖曳)
 FUZZER_GENERATION_PROMPT = """
 You are a QA Automation Engineer specializing in Pygame.
-Task: Write a "Monkey Bot" script snippet to stress-test the game described in the GDD.
-
-【GDD / RULES】:
-{gdd}
+Task: Write a "Monkey Bot" script snippet to stress-test the game described in the GDD (given in the user message).
 
 【INSTRUCTIONS】:
 1. Analyze the GDD to identify VALID inputs.
@@ -190,5 +195,10 @@ if random.random() < 0.05:
     pygame.event.post(pygame.event.Event(pygame.MOUSEBUTTONUP, {'pos': end_pos, 'button': 1}))
 ```
 
-Now, generate the test logic for this specific game:
+Now, generate the test logic for the game of the user message.
+"""
+
+FUZZER_GENERATION_INPUT = """
+【GDD / RULES】:
+{gdd}
 """
\ No newline at end of file
@@ -0,0 +1,93 @@
+from config import config
+from src.llm.tokens import estimate_tokens
+
+
+# Only the beginning of the GDD is used as the query text, embedding models have a small input limit.
+QUERY_MAX_CHARS = 2000
+
+
+def retrieve_code_examples(
+        gdd_context: str,
+        top_k: int | None = None,
+        token_budget: int | None = None,
+        tags: dict | None = None
+) -> list[str]:
+    """
+    Retrieve verified code snippets of previously passing games which are similar to the given GDD.
+    With tags, the snippets of games sharing the genre (or a mechanic) come first, the other verified
+    snippets are only used when none matches.
+    Snippets are taken in similarity order until the token budget is used up.
+    :param gdd_context: The GDD context used as the query
+    :type gdd_context: str
+
+    :param top_k: The number of candidates to fetch from the RAG store
+    :type top_k: int | None
+
+    :param token_budget: The maximum number of tokens of all returned snippets
+    :type token_budget: int | None
+
+    :param tags: The genre / mechanics of the GDD (extract_game_tags)
+    :type tags: dict | None
+
+    :return: The code snippets, most similar first (empty when RAG is disabled or unavailable)
+    :rtype: list[str]
+    """
+    if not config.RAG_ENABLED or not gdd_context:
+        return []
+
+    top_k = top_k or config.RAG_TOP_K
+    token_budget = token_budget or config.RAG_TOKEN_BUDGET
+
+    try:
+        from src.rag_service.rag import get_rag_service
+        from src.rag_service.ingest import tag_filter
+    except ImportError as e:
+        print(f"[Member 2] RAG 套件未安裝，略過範例檢索: {e}")
+        return []
+
+    rag = get_rag_service()
+    if rag is None:
+        return []
+
+    query = gdd_context[:QUERY_MAX_CHARS]
+    filters = tag_filter(tags) if tags else None
+    try:
+        documents = []
+        if filters is not None:
+            documents = (rag.query(query, filters=filters, n_results=top_k).get("documents") or [[]])[0]
+        if not documents:
+            result = rag.query(query, filters={"verified": True}, n_results=top_k)
+            documents = (result.get("documents") or [[]])[0]
+    except Exception as e:
+        print(f"[Member 2] RAG 查詢失敗，略過範例檢索: {e}")
+        return []
+
+    examples: list[str] = []
+    used_tokens = 0
+    for document in documents:
+        if not document:
+            continue
+        cost = estimate_tokens(document)
+        if used_tokens + cost > token_budget:
+            continue
+        examples.append(document)
+        used_tokens += cost
+
+    print(f"[Member 2] Retrieved {len(examples)} verified snippets (~{used_tokens} tokens)")
+    return examples
+
+
+def format_code_examples(examples: list[str]) -> str:
+    """
+    Format the retrieved snippets as few-shot context for the programmer prompt.
+    :param examples: The code snippets
+    :type examples: list[str]
+
+    :return: The formatted context, or an empty string when there is no snippet
+    :rtype: str
+    """
+    if not examples:
+        return ""
+
+    blocks = [f"# Reference {i}\n```python\n{example.strip()}\n```" for i, example in enumerate(examples, start=1)]
+    return "\n\n".join(blocks)
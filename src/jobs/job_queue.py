@@ -0,0 +1,419 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from contextlib import closing
+from typing import Optional
+
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+FINISHED_STATUSES = (JOB_SUCCEEDED, JOB_FAILED)
+
+# Identifies this process instance in the owner of its running jobs: "<host>:<pid>:<token>".
+# The token tells a restarted process apart from the dead one when the pid is reused (e.g. pid 1 in a container)
+_PROCESS_TOKEN = uuid.uuid4().hex[:12]
+
+
+def process_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{_PROCESS_TOKEN}"
+
+
+def _owner_is_dead(owner: Optional[str]) -> bool:
+    """Whether the owner of a running job is a process of this host which no longer runs."""
+    host, _, rest = (owner or "").partition(":")
+    pid, _, token = rest.partition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        # Processes of other hosts are only judged by their lease
+        return False
+    if int(pid) == os.getpid():
+        return token != _PROCESS_TOKEN
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except (PermissionError, OSError):
+        return False
+    return False
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    status: str
+    payload: dict = field(default_factory=dict)
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    created_at: float = 0.0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    heartbeat_at: Optional[float] = None
+    owner: Optional[str] = None
+    attempt: int = 0
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "heartbeat_at": self.heartbeat_at,
+            "attempt": self.attempt,
+        }
+
+
+class JobQueue:
+    """
+    A local job queue backed by SQLite, so no external broker is required.
+    Every job also owns an append-only event log, which is used for the progress streams.
+    A running job is leased to the process which claimed it: the worker renews heartbeat_at while it runs
+    the job (heartbeat), and a job whose lease expired (lease_seconds without heartbeat) or whose process
+    died is put back to the queue (requeue_expired, requeue_dead_owners).
+    Each claim is a new attempt of the job: only the worker of the current attempt can finish the job,
+    and the event log only shows the events of the current attempt.
+    """
+
+    def __init__(self, db_path: str, lease_seconds: float = 60.0):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self._wakeup = threading.Condition()
+        self._listeners: list = []
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    dedupe_key TEXT,
+                    owner TEXT,
+                    heartbeat_at REAL,
+                    attempt INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            columns = [row["name"] for row in conn.execute("PRAGMA table_info(jobs)")]
+            # Databases created before these columns were added
+            if "dedupe_key" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN dedupe_key TEXT")
+            if "owner" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+            if "heartbeat_at" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+            if "attempt" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN attempt INTEGER NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_dedupe ON jobs (kind, dedupe_key, status)")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS job_events (
+                    job_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    message TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    attempt INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (job_id, seq)
+                )
+                """
+            )
+            event_columns = [row["name"] for row in conn.execute("PRAGMA table_info(job_events)")]
+            if "attempt" not in event_columns:
+                conn.execute("ALTER TABLE job_events ADD COLUMN attempt INTEGER NOT NULL DEFAULT 0")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _row_to_job(row: sqlite3.Row) -> Job:
+        return Job(
+            id=row["id"],
+            kind=row["kind"],
+            status=row["status"],
+            payload=json.loads(row["payload"]),
+            result=json.loads(row["result"]) if row["result"] else None,
+            error=row["error"],
+            created_at=row["created_at"],
+            started_at=row["started_at"],
+            finished_at=row["finished_at"],
+            heartbeat_at=row["heartbeat_at"],
+            owner=row["owner"],
+            attempt=row["attempt"],
+        )
+
+    def _requeue_expired(self, conn: sqlite3.Connection) -> int:
+        cursor = conn.execute(
+            "UPDATE jobs SET status = ?, started_at = NULL, owner = NULL, heartbeat_at = NULL "
+            "WHERE status = ? AND COALESCE(heartbeat_at, started_at) < ?",
+            (JOB_QUEUED, JOB_RUNNING, time.time() - self.lease_seconds)
+        )
+        return cursor.rowcount
+
+    def submit(self, kind: str, payload: dict, dedupe_key: Optional[str] = None) -> str:
+        """
+        Add a job to the queue.
+        :param kind: The job kind, used to pick the handler
+        :type kind: str
+
+        :param payload: The JSON serializable job arguments
+        :type payload: dict
+
+        :param dedupe_key: When a queued or running job of the same kind has this key, no new job is added
+                           and the id of that job is returned. A running job whose lease expired is requeued
+                           first, so its id is still returned and the job runs again.
+        :type dedupe_key: Optional[str]
+
+        :return: The job id
+        :rtype: str
+        """
+        job_id = uuid.uuid4().hex
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            if dedupe_key is not None:
+                self._requeue_expired(conn)
+                row = conn.execute(
+                    "SELECT id FROM jobs WHERE kind = ? AND dedupe_key = ? AND status IN (?, ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (kind, dedupe_key, JOB_QUEUED, JOB_RUNNING)
+                ).fetchone()
+                if row is not None:
+                    conn.execute("COMMIT")
+                    return row["id"]
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, payload, created_at, dedupe_key) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, JOB_QUEUED, json.dumps(payload, ensure_ascii=False), time.time(), dedupe_key)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def add_listener(self, callback):
+        """
+        Call callback(job_id) after an event is added to a job or the job finished in this process,
+        so streams can wake up immediately instead of polling the database.
+        """
+        self._listeners.append(callback)
+
+    def _notify(self, job_id: str):
+        for callback in list(self._listeners):
+            try:
+                callback(job_id)
+            except Exception as e:
+                print(f"[Jobs] listener 執行失敗: {e}")
+
+    def claim(self) -> Optional[Job]:
+        """
+        Atomically take the oldest queued job and mark it as running.
+        :return: The claimed job, or None when the queue is empty
+        :rtype: Optional[Job]
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1",
+                (JOB_QUEUED,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            started_at = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, owner = ?, heartbeat_at = ?, attempt = attempt + 1 "
+                "WHERE id = ?",
+                (JOB_RUNNING, started_at, process_owner(), started_at, row["id"])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        job = self._row_to_job(row)
+        job.status = JOB_RUNNING
+        job.started_at = started_at
+        job.heartbeat_at = started_at
+        job.owner = process_owner()
+        job.attempt += 1
+        return job
+
+    def heartbeat(self, job_ids: list[str]) -> int:
+        """
+        Renew the lease of running jobs of this process.
+        :return: The number of renewed jobs
+        :rtype: int
+        """
+        if not job_ids:
+            return 0
+        placeholders = ", ".join("?" for _ in job_ids)
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                f"UPDATE jobs SET heartbeat_at = ? WHERE status = ? AND owner = ? AND id IN ({placeholders})",
+                (time.time(), JOB_RUNNING, process_owner(), *job_ids)
+            )
+            return cursor.rowcount
+
+    def wait_for_job(self, timeout: float):
+        """Block until a job is submitted in this process or the timeout expires."""
+        with self._wakeup:
+            self._wakeup.wait(timeout)
+
+    def _finish(self, job: Job, status: str, result: Optional[dict], error: Optional[str]) -> bool:
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? "
+                "WHERE id = ? AND status = ? AND owner = ? AND attempt = ?",
+                (status, json.dumps(result, ensure_ascii=False) if result is not None else None, error,
+                 time.time(), job.id, JOB_RUNNING, job.owner, job.attempt)
+            )
+        if not cursor.rowcount:
+            print(f"[Jobs] 任務 {job.id} 已被重新排入，忽略第 {job.attempt} 次執行的結果")
+            return False
+        self._notify(job.id)
+        return True
+
+    def complete(self, job: Job, result: dict) -> bool:
+        """
+        Mark the claimed job as succeeded.
+        :param job: The job as returned by claim (its owner and attempt)
+        :type job: Job
+
+        :return: False when the attempt lost the job (its lease expired and the job was requeued)
+        :rtype: bool
+        """
+        return self._finish(job, JOB_SUCCEEDED, result, None)
+
+    def fail(self, job: Job, error: str) -> bool:
+        """
+        Mark the claimed job as failed.
+        :return: False when the attempt lost the job (its lease expired and the job was requeued)
+        :rtype: bool
+        """
+        return self._finish(job, JOB_FAILED, None, error)
+
+    def requeue_expired(self) -> int:
+        """
+        Put running jobs without heartbeat for lease_seconds back to the queue: their process died or
+        can no longer reach the database. The lease thread of a live process also renews the jobs of a hung
+        worker thread, so a job which hangs inside its handler is not requeued (the stages bound their own time).
+        :return: The number of requeued jobs
+        :rtype: int
+        """
+        with closing(self._connect()) as conn:
+            requeued = self._requeue_expired(conn)
+        if requeued:
+            with self._wakeup:
+                self._wakeup.notify_all()
+        return requeued
+
+    def requeue_dead_owners(self) -> int:
+        """
+        Put running jobs of dead processes of this host (e.g. before a restart) back to the queue right away,
+        without waiting for their lease to expire.
+        :return: The number of requeued jobs
+        :rtype: int
+        """
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT id, owner FROM jobs WHERE status = ?", (JOB_RUNNING,)).fetchall()
+            dead = [row["id"] for row in rows if _owner_is_dead(row["owner"])]
+            for job_id in dead:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, started_at = NULL, owner = NULL, heartbeat_at = NULL "
+                    "WHERE id = ? AND status = ?",
+                    (JOB_QUEUED, job_id, JOB_RUNNING)
+                )
+        if dead:
+            with self._wakeup:
+                self._wakeup.notify_all()
+        return len(dead)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def add_event(self, job_id: str, message: str, attempt: Optional[int] = None) -> int:
+        """
+        Append a progress message to the event log of a job.
+        :param attempt: The attempt which emitted the event, the current attempt of the job by default.
+                        Events of an older attempt are kept but no longer streamed (events_since).
+        :type attempt: Optional[int]
+
+        :return: The sequence number of the event (starting from 1, increasing across attempts)
+        :rtype: int
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            seq = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) + 1 FROM job_events WHERE job_id = ?",
+                (job_id,)
+            ).fetchone()[0]
+            if attempt is None:
+                row = conn.execute("SELECT attempt FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                attempt = row["attempt"] if row else 0
+            conn.execute(
+                "INSERT INTO job_events (job_id, seq, message, created_at, attempt) VALUES (?, ?, ?, ?, ?)",
+                (job_id, seq, message, time.time(), attempt)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        self._notify(job_id)
+        return seq
+
+    def events_since(self, job_id: str, after_seq: int = 0) -> list[tuple[int, str]]:
+        """
+        Read the events of the current attempt of a job with a sequence number greater than after_seq.
+        A requeued job does not replay the output of its previous attempt, and since the sequence numbers
+        keep increasing a reconnecting stream (Last-Event-ID) continues with the new attempt.
+        :rtype: list[tuple[int, str]]
+        """
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT e.seq, e.message FROM job_events e JOIN jobs j ON j.id = e.job_id "
+                "WHERE e.job_id = ? AND e.seq > ? AND e.attempt = j.attempt ORDER BY e.seq",
+                (job_id, after_seq)
+            ).fetchall()
+        return [(row["seq"], row["message"]) for row in rows]
@@ -0,0 +1,141 @@
+import json
+import os
+from typing import Callable
+
+from config import config
+from src.artifacts.store import ARTIFACT_CODE, ARTIFACT_FIX_HISTORY, ARTIFACT_GDD, get_artifact_store
+from src.artifacts.checkpoints import Checkpoints, STAGE_DESIGN
+from src.design.chains import run_design_phase
+from src.generation.core import run_core_phase
+from src.generation.file_utils import save_code_to_file
+from src.design.gdd import GameDesign
+from src.jobs.job_queue import Job
+from src.llm.routing import ModelRouting, ROUTE_DESIGN
+from src.rag_service.semantic_cache import lookup_generation
+from src.testing.fixer import run_fix_loop
+
+
+JOB_KIND_GENERATE = "generate"
+JOB_KIND_FIX = "fix"
+
+
+def run_generation_job(job: Job, emit: Callable[[str], None]) -> dict:
+    """
+    Job handler of the generation pipeline: semantic cache -> design phase -> core phase.
+    Each job writes into its own output directory, so concurrent workers do not overwrite each other.
+    The GDD and the code are saved in the artifact store under the job id, which is the run id of the session.
+    Every stage is checkpointed, so a requeued job or a new job with the same input skips the stages which
+    already completed. With regenerate, the semantic cache and the checkpoints of other runs are skipped. After a crash or a deploy the job is requeued when the process restarts (same host),
+    or within Config.JOB_LEASE_SECONDS (60s) when its worker is gone for good.
+    :param job: The job, payload keys: user_input, provider, model_name, design_mode (optional),
+                stage_models (optional, the provider / model of some stages, see ModelRouting),
+                regenerate (optional, do not reuse earlier results of the same idea)
+    :type job: Job
+
+    :param emit: The progress callback
+    :type emit: Callable[[str], None]
+
+    :return: The job result (game_file_path, auto_start_fix, cached, artifacts: artifact ids by name)
+    :rtype: dict
+    """
+    user_input = job.payload["user_input"]
+    provider = job.payload["provider"]
+    model_name = job.payload["model_name"]
+    design_mode = job.payload.get("design_mode") or config.DESIGN_MODE
+    routing = ModelRouting(provider, model_name, job.payload.get("stage_models"))
+    output_dir = os.path.join(config.OUTPUT_DIR, job.id)
+    regenerate = bool(job.payload.get("regenerate"))
+    checkpoints = Checkpoints(job.id, regenerate=regenerate)
+
+    emit(f"[Member 1] 收到需求: {user_input}")
+    if routing.describe():
+        emit(f"🔀 各階段模型: {routing.describe()}")
+
+    # --- Phase 0: Semantic cache ---
+    cached = None if regenerate else lookup_generation(user_input, routing)
+    if cached and cached.code and config.SEMANTIC_CACHE_MODE == "full":
+        emit(f"⚡ 找到相似的已驗證遊戲 (相似度 {cached.similarity:.2f})，直接使用快取結果。")
+        file_path = save_code_to_file(f"```python\n{cached.code}\n```", output_dir=output_dir)
+        artifacts = _save_artifacts(job.id, cached.gdd, file_path)
+        return {"game_file_path": file_path, "auto_start_fix": False, "cached": True, "artifacts": artifacts}
+
+    # --- Phase 1: Design ---
+    if cached:
+        emit(f"⚡ 重複使用相似點子的 GDD (相似度 {cached.similarity:.2f})")
+        gdd = cached.gdd
+    else:
+        emit("[Member 1] 設計階段 (CEO → CPO) 進行中...")
+        designer = routing.route(ROUTE_DESIGN)
+        gdd = GameDesign.coerce(checkpoints.run(
+            STAGE_DESIGN, (user_input, designer.provider, designer.model, design_mode),
+            lambda: run_design_phase(user_input, designer.provider, designer.model, mode=design_mode,
+                                     fallbacks=designer.fallbacks).to_json()
+        ))
+    emit("✅ GDD 完成")
+
+    # --- Phase 2: Core ---
+    emit("[Member 2] 美術素材與程式碼生成中...")
+    file_path = run_core_phase(gdd, provider, model_name, output_dir=output_dir, checkpoints=checkpoints,
+                               routing=routing)
+    if not file_path:
+        raise RuntimeError("程式碼生成失敗，未能解析出 Python Block。")
+    if checkpoints.hits:
+        emit(f"♻️ 重複使用已完成的階段: {', '.join(checkpoints.hits)}")
+    emit("✅ 核心代碼生成完畢")
+
+    artifacts = _save_artifacts(job.id, gdd, file_path)
+    return {"game_file_path": file_path, "auto_start_fix": True, "cached": False, "artifacts": artifacts}
+
+
+def run_fix_job(job: Job, emit: Callable[[str], None]) -> dict:
+    """
+    Job handler of the fix loop. Every message of run_fix_loop is written to the job event log,
+    so the SSE stream can be reconnected without restarting (or duplicating) the loop.
+    :param job: The job, payload keys: run_id, game_file_path, provider, model_name, user_input,
+                stage_models (optional)
+    :type job: Job
+
+    :param emit: The progress callback
+    :type emit: Callable[[str], None]
+
+    :return: The job result (passed, artifacts: artifact ids by name)
+    :rtype: dict
+    """
+    run_id = job.payload["run_id"]
+    file_path = job.payload["game_file_path"]
+    store = get_artifact_store()
+
+    gdd_artifact = store.get_run_artifact(run_id, ARTIFACT_GDD)
+    if gdd_artifact is None:
+        raise RuntimeError("找不到此次生成的 GDD，無法開始驗證。")
+
+    history = []
+    passed = False
+    routing = ModelRouting(job.payload["provider"], job.payload["model_name"], job.payload.get("stage_models"))
+    for message in run_fix_loop(GameDesign.coerce(gdd_artifact[1]), file_path, job.payload["provider"],
+                                job.payload["model_name"], job.payload.get("user_input"), Checkpoints(run_id),
+                                routing=routing):
+        # run_fix_loop yields SSE frames, the event log keeps the bare message
+        message = message.removeprefix("data: ").strip()
+        passed = passed or message.startswith("RESULT_SUCCESS")
+        history.append(message)
+        emit(message)
+
+    # Keep the fixed code and the log of this fix run
+    with open(file_path, "r", encoding="utf-8") as f:
+        code = f.read()
+    artifacts = store.save_run_artifacts(run_id, **{ARTIFACT_CODE: code,
+                                                    ARTIFACT_FIX_HISTORY: json.dumps(history, ensure_ascii=False)})
+    return {"passed": passed, "artifacts": artifacts}
+
+
+def _save_artifacts(run_id: str, gdd: GameDesign, file_path: str) -> dict[str, str]:
+    with open(file_path, "r", encoding="utf-8") as f:
+        code = f.read()
+    return get_artifact_store().save_run_artifacts(run_id, **{ARTIFACT_GDD: gdd.to_json(), ARTIFACT_CODE: code})
+
+
+JOB_HANDLERS = {
+    JOB_KIND_GENERATE: run_generation_job,
+    JOB_KIND_FIX: run_fix_job,
+}
@@ -0,0 +1,128 @@
+import threading
+import traceback
+from typing import Callable
+
+from config import config
+from src.jobs.job_queue import Job, JobQueue
+
+
+# A handler receives the job and an emit(message) callback for progress, and returns the JSON result
+JobHandler = Callable[[Job, Callable[[str], None]], dict]
+
+_job_queue: JobQueue | None = None
+_worker_pool: "WorkerPool | None" = None
+_lock = threading.Lock()
+
+
+class WorkerPool:
+    """
+    A pool of background threads processing jobs from the JobQueue.
+    The pool size bounds the number of concurrent generations, so it can be sized to the provider rate limits.
+    A lease thread renews the lease of the jobs running in the pool every heartbeat_interval seconds,
+    and requeues the jobs of any process whose lease expired. A worker whose job was requeued meanwhile
+    cannot overwrite the result of the new attempt (JobQueue.complete / fail).
+    """
+
+    def __init__(self, job_queue: JobQueue, handlers: dict[str, JobHandler], num_workers: int = 2,
+                 poll_interval: float = 1.0, heartbeat_interval: float = 10.0):
+        self.job_queue = job_queue
+        self.handlers = handlers
+        self.num_workers = max(1, num_workers)
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self._threads: list[threading.Thread] = []
+        self._stop = threading.Event()
+        self._running: set[str] = set()
+        self._running_lock = threading.Lock()
+
+    def start(self):
+        for i in range(self.num_workers):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._renew_leases, name="job-lease", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        print(f"[Jobs] 已啟動 {self.num_workers} 個背景 worker")
+
+    def _renew_leases(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            try:
+                with self._running_lock:
+                    running = list(self._running)
+                self.job_queue.heartbeat(running)
+                requeued = self.job_queue.requeue_expired()
+                if requeued:
+                    print(f"[Jobs] 重新排入 {requeued} 個租約過期的任務")
+            except Exception as e:
+                print(f"[Jobs] 無法更新任務租約: {e}")
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                job = self.job_queue.claim()
+            except Exception as e:
+                print(f"[Jobs] 無法讀取任務佇列: {e}")
+                job = None
+
+            if job is None:
+                self.job_queue.wait_for_job(self.poll_interval)
+                continue
+
+            with self._running_lock:
+                self._running.add(job.id)
+            try:
+                self._process(job)
+            finally:
+                with self._running_lock:
+                    self._running.discard(job.id)
+
+    def _process(self, job: Job):
+        handler = self.handlers.get(job.kind)
+        if handler is None:
+            self.job_queue.fail(job, f"Unknown job kind: {job.kind}")
+            return
+
+        def emit(message: str):
+            self.job_queue.add_event(job.id, message, attempt=job.attempt)
+
+        if job.attempt > 1:
+            emit("🔁 任務先前中斷，重新執行中...")
+        try:
+            result = handler(job, emit)
+            self.job_queue.complete(job, result or {})
+        except Exception as e:
+            traceback.print_exc()
+            emit(f"❌ 任務失敗: {e}")
+            self.job_queue.fail(job, str(e))
+
+
+def get_job_queue() -> JobQueue:
+    """Return the shared JobQueue instance."""
+    global _job_queue
+    with _lock:
+        if _job_queue is None:
+            _job_queue = JobQueue(config.JOB_DB_PATH, config.JOB_LEASE_SECONDS)
+        return _job_queue
+
+
+def start_workers(handlers: dict[str, JobHandler]) -> WorkerPool:
+    """
+    Start the background worker pool once per process.
+    Jobs left running by a dead process of this host (crash, restart) are put back to the queue first,
+    the jobs of other hosts once their lease expired (Config.JOB_LEASE_SECONDS).
+    """
+    global _worker_pool
+    job_queue = get_job_queue()
+    with _lock:
+        if _worker_pool is None:
+            requeued = job_queue.requeue_dead_owners() + job_queue.requeue_expired()
+            if requeued:
+                print(f"[Jobs] 重新排入 {requeued} 個中斷的任務")
+            _worker_pool = WorkerPool(job_queue, handlers, config.JOB_WORKERS,
+                                      heartbeat_interval=config.JOB_HEARTBEAT_SECONDS)
+            _worker_pool.start()
+        return _worker_pool
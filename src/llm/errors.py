@@ -0,0 +1,14 @@
+class LLMCallError(Exception):
+    """An LLM request failed (configuration, network or provider error)."""
+
+
+class RateLimitedError(LLMCallError):
+    """The provider rejected the request because of its rate limit (HTTP 429)."""
+
+    def __init__(self, message: str, retry_after: float | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TransientLLMError(LLMCallError):
+    """The request failed for a reason which usually goes away (connection error, timeout, HTTP 5xx)."""
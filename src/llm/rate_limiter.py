@@ -0,0 +1,124 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from config import config
+
+
+def parse_retry_after(headers) -> float | None:
+    """
+    Read the waiting time (seconds) from the Retry-After header of a 429 response.
+    Only the delta-seconds form is supported, an HTTP date is ignored.
+    """
+    if not headers:
+        return None
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    A token bucket which hands out reservations instead of rejecting callers.
+    The balance may go negative, callers then wait until the refill covers their reservation,
+    which queues them in arrival order and keeps the admission rate smooth.
+    """
+
+    def __init__(self, capacity: float, per_minute: float):
+        self.capacity = capacity
+        self.rate = per_minute / 60.0
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def reserve(self, amount: float, now: float) -> float:
+        """
+        Take the amount from the bucket.
+        :return: The seconds to wait before the reservation is covered
+        :rtype: float
+        """
+        elapsed = now - self.updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated_at = now
+
+        # A single request can never need more than the whole bucket
+        self.tokens -= min(amount, self.capacity)
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+
+class ProviderLimiter:
+    """
+    Requests-per-minute and tokens-per-minute limits of one provider/model,
+    plus a semaphore limiting the number of in-flight requests.
+    A limit of 0 means unlimited.
+    """
+
+    def __init__(self, rpm: int, tpm: int, concurrency: threading.Semaphore | None):
+        self._lock = threading.Lock()
+        self.request_bucket = TokenBucket(rpm, rpm) if rpm > 0 else None
+        self.token_bucket = TokenBucket(tpm, tpm) if tpm > 0 else None
+        self.concurrency = concurrency
+        self.blocked_until = 0.0
+
+    def _reserve(self, tokens: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self.blocked_until - now)
+            if self.request_bucket:
+                wait = max(wait, self.request_bucket.reserve(1, now))
+            if self.token_bucket:
+                wait = max(wait, self.token_bucket.reserve(tokens, now))
+            return wait
+
+    def penalize(self, retry_after: float):
+        """Stop admitting requests for retry_after seconds (after the provider returned 429)."""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+    @contextmanager
+    def slot(self, tokens: int):
+        """
+        Wait until the request is admitted by both buckets and a concurrency slot is free.
+        :param tokens: The estimated number of tokens (prompt + completion) of the request
+        """
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+        if self.concurrency is None:
+            yield
+            return
+
+        with self.concurrency:
+            yield
+
+
+_limiters: dict[tuple[str, str], ProviderLimiter] = {}
+_semaphores: dict[str, threading.Semaphore] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str, model: str) -> ProviderLimiter:
+    """
+    Return the limiter of the provider/model. Buckets are per model, the concurrency limit is per provider.
+    """
+    provider = provider.lower()
+    if provider == "gemini":
+        provider = "google"
+    key = (provider, model)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            rpm, tpm, max_concurrency = config.LLM_RATE_LIMITS.get(provider, (0, 0, 0))
+
+            if provider not in _semaphores and max_concurrency > 0:
+                _semaphores[provider] = threading.BoundedSemaphore(max_concurrency)
+
+            limiter = ProviderLimiter(rpm, tpm, _semaphores.get(provider))
+            _limiters[key] = limiter
+        return limiter
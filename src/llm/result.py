@@ -0,0 +1,48 @@
+from dataclasses import dataclass, field
+from typing import Optional
+
+from src.llm.errors import LLMCallError
+
+
+# finish_reason values meaning the output was cut by the token limit (OpenAI / Gemini / Ollama)
+TRUNCATED_FINISH_REASONS = ("length", "MAX_TOKENS")
+
+
+@dataclass
+class LLMResult:
+    """
+    Result of call_llm. On failure `error` holds the message and `error_class` the exception name,
+    so pipeline stages can stop instead of treating the error message as model output.
+    """
+    content: str = ""
+    provider: str = ""
+    model: str = ""
+    finish_reason: Optional[str] = None
+    # prompt_tokens / completion_tokens / total_tokens when the provider reports them
+    usage: dict = field(default_factory=dict)
+    latency: float = 0.0
+    error: Optional[str] = None
+    error_class: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def truncated(self) -> bool:
+        return self.finish_reason in TRUNCATED_FINISH_REASONS
+
+    @property
+    def total_tokens(self) -> int:
+        return self.usage.get("total_tokens") or (
+            self.usage.get("prompt_tokens", 0) + self.usage.get("completion_tokens", 0)
+        )
+
+    def unwrap(self) -> str:
+        """
+        Return the content, or raise LLMCallError when the call failed.
+        :rtype: str
+        """
+        if not self.ok:
+            raise LLMCallError(self.error)
+        return self.content
@@ -0,0 +1,146 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, TypeVar
+
+from config import config
+from src.llm.errors import LLMCallError
+
+
+Route = tuple[str, str]
+T = TypeVar("T")
+
+# Minimum number of samples before the latency percentile is trusted for hedging
+MIN_LATENCY_SAMPLES = 5
+
+
+class LatencyTracker:
+    """Sliding window of successful request latencies per provider/model."""
+
+    def __init__(self, window: int = 100):
+        self._window = window
+        self._samples: dict[Route, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, route: Route, seconds: float):
+        with self._lock:
+            self._samples.setdefault(route, deque(maxlen=self._window)).append(seconds)
+
+    def percentile(self, route: Route, percentile: float) -> float | None:
+        with self._lock:
+            samples = sorted(self._samples.get(route, ()))
+        if len(samples) < MIN_LATENCY_SAMPLES:
+            return None
+        index = min(len(samples) - 1, int(round(percentile / 100 * (len(samples) - 1))))
+        return samples[index]
+
+
+latency_tracker = LatencyTracker()
+
+_hedge_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _hedge_executor
+    with _executor_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(max_workers=config.LLM_HEDGE_WORKERS, thread_name_prefix="llm-hedge")
+        return _hedge_executor
+
+
+def _timed_attempt(attempt: Callable[[str, str], T], route: Route) -> T:
+    started = time.monotonic()
+    result = attempt(*route)
+    latency_tracker.record(route, time.monotonic() - started)
+    return result
+
+
+def call_with_failover(
+        attempt: Callable[[str, str], T],
+        routes: list[Route],
+        hedge: bool = False
+) -> T:
+    """
+    Call the routes in order and fail over to the next one when a route raises LLMCallError.
+    :param attempt: Function sending the request to one (provider, model), raising LLMCallError on failure
+    :type attempt: Callable[[str, str], T]
+
+    :param routes: The ordered (provider, model) list, the first one is the primary
+    :type routes: list[Route]
+
+    :param hedge: Fire the next route when the running one is slower than its latency percentile,
+                  the first success wins
+    :type hedge: bool
+
+    :return: The response of the first successful route
+    :rtype: T
+    """
+    if not routes:
+        raise LLMCallError("Error: 沒有可用的 LLM Provider")
+
+    if not hedge or len(routes) == 1:
+        last_error: LLMCallError | None = None
+        for route in routes:
+            try:
+                return _timed_attempt(attempt, route)
+            except LLMCallError as e:
+                print(f"[LLM Router] {route[0]}/{route[1]} 失敗，切換下一個 Provider: {e}")
+                last_error = e
+        raise last_error
+
+    return _call_hedged(attempt, routes)
+
+
+def _hedge_delay(route: Route) -> float:
+    delay = latency_tracker.percentile(route, config.LLM_HEDGE_PERCENTILE)
+    if delay is None:
+        delay = config.LLM_HEDGE_DEFAULT_DELAY
+    return max(delay, config.LLM_HEDGE_MIN_DELAY)
+
+
+def _call_hedged(attempt: Callable[[str, str], T], routes: list[Route]) -> T:
+    """
+    Hedged requests: start the primary, and whenever the newest request runs longer than its
+    latency percentile (or a request fails) start the next route. The first success wins.
+    Losing requests which have not started yet are cancelled, running ones are abandoned
+    and their result is discarded.
+    """
+    executor = _get_executor()
+    pending: dict[Future, Route] = {}
+    remaining = list(routes)
+    last_error: LLMCallError | None = None
+
+    def launch():
+        route = remaining.pop(0)
+        pending[executor.submit(_timed_attempt, attempt, route)] = route
+        return route
+
+    newest = launch()
+    try:
+        while pending:
+            timeout = _hedge_delay(newest) if remaining else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if not done:
+                # The newest request is slower than usual: hedge with the next route
+                newest = launch()
+                print(f"[LLM Router] 請求過慢，啟動備援請求: {newest[0]}/{newest[1]}")
+                continue
+
+            for future in done:
+                route = pending.pop(future)
+                try:
+                    return future.result()
+                except LLMCallError as e:
+                    print(f"[LLM Router] {route[0]}/{route[1]} 失敗: {e}")
+                    last_error = e
+
+            if remaining and not pending:
+                newest = launch()
+    finally:
+        for future in pending:
+            future.cancel()
+
+    raise last_error or LLMCallError("Error: 所有 LLM Provider 皆失敗")
@@ -0,0 +1,103 @@
+from dataclasses import dataclass
+
+from config import config, parse_route_list
+from src.llm.router import Route
+
+
+# The LLM stages of the pipeline, each can be routed to its own provider / model
+ROUTE_DESIGN = "design"
+ROUTE_ART = "art"
+ROUTE_CODE = "code"
+ROUTE_FUZZ_LOGIC = "fuzz_logic"
+ROUTE_REVIEW = "review"
+ROUTE_FIX = "fix"
+MODEL_STAGES = (ROUTE_DESIGN, ROUTE_ART, ROUTE_CODE, ROUTE_FUZZ_LOGIC, ROUTE_REVIEW, ROUTE_FIX)
+
+
+def parse_stage_routes(value: dict | None) -> dict[str, list[Route]]:
+    """
+    Parse the per-request routes, e.g. {"review": "ollama:llama3:8b", "code": ["openai:gpt-4o", "groq:..."]}
+    :param value: The routes of each stage ("provider:model,provider:model" or a list of "provider:model")
+    :type value: dict | None
+
+    :return: The ordered (provider, model) list of each routed stage
+    :rtype: dict[str, list[Route]]
+
+    :raises ValueError: On an unknown stage or a route without provider
+    """
+    if not value:
+        return {}
+    if not isinstance(value, dict):
+        raise ValueError("stage_models must be an object: {stage: \"provider:model\"}")
+
+    routes = {}
+    for stage, stage_value in value.items():
+        if stage not in MODEL_STAGES:
+            raise ValueError(f"Unknown stage '{stage}', expected one of {', '.join(MODEL_STAGES)}")
+        items = stage_value if isinstance(stage_value, list) else str(stage_value or "").split(",")
+        items = [str(item).strip() for item in items if str(item).strip()]
+        invalid = [item for item in items if ":" not in item]
+        if invalid:
+            raise ValueError(f"Invalid route '{invalid[0]}' of stage '{stage}', expected provider:model")
+        if items:
+            routes[stage] = parse_route_list(",".join(items))
+    return routes
+
+
+def format_stage_routes(routes: dict[str, list[Route]]) -> dict[str, str]:
+    """The JSON form of parse_stage_routes (job payloads), parsed back by parse_stage_routes."""
+    return {stage: ",".join(f"{provider}:{model}" for provider, model in stage_routes)
+            for stage, stage_routes in routes.items()}
+
+
+@dataclass(frozen=True)
+class StageRoute:
+    """Provider / model of a stage, fallbacks=None means the default fallbacks (Config.LLM_FALLBACKS)."""
+    provider: str
+    model: str
+    fallbacks: list[Route] | None = None
+
+
+class ModelRouting:
+    """
+    Provider / model of each LLM stage of the pipeline. A stage uses, by priority:
+    the routes of the request (overrides), the routes of Config.LLM_STAGE_ROUTES, the provider / model of the form.
+    A routed stage falls back to its other routes, then to the provider / model of the form, then to
+    Config.LLM_FALLBACKS, so a small local model which is down does not fail the run.
+    """
+
+    def __init__(self, provider: str = "openai", model: str = "gpt-4o-mini", overrides: dict | None = None):
+        """
+        :raises ValueError: On invalid overrides (see parse_stage_routes)
+        """
+        self.provider = provider.lower()
+        self.model = model
+        self.overrides = parse_stage_routes(overrides)
+
+    @classmethod
+    def coerce(cls, routing: "ModelRouting | None", provider: str, model: str) -> "ModelRouting":
+        return routing if routing is not None else cls(provider, model)
+
+    def routes(self, stage: str) -> list[Route]:
+        return self.overrides.get(stage) or config.LLM_STAGE_ROUTES.get(stage) or []
+
+    def route(self, stage: str) -> StageRoute:
+        routes = self.routes(stage)
+        if not routes:
+            return StageRoute(self.provider, self.model)
+
+        primary = routes[0]
+        fallbacks = []
+        for route in routes[1:] + [(self.provider, self.model)] + list(config.LLM_FALLBACKS):
+            if route != primary and route not in fallbacks:
+                fallbacks.append(route)
+        return StageRoute(primary[0], primary[1], fallbacks)
+
+    def describe(self) -> str:
+        """The routed stages, e.g. "review=ollama/llama3:8b, fix=openai/gpt-4o" (empty when none is routed)."""
+        described = []
+        for stage in MODEL_STAGES:
+            route = self.route(stage)
+            if (route.provider, route.model) != (self.provider, self.model):
+                described.append(f"{stage}={route.provider}/{route.model}")
+        return ", ".join(described)
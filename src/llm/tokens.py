@@ -0,0 +1,245 @@
+import math
+import re
+import threading
+
+from config import config
+
+
+# Context windows (tokens) by model name prefix, the longest matching prefix wins
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4o": 128000,
+    "gpt-4.1": 1047576,
+    "gpt-4-turbo": 128000,
+    "gpt-3.5": 16385,
+    "gpt-5": 400000,
+    "o3": 200000,
+    "o4": 200000,
+    "llama3-8b-8192": 8192,
+    "llama3-70b-8192": 8192,
+    "llama-3.1": 131072,
+    "llama-3.3": 131072,
+    "llama3.1": 131072,
+    "llama3.2": 131072,
+    "llama3": 8192,
+    "mixtral": 32768,
+    "qwen2.5": 32768,
+    "gemini": 1048576,
+    "codestral": 256000,
+    "mistral": 32768,
+    "deepseek": 65536,
+    "mercury": 128000,
+}
+
+# Fallback when the model is unknown
+PROVIDER_CONTEXT_WINDOWS = {
+    "openai": 128000,
+    "groq": 8192,
+    "google": 1048576,
+    "gemini": 1048576,
+    "mistral": 32768,
+    "deepseek": 65536,
+    "inception": 128000,
+    "ollama": 8192,
+}
+
+# Tokens kept free to absorb the error of the token estimate and the chat template overhead
+CONTEXT_SAFETY_MARGIN = 256
+# Below this output budget the prompt is trimmed instead of shrinking max_tokens any further
+MIN_OUTPUT_TOKENS = 1024
+
+_tokenizer = None
+_tokenizer_loaded = False
+_tokenizer_lock = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token estimate (about 4 characters per token).
+    :param text: The text to measure
+    :type text: str
+
+    :return: The estimated number of tokens
+    :rtype: int
+    """
+    return len(text) // 4 + 1
+
+
+def _get_tokenizer():
+    """Load the tokenizer configured by LLM_TOKENIZER (tokenizer.json path or Hugging Face name) once."""
+    global _tokenizer, _tokenizer_loaded
+    with _tokenizer_lock:
+        if not _tokenizer_loaded:
+            _tokenizer_loaded = True
+            name = config.LLM_TOKENIZER
+            if name:
+                try:
+                    from tokenizers import Tokenizer
+                    if name.endswith(".json"):
+                        _tokenizer = Tokenizer.from_file(name)
+                    else:
+                        _tokenizer = Tokenizer.from_pretrained(name)
+                except Exception as e:
+                    print(f"[Tokens] 無法載入 tokenizer {name}，改用估算: {e}")
+        return _tokenizer
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens of the text with the configured tokenizer, or estimate them when there is none.
+    Code is denser than prose, so the estimate leans high (about 3.5 characters per token).
+    :param text: The text to measure
+    :type text: str
+
+    :return: The number of tokens
+    :rtype: int
+    """
+    if not text:
+        return 0
+    tokenizer = _get_tokenizer()
+    if tokenizer is not None:
+        return len(tokenizer.encode(text, add_special_tokens=False).ids)
+    return math.ceil(len(text) / 3.5)
+
+
+def context_window(provider: str, model: str) -> int:
+    """
+    Return the context window of the provider/model.
+    For Ollama the window is the largest num_ctx we are willing to allocate.
+    """
+    provider = provider.lower()
+    model_name = model.lower().split("/")[-1]
+
+    window = PROVIDER_CONTEXT_WINDOWS.get(provider, 8192)
+    best_prefix = ""
+    for prefix, size in MODEL_CONTEXT_WINDOWS.items():
+        if model_name.startswith(prefix) and len(prefix) > len(best_prefix):
+            best_prefix, window = prefix, size
+
+    if provider == "ollama":
+        window = min(window, config.OLLAMA_MAX_NUM_CTX) if best_prefix else config.OLLAMA_MAX_NUM_CTX
+    return window
+
+
+def fit_max_tokens(provider: str, model: str, prompt_tokens: int, max_tokens: int) -> int:
+    """
+    Shrink max_tokens so that prompt + output fits the context window.
+    :return: The output budget, at most max_tokens (0 or less when the prompt alone does not fit)
+    :rtype: int
+    """
+    available = context_window(provider, model) - prompt_tokens - CONTEXT_SAFETY_MARGIN
+    return min(max_tokens, available)
+
+
+def ollama_num_ctx(total_tokens: int) -> int:
+    """
+    Size num_ctx for Ollama: the smallest power of two >= total_tokens, between OLLAMA_NUM_CTX and
+    OLLAMA_MAX_NUM_CTX. Sizes are bucketed because every num_ctx change reloads the model (and drops its cache).
+    """
+    num_ctx = config.OLLAMA_NUM_CTX
+    while num_ctx < total_tokens and num_ctx < config.OLLAMA_MAX_NUM_CTX:
+        num_ctx *= 2
+    return min(num_ctx, config.OLLAMA_MAX_NUM_CTX)
+
+
+def compact_text(text: str) -> str:
+    """Remove trailing spaces and repeated blank lines, which cost tokens without adding content."""
+    text = re.sub(r"[ \t]+\n", "\n", text)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Trim the text to about max_tokens tokens.
+    Markdown documents (GDD) keep every heading: short sections are kept whole and only the long ones are cut,
+    so no section (e.g. Win/Loss conditions) disappears completely.
+    """
+    text = compact_text(text)
+    total = count_tokens(text)
+    if total <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+
+    # Leave some room for the "...(truncated)" markers
+    char_budget = int(len(text) * max_tokens / total * 0.95)
+    sections = re.split(r"(?m)^(?=#{1,6} )", text)
+    if len(sections) <= 1:
+        return text[:char_budget].rstrip() + "\n...(truncated)"
+
+    # Share the budget between the section bodies, the shortest ones first
+    parts = [section.partition("\n") for section in sections]
+    char_budget -= sum(len(heading) + 2 for heading, _, _ in parts)
+    keep = {}
+    order = sorted(range(len(parts)), key=lambda i: len(parts[i][2]))
+    for position, index in enumerate(order):
+        fair_share = max(0, char_budget) // (len(order) - position)
+        keep[index] = min(len(parts[index][2]), fair_share)
+        char_budget -= keep[index]
+
+    trimmed = []
+    for index, (heading, _, body) in enumerate(parts):
+        if keep[index] < len(body.rstrip()):
+            body = body[:keep[index]].rstrip() + "\n...(truncated)"
+        trimmed.append(f"{heading}\n{body}".rstrip())
+    return "\n\n".join(trimmed)
+
+
+class PromptBuilder:
+    """
+    Build the user prompt from sections so that system prompt + user prompt + output fits the context window
+    of the provider/model.
+    When the prompt is too large, the trimmable sections are cut, the one with the highest priority number first
+    (e.g. few-shot examples before the GDD). Sections which are not trimmable (code, assets) are kept as is.
+    """
+
+    def __init__(self, system_prompt: str, provider: str, model: str, max_tokens: int = 8192):
+        self.system_prompt = system_prompt
+        self.provider = provider
+        self.model = model
+        self.max_tokens = max_tokens
+        self._sections: list[dict] = []
+
+    def add(self, text: str, trim_priority: int | None = None) -> "PromptBuilder":
+        """
+        Add a section.
+        :param text: The section text
+        :type text: str
+
+        :param trim_priority: None keeps the section intact, otherwise higher numbers are trimmed first
+        :type trim_priority: int | None
+        """
+        self._sections.append({"text": text, "trim_priority": trim_priority})
+        return self
+
+    def _user_prompt(self) -> str:
+        return "\n\n".join(section["text"] for section in self._sections if section["text"])
+
+    def build(self) -> tuple[str, int]:
+        """
+        :return: (user prompt, max_tokens for the call)
+        :rtype: tuple[str, int]
+        """
+        window = context_window(self.provider, self.model)
+        output_tokens = min(self.max_tokens, max(MIN_OUTPUT_TOKENS, window // 4))
+        budget = window - output_tokens - CONTEXT_SAFETY_MARGIN - count_tokens(self.system_prompt)
+
+        user_prompt = self._user_prompt()
+        overflow = count_tokens(user_prompt) - budget
+        trimmable = sorted((s for s in self._sections if s["trim_priority"] is not None),
+                           key=lambda s: s["trim_priority"], reverse=True)
+
+        for section in trimmable:
+            if overflow <= 0:
+                break
+            section_tokens = count_tokens(section["text"])
+            section["text"] = truncate_to_tokens(section["text"], section_tokens - overflow)
+            user_prompt = self._user_prompt()
+            overflow = count_tokens(user_prompt) - budget
+
+        if overflow > 0:
+            print(f"[Tokens] Prompt 超出 {self.provider}/{self.model} 的 context window ({window}) 約 {overflow} tokens")
+
+        prompt_tokens = count_tokens(self.system_prompt) + count_tokens(user_prompt)
+        max_tokens = max(MIN_OUTPUT_TOKENS, fit_max_tokens(self.provider, self.model, prompt_tokens, self.max_tokens))
+        return user_prompt, max_tokens
@@ -0,0 +1,222 @@
+import ast
+import hashlib
+import queue
+import re
+import threading
+
+from config import config
+from src.design.gdd import GameDesign
+from src.llm.routing import ModelRouting
+
+
+# Keyword tables used to tag snippets with the game genre / mechanics described in the GDD
+GENRE_KEYWORDS = {
+    "platformer": ["platform", "jump over", "ledge"],
+    "shooter": ["shoot", "bullet", "laser", "spaceship"],
+    "puzzle": ["puzzle", "match", "2048", "tile", "sudoku"],
+    "snake": ["snake"],
+    "breakout": ["breakout", "brick", "paddle"],
+    "pool": ["pool", "billiard", "cue"],
+    "racing": ["race", "racing", "lap"],
+    "runner": ["runner", "endless", "dodge"],
+    "tower_defense": ["tower defense", "tower", "wave"],
+}
+
+MECHANIC_KEYWORDS = {
+    "keyboard": ["arrow key", "wasd", "space", "keyboard"],
+    "mouse": ["mouse", "click"],
+    "drag": ["drag", "slingshot", "pull back"],
+    "jump": ["jump"],
+    "shoot": ["shoot", "fire", "bullet"],
+    "grid": ["grid", "tile", "cell"],
+    "physics": ["gravity", "friction", "bounce", "physics"],
+    "score": ["score", "points"],
+    "timer": ["timer", "countdown", "time limit"],
+}
+
+# Chunks shorter than this are too trivial to be useful few-shot examples
+MIN_CHUNK_LINES = 3
+
+_ingest_queue: "queue.Queue[tuple[GameDesign, str, str | None, ModelRouting | None]]" = queue.Queue()
+_worker: threading.Thread | None = None
+_worker_lock = threading.Lock()
+
+
+def chunk_program(code: str) -> list[tuple[str, dict]]:
+    """
+    Split a game program into top level classes and functions using the ast module.
+    :param code: The source code of the game
+    :type code: str
+
+    :return: A list of (snippet source, metadata) tuples
+    :rtype: list[tuple[str, dict]]
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return []
+
+    chunks: list[tuple[str, dict]] = []
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef):
+            kind = "class"
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            kind = "function"
+        else:
+            continue
+
+        segment = ast.get_source_segment(code, node)
+        if not segment or segment.count("\n") + 1 < MIN_CHUNK_LINES:
+            continue
+
+        chunks.append((segment, {"kind": kind, "name": node.name}))
+
+    return chunks
+
+
+def extract_game_tags(gdd: GameDesign | str) -> dict:
+    """
+    Extract the title, genre and mechanics metadata from the GDD.
+    :param gdd: The GDD (a Markdown GDD is searched for its title heading)
+    :type gdd: GameDesign | str
+
+    :return: The metadata (Chroma only accepts scalar values, so lists are comma joined)
+    :rtype: dict
+    """
+    gdd = GameDesign.coerce(gdd)
+    text = gdd.to_markdown()
+    lower_gdd = text.lower()
+
+    title = gdd.title
+    title_match = re.search(r"game title[^\n]*\n+\s*[#*\-\s]*(.+)", text, re.IGNORECASE)
+    if not title and title_match:
+        title = title_match.group(1).strip(" *#")
+
+    genres = [genre for genre, words in GENRE_KEYWORDS.items() if any(w in lower_gdd for w in words)]
+    mechanics = [mechanic for mechanic, words in MECHANIC_KEYWORDS.items() if any(w in lower_gdd for w in words)]
+
+    return {
+        "game_title": title[:100],
+        "genre": ",".join(genres) or "unknown",
+        "mechanics": ",".join(mechanics),
+    }
+
+
+def tag_flags(tags: dict) -> dict:
+    """
+    One boolean metadata field per genre / mechanic of extract_game_tags, e.g. {"genre_shooter": True},
+    so a query can filter on a single tag (Chroma cannot match inside the comma joined values).
+    """
+    flags = {f"genre_{genre}": True for genre in tags.get("genre", "").split(",") if genre and genre != "unknown"}
+    flags.update({f"mechanic_{mechanic}": True for mechanic in tags.get("mechanics", "").split(",") if mechanic})
+    return flags
+
+
+def tag_filter(tags: dict) -> dict | None:
+    """
+    The Chroma where filter of verified snippets sharing a genre of the GDD, or a mechanic when
+    the genre is unknown.
+    :param tags: The tags of the GDD (extract_game_tags)
+    :type tags: dict
+
+    :return: The where filter, or None when the GDD has no tag
+    :rtype: dict | None
+    """
+    flags = tag_flags(tags)
+    conditions = [{key: True} for key in flags if key.startswith("genre_")]
+    conditions = conditions or [{key: True} for key in flags]
+    if not conditions:
+        return None
+    match = conditions[0] if len(conditions) == 1 else {"$or": conditions}
+    return {"$and": [{"verified": True}, match]}
+
+
+def ingest_validated_game(gdd: GameDesign, code: str) -> int:
+    """
+    Chunk a validated game and bulk insert the snippets into the RAG store.
+    :param gdd: The GDD of the game
+    :type gdd: GameDesign
+
+    :param code: The source code which passed all checks
+    :type code: str
+
+    :return: The number of inserted snippets (identical snippets are inserted once)
+    :rtype: int
+    """
+    from src.rag_service.rag import get_rag_service
+
+    rag = get_rag_service()
+    if rag is None:
+        return 0
+
+    chunks = chunk_program(code)
+    if not chunks:
+        return 0
+
+    game_id = hashlib.sha256(code.encode("utf-8")).hexdigest()
+    tags = extract_game_tags(gdd)
+
+    contents = [snippet for snippet, _ in chunks]
+    metadatas = [
+        {**chunk_meta, **tags, **tag_flags(tags), "game_id": game_id, "source": "validated_game", "verified": True}
+        for _, chunk_meta in chunks
+    ]
+    return len(rag.insert_many(contents, metadatas))
+
+
+def _ingest_worker():
+    from src.rag_service.semantic_cache import store_generation
+
+    while True:
+        gdd, code, user_input, routing = _ingest_queue.get()
+        try:
+            if config.RAG_ENABLED:
+                count = ingest_validated_game(gdd, code)
+                print(f"[RAG] 已寫入 {count} 個驗證通過的程式片段")
+            if user_input and routing and store_generation(user_input, gdd, code, routing):
+                print("[Cache] 已寫入語意快取")
+        except Exception as e:
+            print(f"[RAG] 寫入失敗: {e}")
+        finally:
+            _ingest_queue.task_done()
+
+
+def enqueue_validated_game(gdd: GameDesign, file_path: str, user_input: str | None = None,
+                           routing: ModelRouting | None = None) -> bool:
+    """
+    Queue a validated game for background ingestion, so the current request is not slowed down.
+    The code is read immediately because the file may be overwritten by the next generation.
+    :param gdd: The GDD of the game
+    :type gdd: GameDesign
+
+    :param file_path: The path to the validated game file
+    :type file_path: str
+
+    :param user_input: The original game idea, also stores the generation in the semantic cache when given
+    :type user_input: str | None
+
+    :param routing: The provider / model of each stage of the generation, the semantic cache is keyed by them
+    :type routing: ModelRouting | None
+
+    :return: Whether the game was queued
+    :rtype: bool
+    """
+    global _worker
+
+    if not config.RAG_ENABLED and not (config.SEMANTIC_CACHE_ENABLED and user_input and routing):
+        return False
+
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            code = f.read()
+    except OSError as e:
+        print(f"[RAG] 無法讀取 {file_path}: {e}")
+        return False
+
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_ingest_worker, name="rag-ingest", daemon=True)
+            _worker.start()
+
+    _ingest_queue.put((gdd, code, user_input, routing))
+    return True
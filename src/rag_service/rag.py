@@ -1,6 +1,8 @@
 import chromadb
 import hashlib
 import requests
+import threading
+import time
 from chromadb import QueryResult, EmbeddingFunction, Documents, Embeddings
 from chromadb.config import Settings
 from chromadb.utils import embedding_functions
@@ -169,8 +171,8 @@ class RagService:
     def hash_content(self, content):
         return hashlib.sha256(content.encode('utf-8')).hexdigest()
 
-    def insert(self, content: str, metadata: dict = None) -> str:
-        new_id = self.hash_content(content)
+    def insert(self, content: str, metadata: dict = None, doc_id: str = None) -> str:
+        new_id = doc_id or self.hash_content(content)
         if metadata is None:
             self.collection.upsert(
                 documents=[content],
@@ -184,6 +186,35 @@ class RagService:
             )
         return new_id
 
+    def insert_many(self, contents: list[str], metadatas: list[dict] = None) -> list[str]:
+        """
+        Bulk version of insert(), upsert all documents in one request.
+        Chroma rejects a batch which repeats an id (DuplicateIDError), so identical contents are only sent once.
+        """
+        if not contents:
+            return []
+
+        # Keep the first occurrence of each content, its id is the hash of the content
+        unique = {}
+        for index, content in enumerate(contents):
+            unique.setdefault(self.hash_content(content), index)
+        new_ids = list(unique)
+        contents = [contents[index] for index in unique.values()]
+        if metadatas is not None:
+            metadatas = [metadatas[index] for index in unique.values()]
+        if metadatas is None:
+            self.collection.upsert(
+                documents=contents,
+                ids=new_ids,
+            )
+        else:
+            self.collection.upsert(
+                documents=contents,
+                metadatas=metadatas,
+                ids=new_ids,
+            )
+        return new_ids
+
     def query(self, question: str, filters: dict = None, n_results: int = 3):
         return self.collection.query(
             query_texts=[question],
@@ -192,6 +223,36 @@ class RagService:
         )
 
 
+_rag_service: RagService | None = None
+_rag_failed_at: float | None = None
+_rag_lock = threading.Lock()
+
+
+def get_rag_service() -> RagService | None:
+    """
+    Return the shared RagService instance, creating it on first use.
+    Return None when RAG is disabled or the Chroma server cannot be reached,
+    so callers can simply skip retrieval. A failed connection is not retried for Config.RAG_RETRY_SECONDS,
+    so the requests do not all wait for the connection timeout while Chroma is down.
+    """
+    global _rag_service, _rag_failed_at
+
+    if not Config.RAG_ENABLED:
+        return None
+
+    with _rag_lock:
+        if _rag_service is None:
+            if _rag_failed_at is not None and time.monotonic() - _rag_failed_at < Config.RAG_RETRY_SECONDS:
+                return None
+            try:
+                _rag_service = RagService()
+            except Exception as e:
+                _rag_failed_at = time.monotonic()
+                print(f"[RAG] 無法初始化 RagService，{Config.RAG_RETRY_SECONDS:.0f} 秒後再試: {e}")
+                return None
+        return _rag_service
+
+
 
 if __name__ == "__main__":
     rag_config = RagConfig(collection_name="menu1")
@@ -0,0 +1,143 @@
+import hashlib
+import threading
+import time
+from dataclasses import dataclass
+
+from config import config
+from src.artifacts.store import get_artifact_store
+from src.design.gdd import GameDesign
+from src.llm.routing import ModelRouting
+
+
+@dataclass
+class CachedGeneration:
+    user_input: str
+    gdd: GameDesign
+    code: str
+    similarity: float
+
+
+_cache_service = None
+_cache_failed_at: float | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache_service():
+    """
+    Return the RagService of the generation cache collection, creating it on first use.
+    Return None when the cache is disabled or the Chroma server cannot be reached
+    (not retried for Config.RAG_RETRY_SECONDS after a failure).
+    """
+    global _cache_service, _cache_failed_at
+
+    if not config.SEMANTIC_CACHE_ENABLED:
+        return None
+
+    with _cache_lock:
+        if _cache_service is None:
+            if _cache_failed_at is not None and time.monotonic() - _cache_failed_at < config.RAG_RETRY_SECONDS:
+                return None
+            try:
+                from src.rag_service.rag import RagService, RagConfig
+
+                base_name = RagConfig().collection_name or "my_collection"
+                _cache_service = RagService(RagConfig(collection_name=f"{base_name}_generations"))
+            except Exception as e:
+                _cache_failed_at = time.monotonic()
+                print(f"[Cache] 無法初始化語意快取，{config.RAG_RETRY_SECONDS:.0f} 秒後再試: {e}")
+                return None
+        return _cache_service
+
+
+def _model_metadata(routing: ModelRouting) -> dict:
+    """The models which generated an entry, a hit must come from the same provider / model and stage routes."""
+    return {"provider": routing.provider, "model": routing.model, "stage_models": routing.describe()}
+
+
+def lookup_generation(user_input: str, routing: ModelRouting,
+                      threshold: float | None = None) -> CachedGeneration | None:
+    """
+    Find a previously validated generation of the same models whose idea is similar to the given user input.
+    :param user_input: The game idea of the user
+    :type user_input: str
+
+    :param routing: The provider / model of each stage of the request
+    :type routing: ModelRouting
+
+    :param threshold: The minimum cosine similarity to count as a hit
+    :type threshold: float | None
+
+    :return: The cached generation, or None on a miss
+    :rtype: CachedGeneration | None
+    """
+    cache = get_cache_service()
+    if cache is None or not user_input:
+        return None
+
+    threshold = config.SEMANTIC_CACHE_THRESHOLD if threshold is None else threshold
+    filters = {"$and": [{key: value} for key, value in _model_metadata(routing).items()]}
+
+    try:
+        result = cache.query(user_input, filters=filters, n_results=1)
+    except Exception as e:
+        print(f"[Cache] 查詢失敗: {e}")
+        return None
+
+    documents = (result.get("documents") or [[]])[0]
+    metadatas = (result.get("metadatas") or [[]])[0]
+    distances = (result.get("distances") or [[]])[0]
+    if not documents or not metadatas or not distances:
+        return None
+
+    # The collection uses the cosine space, so distance = 1 - similarity
+    similarity = 1.0 - distances[0]
+    metadata = metadatas[0] or {}
+    if similarity < threshold:
+        return None
+
+    # The metadata only holds the artifact ids, a missing artifact (e.g. a cleaned artifact dir) is a miss
+    store = get_artifact_store()
+    gdd = store.get_text(metadata.get("gdd_artifact", ""))
+    code = store.get_text(metadata.get("code_artifact", ""))
+    if gdd is None or code is None:
+        return None
+
+    print(f"[Cache] 命中語意快取 (similarity={similarity:.3f}): {documents[0][:50]}")
+    return CachedGeneration(
+        user_input=documents[0],
+        gdd=GameDesign.coerce(gdd),
+        code=code,
+        similarity=similarity
+    )
+
+
+def store_generation(user_input: str, gdd: GameDesign, code: str, routing: ModelRouting) -> bool:
+    """
+    Store a validated generation, keyed by the embedding of the user input and the models which generated it.
+    The GDD and the code are saved in the artifact store, the cache entry only references them.
+    :param user_input: The game idea of the user
+    :type user_input: str
+
+    :param gdd: The GDD of the generation
+    :type gdd: GameDesign
+
+    :param code: The code which passed all checks
+    :type code: str
+
+    :param routing: The provider / model of each stage of the generation
+    :type routing: ModelRouting
+
+    :return: Whether the generation was stored
+    :rtype: bool
+    """
+    cache = get_cache_service()
+    if cache is None or not user_input:
+        return False
+
+    store = get_artifact_store()
+    models = _model_metadata(routing)
+    # The same idea generated by other models is another entry
+    doc_id = hashlib.sha256("\n".join([*models.values(), user_input]).encode("utf-8")).hexdigest()
+    cache.insert(user_input, metadata={**models, "gdd_artifact": store.put(gdd.to_json()),
+                                       "code_artifact": store.put(code), "verified": True}, doc_id=doc_id)
+    return True
@@ -1,13 +1,31 @@
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Any, Generator
 
 from src.utils import call_llm
-from src.testing.prompts import FIXER_PROMPT, LOGIC_REVIEW_PROMPT, LOGIC_FIXER_PROMPT
+from src.testing.prompts import (FIXER_PROMPT, FIXER_INPUT, LOGIC_REVIEW_PROMPT, LOGIC_REVIEW_INPUT,
+                                 LOGIC_FIXER_PROMPT, LOGIC_FIXER_INPUT, PERFORMANCE_FIXER_PROMPT,
+                                 PERFORMANCE_FIXER_INPUT)
 from src.generation.file_utils import save_code_to_file
-from src.testing.fuzzer import run_fuzz_test
+from src.testing.fuzzer import (run_fuzz_report, run_conformance_test, get_dynamic_fuzz_logic,
+                                PERFORMANCE_ERROR_PREFIX)
+from src.rag_service.ingest import enqueue_validated_game
+from src.llm.errors import LLMCallError
+from src.design.gdd import GameDesign
+from src.artifacts.checkpoints import Checkpoints, STAGE_FIX, checkpoint_key
+from src.testing.scheduler import (FixBudget, FixScheduler, CHECK_SYNTAX, CHECK_CONFORMANCE, CHECK_FUZZ,
+                                   CHECK_REVIEW, code_hash)
+from src.testing.validation_cache import get_validation_cache, validation_key
+from src.llm.routing import ModelRouting, ROUTE_REVIEW, ROUTE_FIX
 from config import config
 import os
 import ast
 
+REVIEW_SKIPPED_MESSAGE = "✅ 邏輯正確 (執行檢查已確認畫面與狀態流程，略過 LLM 審查)"
+# The review answers PASS or FAIL with a short reason, the code fits OLLAMA_NUM_CTX with this output budget
+REVIEW_MAX_TOKENS = 512
+# Fix prompts by priority, when checks of one stage fail together the first fix type wins
+FIX_TYPE_PRIORITY = ("syntax", "logic", "performance")
+
 def static_code_check(file_path: str) -> tuple[bool, str]:
     """
     Use Python ast module, inspecting the syntax errors.
@@ -23,25 +41,59 @@ def static_code_check(file_path: str) -> tuple[bool, str]:
     except Exception as e:
         return False, f"其他錯誤 ❌: {e}"
 
-def game_logic_check(gdd:str ,file_path: str, provider: str = "openai", model: str = "gpt-4o-mini") -> tuple[bool, str]:
+def game_logic_check(gdd: GameDesign, file_path: str, provider: str = "openai", model: str = "gpt-4o-mini",
+                     budget: Optional[FixBudget] = None,
+                     fallbacks: Optional[list[tuple[str, str]]] = None) -> tuple[bool, str]:
+    """
+    Ask the LLM reviewer whether the code is logically correct.
+    The review checklist is generic, so no GDD field is sent.
+    The tokens of the call are charged to the budget of the fix loop.
+    Raise LLMCallError when the review call itself failed, so an error message is never taken as a review.
+    """
     with open(file_path, "r", encoding="utf-8") as f:
         code = f.read()
-    prompt = LOGIC_REVIEW_PROMPT.format(code=code)
-    response = call_llm("You are a code logic reviewer.",
+    prompt = LOGIC_REVIEW_INPUT.format(code=code)
+    result = call_llm(LOGIC_REVIEW_PROMPT,
              prompt,
              provider=provider,
-             model=model
+             model=model,
+             max_tokens=REVIEW_MAX_TOKENS,
+             fallbacks=fallbacks
     )
+    if budget is not None:
+        budget.charge(result)
+    response = result.unwrap()
     print(f"[Member 3]: response of game_logic_check {response}")
     if "PASS" in response.upper() : return True, ""
     return False, response
 
+def logic_review_needed(fuzz_report: dict, conformance_report: Optional[dict] = None) -> bool:
+    """
+    Whether the LLM logic review still has to run after a passed fuzz test (config.LOGIC_REVIEW_MODE):
+    "always", "never", or "gated": only when neither the fuzz run verified a live game
+    (the screen changed and the state machine left START, see the harness liveness report)
+    nor the scripted conformance run passed.
+    """
+    if config.LOGIC_REVIEW_MODE == "always":
+        return True
+    if config.LOGIC_REVIEW_MODE == "never":
+        return False
+    if conformance_report and (conformance_report.get("conformance") or {}).get("passed"):
+        return False
+    return not (fuzz_report.get("liveness") or {}).get("verified", False)
+
 def run_fix(file_path: str, error_message: str, provider: str = "openai"
-                 , model: str  = "gpt-4o-mini", fix_type: str="syntax", gdd: Optional[str]="") -> tuple[str | None, str]:
+                 , model: str  = "gpt-4o-mini", fix_type: str="syntax", gdd: Optional[GameDesign]=None,
+            budget: Optional[FixBudget] = None,
+            fallbacks: Optional[list[tuple[str, str]]] = None) -> tuple[str | None, str]:
     """
     Auto Fix Loop: Read Codes -> Submit Errors -> Get new codes -> save
+    Logic fixes also receive the game rules of the GDD (controls, entities, states, win / loss conditions).
+    Performance fixes receive the profiler findings of the fuzz test.
+    The tokens of the call are charged to the budget of the fix loop.
     The first return is the path to the fixed file.
     The second return is the result message.
+    Raise LLMCallError when the fixer call failed.
     """
     print(f"[Member 3] 正在嘗試修復代碼... (Error: {error_message[:50]}...)")
 
@@ -52,16 +104,25 @@ def run_fix(file_path: str, error_message: str, provider: str = "openai"
     with open(file_path, "r", encoding="utf-8") as f:
         broken_code = f.read()
 
-    response: str  = ""
-
     if fix_type == "syntax":
-        # Insert the codes to the prompt
-        fix_syntax_full_prompt: str = FIXER_PROMPT.format(code=broken_code, error=error_message)
+        # Insert the codes to the user message, the static prompt stays a cacheable prefix
+        fix_syntax_input: str = FIXER_INPUT.format(code=broken_code, error=error_message)
         # Call LLM for fixing
-        response = call_llm("You are a Code error Fixer.", fix_syntax_full_prompt, provider=provider, model=model)
+        result = call_llm(FIXER_PROMPT, fix_syntax_input, provider=provider, model=model, fallbacks=fallbacks)
     elif fix_type == "logic":
-        fix_logic_full_prompt: str = LOGIC_FIXER_PROMPT.format(code=broken_code, error=error_message, gdd=gdd)
-        response = call_llm("You are a code logics fixer.", fix_logic_full_prompt, provider=provider, model=model)
+        rules: str = gdd.for_stage("fix") if gdd else "(not available)"
+        fix_logic_input: str = LOGIC_FIXER_INPUT.format(rules=rules, code=broken_code, error=error_message)
+        result = call_llm(LOGIC_FIXER_PROMPT, fix_logic_input, provider=provider, model=model, fallbacks=fallbacks)
+    elif fix_type == "performance":
+        fix_performance_input: str = PERFORMANCE_FIXER_INPUT.format(code=broken_code, error=error_message)
+        result = call_llm(PERFORMANCE_FIXER_PROMPT, fix_performance_input, provider=provider, model=model,
+                          fallbacks=fallbacks)
+    else:
+        return None, f"未知的修復類型: {fix_type}"
+
+    if budget is not None:
+        budget.charge(result)
+    response: str = result.unwrap()
 
     # Save the fixed files (truncate)
     output_dir: str = os.path.dirname(file_path)
@@ -73,56 +134,197 @@ def run_fix(file_path: str, error_message: str, provider: str = "openai"
         return None, response
 
 
-def run_fix_loop(gdd: str, file_path: str, provider: str = "openai",
-                 model: str = "gpt-4o-mini") -> Generator[str, None, None]:
+def run_fix_loop(gdd: GameDesign | dict | str, file_path: str, provider: str = "openai",
+                 model: str = "gpt-4o-mini", user_input: Optional[str] = None,
+                 checkpoints: Optional[Checkpoints] = None,
+                 routing: Optional[ModelRouting] = None) -> Generator[str, None, None]:
     """
     Generator function for SSE (Server-Sent Events).
     Yields strings in the format: "data: <message>\n\n"
+    With checkpoints, code which already passed the loop (same code, GDD and model) is not validated again.
+    The checks run cheapest first under a wall time / token / attempt budget (FixScheduler), and the loop stops
+    early when a fix changes nothing or the same error comes back.
+    Check verdicts are cached by code hash (ValidationCache), unchanged code is not checked again.
+    The fuzz test and an unconditional LLM review run concurrently, a gated review runs after the fuzz test.
+    Their errors are fixed by a single fix.
+    The review and the fixes use the model routed to them (ModelRouting), by default provider / model.
     """
+    gdd = GameDesign.coerce(gdd)
+    routing = ModelRouting.coerce(routing, provider, model)
+    reviewer, fixer = routing.route(ROUTE_REVIEW), routing.route(ROUTE_FIX)
     yield f"data: [Member 3] 收到需求，開始驗證: {os.path.basename(file_path)}\n\n"
 
-    max_retries: int = 3
-    game_is_valid = False
-    error_msg = ""
+    fix_input_hash = ""
+    if checkpoints is not None:
+        with open(file_path, "r", encoding="utf-8") as f:
+            fix_input_hash = checkpoint_key(STAGE_FIX, f.read(), gdd.to_json(), reviewer.provider, reviewer.model,
+                                            fixer.provider, fixer.model)
+        fixed_code = checkpoints.load(STAGE_FIX, fix_input_hash)
+        if fixed_code is not None:
+            with open(file_path, "w", encoding="utf-8") as f:
+                f.write(fixed_code)
+            yield "data: ♻️ 使用先前已通過驗證的修復結果\n\n"
+            yield "data: RESULT_SUCCESS: 程式碼通過所有驗證！\n\n"
+            return
+
+    scheduler = FixScheduler(FixBudget())
+    budget = scheduler.budget
+    reports: dict[str, dict] = {}
+
+    cache = get_validation_cache()
+
+    def evaluate(check: str) -> dict:
+        """Run a check: {"passed", "message", "report" (harness checks)}."""
+        if check == CHECK_SYNTAX:
+            passed, message = static_code_check(file_path)
+            return {"passed": passed, "message": message}
+        if check == CHECK_CONFORMANCE:
+            report = run_conformance_test(file_path)
+            return {"passed": report["passed"], "message": report["message"], "report": report}
+        if check == CHECK_FUZZ:
+            report = run_fuzz_report(file_path, config.FUZZER_RUNNING_TIME)
+            return {"passed": report["passed"], "message": report["message"], "report": report}
+        passed, message = game_logic_check(gdd, file_path, reviewer.provider, reviewer.model, budget=budget,
+                                           fallbacks=reviewer.fallbacks)
+        return {"passed": passed, "message": message}
+
+    def cache_inputs(check: str) -> tuple:
+        """The inputs besides the code which change the verdict of a check."""
+        if check == CHECK_CONFORMANCE:
+            return (config.CONFORMANCE_TIMEOUT,)
+        if check == CHECK_FUZZ:
+            return (get_dynamic_fuzz_logic(file_path), config.FUZZER_RUNNING_TIME, config.FUZZER_COVERAGE_GUIDED,
+                    config.FUZZER_PROFILE_ENABLED, config.FUZZER_FRAME_BUDGET_MS, config.FUZZER_MEMORY_GROWTH_MB)
+        if check == CHECK_REVIEW:
+            return (reviewer.provider, reviewer.model)
+        return ()
 
-    while (not game_is_valid) and (max_retries > 0):
-        syntax_is_valid, error_msg = static_code_check(file_path)
-        if not syntax_is_valid:
-            yield f"data: ❌ 語法錯誤: {error_msg} (嘗試修復中...)\n\n"
-            print(f"[Member3]: ❌ 語法錯誤: {error_msg}")
+    def run_check(check: str, code: str) -> tuple[bool, str, str, str]:
+        """:return: (passed, message, fix type, label of the error)"""
+        if check == CHECK_CONFORMANCE and not config.CONFORMANCE_ENABLED:
+            return True, "", "", ""
+        if check == CHECK_REVIEW and not logic_review_needed(reports.get(CHECK_FUZZ, {}),
+                                                             reports.get(CHECK_CONFORMANCE)):
+            return True, REVIEW_SKIPPED_MESSAGE, "", ""
 
-            file_path, error_msg = run_fix(file_path, error_msg, provider, model, "syntax")
-            max_retries -= 1
-            continue
+        key = validation_key(check, code, *cache_inputs(check))
+        verdict = cache.get(key)
+        cached = verdict is not None
+        if not cached:
+            verdict = evaluate(check)
+            cache.put(key, verdict)
+        if verdict.get("report") is not None:
+            reports[check] = verdict["report"]
+        passed, message = verdict["passed"], verdict["message"]
+        suffix = " (快取的驗證結果)" if cached else ""
 
-        yield "data: ✅ 語法正確\n\n"
+        if check == CHECK_SYNTAX:
+            return passed, message if not passed else f"✅ 語法正確{suffix}", "syntax", "語法錯誤"
+        if check == CHECK_CONFORMANCE:
+            return passed, message if not passed else f"✅ 狀態流程正確 (START → PLAYING → GAME_OVER → R){suffix}", \
+                "logic", "狀態流程錯誤"
+        if check == CHECK_FUZZ:
+            if not passed and message.startswith(PERFORMANCE_ERROR_PREFIX):
+                return False, message, "performance", "效能問題 (Fuzzer)"
+            return passed, message if not passed else f"✅ 運行功能正確{suffix}", "logic", "運行時錯誤 (Fuzzer)"
+        return passed, message if not passed else f"✅ 邏輯正確{suffix}", "logic", "邏輯錯誤"
 
-        logic_is_valid, error_msg = game_logic_check(gdd, file_path, provider, model)
-        if not logic_is_valid:
-            yield f"data: ❌ 邏輯錯誤: {error_msg} (嘗試修復中...)\n\n"
-            print(f"[Member3]: ❌ 邏輯錯誤: {error_msg}")
+    def run_stage(checks: list[str], code: str) -> list[tuple[bool, str, str, str]]:
+        """
+        Run the checks of a stage: the first one (the fuzz test) in this thread, the others
+        (the LLM review) concurrently in worker threads. A gated review depends on the fuzz report,
+        so it runs after the fuzz test and only when the fuzz run did not verify the game.
+        """
+        if len(checks) <= 1 or (CHECK_REVIEW in checks and config.LOGIC_REVIEW_MODE != "always"):
+            return [run_check(check, code) for check in checks]
+        with ThreadPoolExecutor(max_workers=len(checks) - 1) as executor:
+            futures = [executor.submit(run_check, check, code) for check in checks[1:]]
+            return [run_check(checks[0], code)] + [future.result() for future in futures]
+
+    def combine_failures(failures: list[tuple[str, str, str, str]]) -> tuple[str, str, str, str]:
+        """
+        Failures of the same stage are fixed together by one fix with every error.
+        The prompt is chosen by priority: syntax, then logic, then performance. The performance prompt
+        assumes a working game, so a performance failure next to a logic one is left to the next round
+        (the fuzz test runs again on the fixed code).
+        """
+        fix_type = min((failure[2] for failure in failures), key=FIX_TYPE_PRIORITY.index)
+        failures = [failure for failure in failures if failure[2] == fix_type]
+        if len(failures) == 1:
+            return failures[0]
+        check = "+".join(failure[0] for failure in failures)
+        message = "\n\n".join(f"【{label}】\n{message}" for _, message, _, label in failures)
+        return check, message, fix_type, "、".join(failure[3] for failure in failures)
+
+    game_is_valid = False
+    stop_reason = None
+
+    try:
+        while not game_is_valid and stop_reason is None:
+            with open(file_path, "r", encoding="utf-8") as f:
+                code = f.read()
+            current_hash = code_hash(code)
+            if scheduler.unchanged_since_failure(current_hash):
+                stop_reason = "修復後的程式碼與先前失敗的版本相同"
+                break
 
-            file_path, error_msg = run_fix(file_path, error_msg, provider, model, "logic", gdd)
-            max_retries -= 1
-            continue
+            failure = None
+            for stage in scheduler.stages():
+                pending = [check for check in stage if not scheduler.already_passed(check, current_hash)]
+                for check in pending:
+                    stop_reason = stop_reason or scheduler.can_afford_check(check)
+                if stop_reason:
+                    break
 
-        yield "data: ✅ 邏輯正確\n\n"
+                results = run_stage(pending, code)
+                failures = []
+                for check, (passed, message, fix_type, label) in zip(pending, results):
+                    if passed:
+                        scheduler.record_pass(check, current_hash)
+                        if message:
+                            yield f"data: {message}\n\n"
+                    else:
+                        failures.append((check, message, fix_type, label))
+                if failures:
+                    failure = combine_failures(failures)
+                    break
 
-        fuzz_passed, error_msg = run_fuzz_test(file_path, config.FUZZER_RUNNING_TIME)
-        if not fuzz_passed:
-            yield f"data: ❌ 運行時錯誤 (Fuzzer): {error_msg} (嘗試修復中...)\n\n"
-            print(f"[Member3]: ❌ 運行時錯誤 (Fuzzer): {error_msg}")
+            if stop_reason:
+                break
+            if failure is None:
+                game_is_valid = True
+                break
 
-            file_path, error_msg = run_fix(file_path, error_msg, provider, model, "logic", gdd)
-            max_retries -= 1
-            continue
+            check, error_msg, fix_type, label = failure
+            stop_reason = scheduler.record_failure(check, current_hash, error_msg) or scheduler.can_afford_fix(code)
+            if stop_reason:
+                yield f"data: ❌ {label}: {error_msg}\n\n"
+                break
+            yield f"data: ❌ {label}: {error_msg} (嘗試修復中...)\n\n"
+            print(f"[Member3]: ❌ {label}: {error_msg}")
 
-        yield "data: ✅ 運行功能正確\n\n"
+            budget.attempts += 1
+            fixed_path, error_msg = run_fix(file_path, error_msg, fixer.provider, fixer.model, fix_type,
+                                            gdd if fix_type == "logic" else None, budget=budget,
+                                            fallbacks=fixer.fallbacks)
+            if not fixed_path:
+                stop_reason = "修復結果中沒有程式碼"
+                break
+            file_path = fixed_path
+    except LLMCallError as e:
+        # Stop right away: every further LLM call of this run would be wasted
+        print(f"[Member3]: ❌ LLM 呼叫失敗: {e}")
+        yield f"data: RESULT_FAIL: LLM 呼叫失敗，停止驗證: {e}\n\n"
+        return
 
-        game_is_valid = True
+    print(f"[Member3]: 修復迴圈結束 ({budget.attempts} 次修復, {budget.elapsed:.1f}s, {budget.tokens_used} tokens)")
 
     # The format let js can detect finished
     if game_is_valid:
+        if checkpoints is not None:
+            with open(file_path, "r", encoding="utf-8") as f:
+                checkpoints.save(STAGE_FIX, fix_input_hash, f.read())
+        enqueue_validated_game(gdd, file_path, user_input, routing)
         yield "data: RESULT_SUCCESS: 程式碼通過所有驗證！\n\n"
     else:
-        yield "data: RESULT_FAIL: 已達最大重試次數，驗證失敗。\n\n"
\ No newline at end of file
+        yield f"data: RESULT_FAIL: {stop_reason or budget.exceeded()}，驗證失敗。\n\n"
\ No newline at end of file
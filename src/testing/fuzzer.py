@@ -1,9 +1,13 @@
+import json
 import os
 import re
+import signal
 import subprocess
 import sys
 import textwrap
 
+from config import config
+
 
 def get_dynamic_fuzz_logic(game_file_path: str) -> str:
     """
@@ -128,21 +132,193 @@ def inject_monkey_bot(code_content: str, bot_logic: str) -> str:
     return code_content
 
 
-def run_fuzz_test(file_path: str, duration: int = 5) -> tuple[bool, str]:
+# The harness runs the game in the fuzz subprocess (sandbox + time limit), see harness.py
+HARNESS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "harness.py")
+
+# Prefix of the fuzz result message when the game did not crash but exceeded the performance budgets
+PERFORMANCE_ERROR_PREFIX = "Performance Error:"
+# Prefix of the fuzz result message when the game did not crash but its screen froze / it never left START
+LIVENESS_ERROR_PREFIX = "Liveness Error:"
+# Prefix of the conformance result message when a transition of the state machine failed
+CONFORMANCE_ERROR_PREFIX = "State Machine Error:"
+
+# Same as harness.CONFORMANCE_STEP_MARKER (the harness is not imported, it runs in the game's process)
+CONFORMANCE_STEP_MARKER = "[harness] conformance step: "
+
+# Time given to the harness to stop the game and write its report, on top of the fuzz duration
+HARNESS_GRACE_SECONDS = 5
+
+
+def _popen_group_kwargs() -> dict:
+    """Start the fuzz process in a new process group / session, so it can be killed with all its children."""
+    if os.name == "nt":
+        return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {"start_new_session": True}
+
+
+def _kill_process_group(process: subprocess.Popen):
+    """Kill the fuzz process and everything left in its process group (children which escaped the sandbox)."""
+    try:
+        if os.name == "nt":
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError, OSError):
+        pass
+    if process.poll() is None:
+        process.kill()
+
+
+def _read_harness_report(report_file: str) -> dict:
+    try:
+        with open(report_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _run_harness(game_file: str, report_file: str, duration: float, options: list[str]) -> tuple[int, str, dict, bool]:
+    """
+    Run a game file inside the harness, headless, in its own process group, and read its report.
+    :return: (return code, stderr, report, timed out)
+    :rtype: tuple[int, str, dict, bool]
+    """
+    if os.path.exists(report_file):
+        os.remove(report_file)
+
+    # Set environment variable (disable sound effects to avoid interference, headless display)
+    env = os.environ.copy()
+    env["SDL_AUDIODRIVER"] = "dummy"
+    env["SDL_VIDEODRIVER"] = "dummy"
+
+    cmd = [sys.executable, HARNESS_PATH, game_file, "--report", report_file, "--duration", str(duration)] + options
+    process = subprocess.Popen(
+        cmd,
+        stderr=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        text=True,
+        env=env,
+        **_popen_group_kwargs()
+    )
+
+    timed_out = False
+    try:
+        _, stderr = process.communicate(timeout=duration + HARNESS_GRACE_SECONDS)
+    except subprocess.TimeoutExpired:
+        # The game never reached display.flip() again (e.g. blocked in a loop without rendering)
+        timed_out = True
+        _kill_process_group(process)
+        _, stderr = process.communicate()
+    finally:
+        _kill_process_group(process)
+
+    report = _read_harness_report(report_file)
+    if os.path.exists(report_file):
+        os.remove(report_file)
+    return process.returncode, stderr, report, timed_out
+
+
+def format_sandbox_events(report: dict) -> str:
+    """
+    Summarize the calls blocked by the sandbox, e.g. "Sandbox blocked 2 call(s): subprocess x2 (['python', 'main.py'])".
+    :param report: The harness report
+    :type report: dict
+
+    :return: The summary, empty when the game made no blocked call
+    :rtype: str
+    """
+    count = report.get("sandbox_event_count", 0)
+    if not count:
+        return ""
+    kinds = {}
+    for event in report.get("sandbox_events", []):
+        kinds.setdefault(event["kind"], []).append(event["detail"])
+    parts = [f"{kind} x{len(details)} ({details[0]})" for kind, details in kinds.items()]
+    return f"Sandbox blocked {count} call(s): " + ", ".join(parts)
+
+
+def format_coverage(report: dict) -> str:
+    """
+    :return: e.g. "Coverage: 72.4% of lines (105/145), 38 branches", empty without coverage data
+    :rtype: str
+    """
+    coverage = report.get("coverage")
+    if not coverage:
+        return ""
+    return (f"Coverage: {coverage['percent']}% of lines ({coverage['lines_covered']}/{coverage['lines_total']}), "
+            f"{coverage['branches']} branches")
+
+
+def format_performance(report: dict) -> str:
+    """
+    :return: e.g. "Frame time p95 4.2 ms (59.8 FPS), memory 1.2 -> 1.3 MB", empty without profiling data
+    :rtype: str
+    """
+    performance = report.get("performance")
+    if not performance:
+        return ""
+    return (f"Frame time p95 {performance['frame_ms_p95']} ms ({performance['fps']} FPS), "
+            f"memory {performance['memory_mb_start']} -> {performance['memory_mb_end']} MB")
+
+
+def format_freeze(report: dict, duration: float) -> str:
+    """
+    :return: e.g. "game loop stopped rendering (no display.flip for 2.5s, after 41 frames)" and where it is stuck
+    :rtype: str
     """
-    Run the fuzz test
+    stalled = report.get("stalled_seconds")
+    if stalled is None:
+        # Killed by the parent timeout: the harness watchdog could not even write the report
+        return f"game loop stopped rendering (no display.flip, the game was killed after {duration + HARNESS_GRACE_SECONDS:.0f}s)"
+    message = f"game loop stopped rendering (no display.flip for {stalled}s, after {report.get('frames', 0)} frames)"
+    if report.get("frozen_at"):
+        message += f"\nStuck at:\n{report['frozen_at']}"
+    return message
+
+
+def format_liveness(report: dict) -> str:
+    """
+    :return: e.g. "States: START -> PLAYING -> GAME_OVER, 37 distinct screens", empty without liveness data
+    :rtype: str
+    """
+    liveness = report.get("liveness")
+    if not liveness:
+        return ""
+    states = " -> ".join(liveness["states"]) if liveness["states"] else "unknown"
+    return f"States: {states}, {liveness['distinct_screens']} distinct screens"
+
+
+def run_fuzz_report(file_path: str, duration: int = 5, coverage_guided: bool | None = None,
+                    profile: bool | None = None) -> dict:
+    """
+    Run the fuzz test. The game runs headless inside the fuzz harness in its own process group:
+    subprocess / os.exec* / os.system / network calls of the game are recorded instead of executed,
+    and the whole process group is killed at the end, so no game copy outlives the test.
     :param file_path: The path to the game file
     :type file_path: str
 
     :param duration: The duration of the fuzz test
     :type duration: int
 
-    :return: A tuple (success_flag, message)
-    :rtype: tuple[bool, str]
+    :param coverage_guided: Bias the inputs toward new coverage and report the coverage, default config.FUZZER_COVERAGE_GUIDED
+    :type coverage_guided: bool | None
+
+    :param profile: Check the frame time and memory growth against the budgets, default config.FUZZER_PROFILE_ENABLED
+    :type profile: bool | None
+
+    :return: The harness report (status, coverage, performance, liveness, sandbox events...) with
+             "passed" and "message"; the message starts with LIVENESS_ERROR_PREFIX / PERFORMANCE_ERROR_PREFIX
+             when the game did not crash but is frozen / stuck, or exceeded a performance budget
+    :rtype: dict
     """
+    if coverage_guided is None:
+        coverage_guided = config.FUZZER_COVERAGE_GUIDED
+    if profile is None:
+        profile = config.FUZZER_PROFILE_ENABLED
     try:
         if not os.path.exists(file_path):
-            return False, "File not found"
+            return {"passed": False, "message": "File not found"}
 
         with open(file_path, "r", encoding="utf-8") as f:
             original_code = f.read()
@@ -152,44 +328,141 @@ def run_fuzz_test(file_path: str, duration: int = 5) -> tuple[bool, str]:
         fuzzed_code = inject_monkey_bot(original_code, bot_logic)
 
         temp_file = file_path.replace(".py", "_fuzz_temp.py")
+        report_file = file_path.replace(".py", "_fuzz_report.json")
         with open(temp_file, "w", encoding="utf-8") as f:
             f.write(fuzzed_code)
 
         print(f"[Fuzzer] 正在對 {os.path.basename(file_path)} 進行 {duration} 秒的動態壓力測試...")
 
-        # 5. Set environment variable (disable sound effects to avoid interference)
-        env = os.environ.copy()
-        env["SDL_AUDIODRIVER"] = "dummy"
-
-        # 6. Run the main_fuzz_temp.py
-        cmd = [sys.executable, temp_file]
-        process = subprocess.Popen(
-            cmd,
-            stderr=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            text=True,
-            env=env
-        )
-
-        try:
-            stdout, stderr = process.communicate(timeout=duration)
-        except subprocess.TimeoutExpired:
-            process.kill()
-            # if os.path.exists(temp_file):
-            #     os.remove(temp_file)
-            return True, "Fuzz Test Passed (Survived random inputs)."
-
+        # 6. Run the main_fuzz_temp.py inside the harness
+        options = []
+        if coverage_guided:
+            options.append("--coverage-guided")
+        if profile:
+            options += ["--profile", "--frame-budget-ms", str(config.FUZZER_FRAME_BUDGET_MS),
+                        "--memory-growth-mb", str(config.FUZZER_MEMORY_GROWTH_MB)]
+        returncode, stderr, report, timed_out = _run_harness(temp_file, report_file, duration, options)
         if os.path.exists(temp_file):
             os.remove(temp_file)
 
-        if process.returncode != 0:
-            error_msg = stderr
-            if "Traceback" in stderr:
-                error_msg = "Traceback" + stderr.split("Traceback")[-1]
+        sandbox_summary = format_sandbox_events(report)
+        if sandbox_summary:
+            print(f"[Fuzzer] {sandbox_summary}")
+        coverage_summary = format_coverage(report)
+        if coverage_summary:
+            print(f"[Fuzzer] {coverage_summary} ({report.get('frames', 0)} frames)")
+        performance_summary = format_performance(report)
+        if performance_summary:
+            print(f"[Fuzzer] {performance_summary}")
+        liveness_summary = format_liveness(report)
+        if liveness_summary:
+            print(f"[Fuzzer] {liveness_summary}")
+
+        # The harness stops the game itself in display.flip() once the duration is over,
+        # running longer means the game stopped rendering
+        if timed_out or report.get("status") == "frozen":
+            message = f"{LIVENESS_ERROR_PREFIX} {format_freeze(report, duration)}"
+            if liveness_summary:
+                message += f"\n{liveness_summary}"
+            return {**report, "passed": False, "timed_out": timed_out, "message": message}
+
+        if returncode != 0:
+            error_msg = report.get("error") or stderr
+            if "Traceback" in error_msg:
+                error_msg = "Traceback" + error_msg.split("Traceback")[-1]
+
+            return {**report, "passed": False, "message": f"Runtime Logic Error (Crashed): {error_msg}"}
+
+        liveness_errors = (report.get("liveness") or {}).get("errors")
+        if liveness_errors:
+            return {**report, "passed": False,
+                    "message": f"{LIVENESS_ERROR_PREFIX} {liveness_summary}\n" + "\n".join(f"- {e}" for e in liveness_errors)}
+
+        findings = (report.get("performance") or {}).get("findings")
+        if findings:
+            return {**report, "passed": False,
+                    "message": f"{PERFORMANCE_ERROR_PREFIX} {performance_summary}\n" + "\n".join(f"- {f}" for f in findings)}
+
+        if report.get("status") == "time_up":
+            message = "Fuzz Test Passed (Survived random inputs)."
+        else:
+            message = "Fuzz Test Passed."
+        summaries = [summary for summary in (liveness_summary, coverage_summary, performance_summary, sandbox_summary)
+                     if summary]
+        if summaries:
+            message += " " + ". ".join(summaries) + "."
+        return {**report, "passed": True, "message": message}
+
+    except Exception as e:
+        return {"passed": False, "message": f"Fuzz Test Failed to Run: {str(e)}"}
+
+
+def run_fuzz_test(file_path: str, duration: int = 5, coverage_guided: bool | None = None,
+                  profile: bool | None = None) -> tuple[bool, str]:
+    """
+    Run the fuzz test, see run_fuzz_report.
+    :return: A tuple (success_flag, message)
+    :rtype: tuple[bool, str]
+    """
+    report = run_fuzz_report(file_path, duration, coverage_guided, profile)
+    return report["passed"], report["message"]
 
-            return False, f"Runtime Logic Error (Crashed): {error_msg}"
 
-        return True, "Fuzz Test Passed."
+def run_conformance_test(file_path: str, timeout: int | None = None) -> dict:
+    """
+    Check the START -> PLAYING -> GAME_OVER -> R (restart) state machine of the game with the scripted driver
+    of the harness, in fast-forward (usually well under a second of play per transition).
+    :param file_path: The path to the game file
+    :type file_path: str
+
+    :param timeout: Wall time limit of the run, default config.CONFORMANCE_TIMEOUT
+    :type timeout: int | None
+
+    :return: The harness report with "passed" and "message" (the failed transitions, starting with
+             CONFORMANCE_ERROR_PREFIX)
+    :rtype: dict
+    """
+    timeout = timeout or config.CONFORMANCE_TIMEOUT
+    try:
+        if not os.path.exists(file_path):
+            return {"passed": False, "message": "File not found"}
+
+        print(f"[Fuzzer] 正在以腳本檢查 {os.path.basename(file_path)} 的狀態流程...")
+        report_file = file_path.replace(".py", "_conformance_report.json")
+        returncode, stderr, report, timed_out = _run_harness(file_path, report_file, timeout, ["--conformance"])
+
+        conformance = report.get("conformance")
+        if conformance is None and timed_out:
+            # Killed before the report was written: the game hung, in the last step the driver announced
+            steps = [line.split(CONFORMANCE_STEP_MARKER, 1)[1].strip() for line in stderr.splitlines()
+                     if CONFORMANCE_STEP_MARKER in line]
+            step = steps[-1] if steps else "initial START"
+            return {**report, "passed": False, "timed_out": True,
+                    "message": f"{CONFORMANCE_ERROR_PREFIX} the game hung during '{step}': "
+                               f"{format_freeze(report, timeout)}"}
+        if conformance is None:
+            if returncode != 0:
+                error_msg = report.get("error") or "\n".join(line for line in stderr.splitlines()
+                                                             if CONFORMANCE_STEP_MARKER not in line)
+                if "Traceback" in error_msg:
+                    error_msg = "Traceback" + error_msg.split("Traceback")[-1]
+                return {**report, "passed": False, "message": f"Runtime Logic Error (Crashed): {error_msg}"}
+            # No pygame display: nothing could be checked, the fuzz test still runs
+            return {**report, "passed": True, "message": "Conformance Test Skipped."}
+
+        lines = [f"- {name}: {check['status']}" + (f" ({check['detail']})" if check["detail"] else "")
+                 for name, check in conformance["checks"].items()]
+        print("[Fuzzer] " + "; ".join(line[2:] for line in lines))
+        if not conformance["failed"]:
+            return {**report, "passed": True, "message": "Conformance Test Passed.\n" + "\n".join(lines)}
+
+        message = f"{CONFORMANCE_ERROR_PREFIX} the state machine does not follow START -> PLAYING -> GAME_OVER -> R\n"
+        message += "\n".join(lines)
+        if report.get("status") == "crashed" and report.get("error"):
+            message += "\n" + "Traceback" + report["error"].split("Traceback")[-1]
+        if report.get("status") == "frozen" and report.get("frozen_at"):
+            message += f"\nStuck at:\n{report['frozen_at']}"
+        return {**report, "passed": False, "message": message}
 
     except Exception as e:
-        return False, f"Fuzz Test Failed to Run: {str(e)}"
\ No newline at end of file
+        return {"passed": False, "message": f"Conformance Test Failed to Run: {str(e)}"}
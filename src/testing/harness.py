@@ -0,0 +1,1192 @@
+"""
+Fuzz harness, run as the fuzz subprocess around the generated game (with the injected monkey bot):
+
+    python harness.py <game_file> --report <report.json> --duration <seconds>
+
+It only depends on the standard library and pygame, because it runs in the game's process, not in the app.
+- Sandbox: subprocess, os.system, os.exec*/spawn*/fork and network calls of the game are recorded as events
+  instead of being executed (e.g. restart_program pressing R would otherwise spawn detached game copies).
+- Time limit: the game is stopped from its display.flip()/update() once the fuzz duration is over,
+  so the report is written before the parent's hard timeout. A game which stopped calling flip()
+  (e.g. stuck in a loop without rendering) is declared frozen by a watchdog thread, which writes the report.
+- Profiling (--profile): frame time, sprite group sizes and memory growth, with findings over the budgets.
+- Liveness: the screen is hashed every few frames (the fuzzer runs it under the dummy video driver),
+  to find frozen screens and a state machine which never leaves START / never reaches GAME_OVER.
+- Conformance (--conformance): instead of random inputs, a scripted driver plays START -> PLAYING -> GAME_OVER
+  -> R (restart) in fast-forward (Clock.tick / get_ticks / sleep on a virtual clock) and reports each transition.
+- Coverage (--coverage-guided): line and branch coverage of the game file is collected with sys.monitoring
+  (Python 3.12+) or sys.settrace, and inputs which reached new code are replayed / mutated more often.
+The report (JSON) is read back by src.testing.fuzzer.run_fuzz_test.
+"""
+import argparse
+import enum
+import hashlib
+import io
+import json
+import linecache
+import math
+import os
+import random
+import runpy
+import socket
+import subprocess
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+import types
+import weakref
+
+
+# Events kept in the report, the rest are only counted
+MAX_EVENTS = 50
+
+# Seconds without display.flip() after the end of the run before the game is declared frozen
+# (below the HARNESS_GRACE_SECONDS of the parent, so the report is written before the parent kills the process)
+FREEZE_GRACE_SECONDS = 2.0
+
+# Variables holding the state machine of the game (START / PLAYING / GAME_OVER)
+GAME_STATE_NAMES = ("game_state", "state", "current_state", "gamestate")
+
+# Printed to stderr by the conformance driver when a step starts, so the parent still knows the step
+# where the game hung when the report could not be written
+CONFORMANCE_STEP_MARKER = "[harness] conformance step: "
+
+# Markers of the monkey bot block injected by src.testing.fuzzer.inject_monkey_bot, excluded from the coverage
+BOT_START_MARKER = "[INJECTED DYNAMIC MONKEY BOT START]"
+BOT_END_MARKER = "[INJECTED DYNAMIC MONKEY BOT END]"
+
+REPORT = {
+    "status": "running",
+    "error": None,
+    "frames": 0,
+    "elapsed": 0.0,
+    "stalled_seconds": None,
+    "frozen_at": None,
+    "sandbox_events": [],
+    "sandbox_event_count": 0,
+    "coverage": None,
+    "performance": None,
+    "liveness": None,
+    "conformance": None,
+}
+
+
+class HarnessStop(BaseException):
+    """Raised from the game loop when the fuzz time is up (BaseException, so `except Exception` in the game can't eat it)."""
+
+
+def record_event(kind: str, detail) -> None:
+    REPORT["sandbox_event_count"] += 1
+    if len(REPORT["sandbox_events"]) < MAX_EVENTS:
+        REPORT["sandbox_events"].append({"kind": kind, "detail": str(detail)[:200], "frame": REPORT["frames"]})
+
+
+# ---------------------------------------------------------------------------
+# Sandbox
+# ---------------------------------------------------------------------------
+
+class BlockedPopen:
+    """Stand-in for subprocess.Popen: records the command and behaves like a process which exited at once."""
+
+    def __init__(self, args, *_, **__):
+        record_event("subprocess", args)
+        self.args = args
+        self.pid = 0
+        self.returncode = 0
+        self.stdin = self.stdout = self.stderr = None
+
+    def poll(self):
+        return 0
+
+    def wait(self, timeout=None):
+        return 0
+
+    def communicate(self, input=None, timeout=None):
+        return None, None
+
+    def kill(self):
+        pass
+
+    def terminate(self):
+        pass
+
+    def send_signal(self, sig):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def _blocked_run(args, *_, **__):
+    record_event("subprocess", args)
+    return subprocess.CompletedProcess(args, 0, "", "")
+
+
+def _blocked_call(args, *_, **__):
+    record_event("subprocess", args)
+    return 0
+
+
+def _blocked_check_output(args, *_, **kwargs):
+    record_event("subprocess", args)
+    return "" if kwargs.get("text") or kwargs.get("universal_newlines") or kwargs.get("encoding") else b""
+
+
+def _blocked_exec(name):
+    def blocked(*args, **_):
+        record_event(name, args[:2])
+        # exec* never returns: the game process would have been replaced, so it ends here
+        raise SystemExit(0)
+    return blocked
+
+
+def _blocked_value(name, value):
+    def blocked(*args, **_):
+        record_event(name, args[:2])
+        return value() if callable(value) else value
+    return blocked
+
+
+def _blocked_os_error(name):
+    def blocked(*args, **_):
+        record_event(name, args[:2])
+        raise OSError(f"{name} is disabled in the fuzz sandbox")
+    return blocked
+
+
+def install_sandbox() -> None:
+    """Replace the process and network APIs, the game gets the patched functions whatever way it imports them."""
+    subprocess.Popen = BlockedPopen
+    subprocess.run = _blocked_run
+    subprocess.call = _blocked_call
+    subprocess.check_call = _blocked_call
+    subprocess.check_output = _blocked_check_output
+    subprocess.getoutput = _blocked_value("subprocess", "")
+    subprocess.getstatusoutput = _blocked_value("subprocess", (0, ""))
+
+    os.system = _blocked_value("os.system", 0)
+    os.popen = _blocked_value("os.popen", lambda: io.StringIO(""))
+    for name in ("execl", "execle", "execlp", "execlpe", "execv", "execve", "execvp", "execvpe"):
+        if hasattr(os, name):
+            setattr(os, name, _blocked_exec(f"os.{name}"))
+    for name in ("spawnl", "spawnle", "spawnlp", "spawnlpe", "spawnv", "spawnve", "spawnvp", "spawnvpe",
+                 "posix_spawn", "posix_spawnp", "startfile"):
+        if hasattr(os, name):
+            setattr(os, name, _blocked_value(f"os.{name}", 0))
+    for name in ("fork", "forkpty"):
+        if hasattr(os, name):
+            setattr(os, name, _blocked_os_error(f"os.{name}"))
+
+    socket.socket.connect = _blocked_os_error("socket.connect")
+    socket.socket.connect_ex = _blocked_os_error("socket.connect")
+    socket.socket.sendto = _blocked_os_error("socket.sendto")
+    socket.create_connection = _blocked_os_error("socket.create_connection")
+    socket.getaddrinfo = _blocked_os_error("socket.getaddrinfo")
+
+    try:
+        import webbrowser
+        webbrowser.open = _blocked_value("webbrowser.open", False)
+    except ImportError:
+        pass
+
+
+def install_input_hook(pygame, listener) -> None:
+    """Call listener(event) for every event posted with pygame.event.post (by the monkey bot or the harness)."""
+    original_post = pygame.event.post
+
+    def post(event, *args, **kwargs):
+        listener(event)
+        return original_post(event, *args, **kwargs)
+
+    pygame.event.post = post
+
+
+def find_game_state(frame, filename: str, depth: int = 4) -> str | None:
+    """
+    Read the state of the game (see REQUIRED_STATES of the GDD) from the frames of the game file calling flip():
+    a `game_state` / `state` / `current_state` variable, local, global or an attribute of `self`.
+    :return: The state name in upper case (strings and Enum members), None when not found
+    """
+    for _ in range(depth):
+        if frame is None or frame.f_code.co_filename != filename:
+            return None
+        scopes = [frame.f_locals, getattr(frame.f_locals.get("self"), "__dict__", {}), frame.f_globals]
+        for scope in scopes:
+            for name in GAME_STATE_NAMES:
+                value = scope.get(name)
+                if isinstance(value, enum.Enum):
+                    value = value.name
+                if isinstance(value, str) and 0 < len(value) <= 32:
+                    return value.strip().upper().replace(" ", "_")
+        frame = frame.f_back
+    return None
+
+
+# ---------------------------------------------------------------------------
+# Coverage
+# ---------------------------------------------------------------------------
+
+def executable_lines(source: str, filename: str) -> set[int]:
+    """The line numbers holding code, from the line table of every code object of the file."""
+    lines = set()
+    stack = [compile(source, filename, "exec")]
+    while stack:
+        code = stack.pop()
+        lines.update(line for _, _, line in code.co_lines() if line)
+        stack.extend(const for const in code.co_consts if isinstance(const, types.CodeType))
+    return lines
+
+
+def injected_lines(source: str) -> set[int]:
+    """The line numbers of the injected monkey bot block."""
+    lines, inside = set(), False
+    for number, line in enumerate(source.splitlines(), start=1):
+        if BOT_START_MARKER in line:
+            inside = True
+        if inside:
+            lines.add(number)
+        if BOT_END_MARKER in line:
+            inside = False
+    return lines
+
+
+class CoverageTracker:
+    """
+    Line and branch coverage of a single file.
+    sys.monitoring disables every location after its first event, so covered code runs at full speed again;
+    the settrace fallback (Python < 3.12) only traces the frames of the game file.
+    Branches are counted as the distinct (from, to) jumps seen, there is no static total for them.
+    """
+
+    def __init__(self, filename: str, source: str):
+        self.filename = filename
+        self.excluded = injected_lines(source)
+        self.total_lines = executable_lines(source, filename) - self.excluded
+        self.lines: set[int] = set()
+        self.branches: set[tuple] = set()
+        self.backend = None
+        self.paused = False
+        self._seen = 0
+
+    def start(self):
+        monitoring = getattr(sys, "monitoring", None)
+        if monitoring is not None:
+            tool = monitoring.COVERAGE_ID
+            monitoring.use_tool_id(tool, "fuzz-harness")
+            events = monitoring.events.LINE
+            monitoring.register_callback(tool, monitoring.events.LINE, self._on_line)
+            if hasattr(monitoring.events, "BRANCH"):
+                monitoring.register_callback(tool, monitoring.events.BRANCH, self._on_branch)
+                events |= monitoring.events.BRANCH
+            monitoring.set_events(tool, events)
+            self.backend = "sys.monitoring"
+        else:
+            sys.settrace(self._trace_call)
+            self.backend = "settrace"
+
+    def stop(self):
+        if self.backend == "sys.monitoring":
+            sys.monitoring.set_events(sys.monitoring.COVERAGE_ID, 0)
+            sys.monitoring.free_tool_id(sys.monitoring.COVERAGE_ID)
+        elif self.backend == "settrace":
+            sys.settrace(None)
+
+    def _on_line(self, code, line):
+        if code.co_filename == self.filename and line not in self.excluded:
+            self.lines.add(line)
+        return sys.monitoring.DISABLE
+
+    def _on_branch(self, code, offset, destination):
+        if code.co_filename == self.filename:
+            self.branches.add((code.co_firstlineno, offset, destination))
+        return sys.monitoring.DISABLE
+
+    @property
+    def pausable(self) -> bool:
+        """Only the settrace backend slows the game down enough to distort the frame times."""
+        return self.backend == "settrace"
+
+    def pause(self):
+        """Stop tracing (settrace backend), including the game frames already running such as the main loop."""
+        if not self.pausable or self.paused:
+            return
+        sys.settrace(None)
+        frame = sys._getframe()
+        while frame is not None:
+            if frame.f_code.co_filename == self.filename:
+                frame.f_trace = None
+            frame = frame.f_back
+        self.paused = True
+
+    def resume(self):
+        if not self.pausable or not self.paused:
+            return
+        sys.settrace(self._trace_call)
+        frame = sys._getframe()
+        while frame is not None:
+            if frame.f_code.co_filename == self.filename:
+                frame.f_trace = self._trace_call(frame, "call", None)
+            frame = frame.f_back
+        self.paused = False
+
+    def _trace_call(self, frame, event, arg):
+        if frame.f_code.co_filename != self.filename:
+            return None
+        previous = [frame.f_lineno]
+
+        def trace_line(frame, event, arg):
+            if event == "line":
+                line = frame.f_lineno
+                if line not in self.excluded:
+                    self.lines.add(line)
+                    # A jump to any line other than the next one is a taken branch
+                    if previous[0] not in self.excluded and line != previous[0] + 1:
+                        self.branches.add((previous[0], line))
+                previous[0] = line
+            return trace_line
+        return trace_line
+
+    def take_new(self) -> int:
+        """:return: The number of lines and branches covered since the previous call"""
+        seen = len(self.lines) + len(self.branches)
+        new, self._seen = seen - self._seen, seen
+        return new
+
+    def summary(self) -> dict:
+        total = len(self.total_lines)
+        covered = len(self.lines & self.total_lines)
+        return {
+            "backend": self.backend,
+            "lines_covered": covered,
+            "lines_total": total,
+            "percent": round(covered / total * 100, 1) if total else 0.0,
+            "branches": len(self.branches),
+        }
+
+
+class CoverageGuide:
+    """
+    Bias the fuzz inputs toward new coverage: the inputs posted (by the monkey bot or by the guide)
+    in the frames before new lines / branches were reached are kept in a corpus,
+    and the guide replays them, mutated, more often than fresh random inputs.
+    The longer the coverage stalls, the more inputs the guide adds.
+    """
+
+    # Inputs of the last frames are credited for new coverage (the game handles them on the next frame)
+    CREDIT_FRAMES = 3
+    BASE_RATE = 0.1
+    STALL_RATE = 0.5
+    STALL_FRAMES = 120
+    CORPUS_SIZE = 64
+    # Escape / QUIT are left out, they would end the run
+    KEY_NAMES = ("space", "return", "r", "p", "left", "right", "up", "down", "w", "a", "s", "d",
+                 "1", "2", "3", "x", "z", "left shift", "tab")
+
+    def __init__(self, pygame, tracker: CoverageTracker, seed: int | None = None):
+        self.pygame = pygame
+        self.tracker = tracker
+        self.random = random.Random(seed)
+        self.keys = [key for key in (self._key_code(name) for name in self.KEY_NAMES) if key is not None]
+        self.corpus: dict[tuple, int] = {}
+        self.recent: list[list[tuple]] = [[]]
+        self.stalled = 0
+        self.guided_inputs = 0
+        install_input_hook(pygame, self.observe_event)
+
+    def _key_code(self, name: str):
+        try:
+            return self.pygame.key.key_code(name)
+        except (AttributeError, ValueError):
+            return None
+
+    def observe_event(self, event):
+        if event.type == self.pygame.KEYDOWN and "key" in event.dict:
+            self.recent[-1].append(("key", event.key))
+        elif event.type == self.pygame.MOUSEBUTTONDOWN and "pos" in event.dict:
+            self.recent[-1].append(("click", *event.pos))
+
+    def on_frame(self):
+        new = self.tracker.take_new()
+        if new:
+            self.stalled = 0
+            for spec in {spec for frame_inputs in self.recent for spec in frame_inputs}:
+                self.corpus[spec] = self.corpus.get(spec, 0) + new
+            if len(self.corpus) > self.CORPUS_SIZE:
+                # Keep the inputs which found the most coverage
+                self.corpus = dict(sorted(self.corpus.items(), key=lambda item: -item[1])[:self.CORPUS_SIZE])
+        else:
+            self.stalled += 1
+
+        self.recent = (self.recent + [[]])[-self.CREDIT_FRAMES:]
+        rate = self.STALL_RATE if self.stalled >= self.STALL_FRAMES else self.BASE_RATE
+        if self.random.random() < rate:
+            self._post_input(self._next_input())
+
+    def _next_input(self) -> tuple:
+        if self.corpus and self.random.random() < 0.6:
+            specs = list(self.corpus)
+            spec = self.random.choices(specs, weights=[self.corpus[s] for s in specs])[0]
+            if spec[0] == "click":
+                # Mutate: a click near a position which reached new code
+                return "click", spec[1] + self.random.randint(-24, 24), spec[2] + self.random.randint(-24, 24)
+            return spec
+        surface = self.pygame.display.get_surface()
+        width, height = surface.get_size() if surface else (800, 600)
+        if self.keys and self.random.random() < 0.6:
+            return "key", self.random.choice(self.keys)
+        return "click", self.random.randint(0, width - 1), self.random.randint(0, height - 1)
+
+    def _post_input(self, spec: tuple):
+        pygame = self.pygame
+        if spec[0] == "key":
+            events = [pygame.event.Event(pygame.KEYDOWN, {"key": spec[1], "mod": 0, "unicode": "", "scancode": 0}),
+                      pygame.event.Event(pygame.KEYUP, {"key": spec[1], "mod": 0, "unicode": "", "scancode": 0})]
+        else:
+            events = [pygame.event.Event(pygame.MOUSEBUTTONDOWN, {"pos": spec[1:], "button": 1}),
+                      pygame.event.Event(pygame.MOUSEBUTTONUP, {"pos": spec[1:], "button": 1})]
+        # Posted through the hooks, so the input is recorded like the ones of the monkey bot
+        for event in events:
+            pygame.event.post(event)
+        self.guided_inputs += 1
+
+
+# ---------------------------------------------------------------------------
+# Liveness
+# ---------------------------------------------------------------------------
+
+class LivenessMonitor:
+    """
+    Follow the screen and the state of the game while it is fuzzed:
+    every SAMPLE_FRAMES frames the display surface is downsampled and hashed (NumPy when available),
+    and the states reached are recorded from the game_state variable.
+    Errors: the screen never changes despite the inputs, the game never leaves START,
+    the screen freezes for FROZEN_SECONDS while PLAYING. A missing GAME_OVER is only a warning,
+    random inputs may survive the whole run.
+    """
+
+    SAMPLE_FRAMES = 5
+    DOWNSAMPLE = 8
+    FROZEN_SECONDS = 5.0
+    # Shorter runs do not give the game enough time to react
+    MIN_SECONDS = 3.0
+
+    def __init__(self, pygame, game_file: str):
+        self.pygame = pygame
+        self.game_file = game_file
+        try:
+            import numpy
+            self.numpy = numpy
+        except ImportError:
+            self.numpy = None
+        self.started = time.monotonic()
+        self.frames = 0
+        self.inputs = 0
+        self.hashes: set[str] = set()
+        self.states: list[str] = []
+        self.transitions: list[dict] = []
+        self.state = None
+        self.current_hash = None
+        self.hash_since = self.started
+        self.inputs_since = 0
+        self.frozen: list[dict] = []
+        install_input_hook(pygame, self.observe_event)
+
+    def observe_event(self, event):
+        if event.type in (self.pygame.KEYDOWN, self.pygame.MOUSEBUTTONDOWN):
+            self.inputs += 1
+            self.inputs_since += 1
+
+    def frame_hash(self, surface) -> str:
+        if self.numpy is not None:
+            pixels = self.pygame.surfarray.array3d(surface)[::self.DOWNSAMPLE, ::self.DOWNSAMPLE]
+            # Drop the low bits, so dithering / tiny color noise does not count as a change
+            data = (pixels >> 4).astype(self.numpy.uint8).tobytes()
+        else:
+            width, height = surface.get_size()
+            small = self.pygame.transform.scale(surface, (max(1, width // self.DOWNSAMPLE),
+                                                          max(1, height // self.DOWNSAMPLE)))
+            to_bytes = getattr(self.pygame.image, "tobytes", None) or self.pygame.image.tostring
+            data = to_bytes(small, "RGB")
+        return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+    def on_frame(self, caller_frame):
+        self.frames += 1
+        state = find_game_state(caller_frame, self.game_file)
+        if state is not None and state != self.state:
+            if self.state is not None:
+                self.transitions.append({"from": self.state, "to": state, "frame": REPORT["frames"]})
+            if state not in self.states:
+                self.states.append(state)
+            self.state = state
+
+        if self.frames % self.SAMPLE_FRAMES:
+            return
+        surface = self.pygame.display.get_surface()
+        if surface is None:
+            return
+        frame_hash = self.frame_hash(surface)
+        self.hashes.add(frame_hash)
+        if frame_hash != self.current_hash:
+            self._close_stretch()
+            self.current_hash = frame_hash
+            self.hash_since = time.monotonic()
+            self.inputs_since = 0
+
+    def _close_stretch(self):
+        """Record the span the current screen stayed unchanged, when it is a freeze during play."""
+        seconds = time.monotonic() - self.hash_since
+        if self.current_hash is not None and seconds >= self.FROZEN_SECONDS and self.inputs_since \
+                and self.state not in ("START", "GAME_OVER"):
+            self.frozen.append({"state": self.state, "seconds": round(seconds, 1), "inputs": self.inputs_since})
+
+    def summary(self) -> dict:
+        self._close_stretch()
+        elapsed = time.monotonic() - self.started
+        errors, warnings = [], []
+        if elapsed >= self.MIN_SECONDS and self.inputs:
+            if len(self.hashes) == 1:
+                errors.append(f"Frozen screen: the screen never changed in {elapsed:.0f}s despite {self.inputs} inputs")
+            if self.states == ["START"]:
+                errors.append(f"Stuck in START: the state stayed 'START' for {elapsed:.0f}s despite {self.inputs} "
+                              f"inputs (any key / click should start the game)")
+            for stretch in self.frozen:
+                errors.append(f"Frozen screen: the screen did not change for {stretch['seconds']}s in state "
+                              f"'{stretch['state'] or 'unknown'}' despite {stretch['inputs']} inputs")
+        if not self.states:
+            warnings.append("No game_state variable found, the state machine could not be followed")
+        elif "PLAYING" in self.states and "GAME_OVER" not in self.states:
+            warnings.append(f"GAME_OVER was never reached in {elapsed:.0f}s of random play")
+
+        return {
+            "frames_hashed": self.frames // self.SAMPLE_FRAMES,
+            "distinct_screens": len(self.hashes),
+            "inputs": self.inputs,
+            "states": self.states,
+            "transitions": self.transitions[:MAX_EVENTS],
+            "errors": errors,
+            "warnings": warnings,
+            # The run itself showed a live game which left START: the LLM logic review can be skipped
+            "verified": not errors and len(self.hashes) > 1 and "PLAYING" in self.states,
+        }
+
+
+# ---------------------------------------------------------------------------
+# Conformance
+# ---------------------------------------------------------------------------
+
+def install_fast_forward(pygame, default_fps: int = 60) -> None:
+    """
+    Run the game as fast as possible on a virtual clock: Clock.tick() no longer sleeps but advances the clock
+    by one frame of its frame rate, pygame.time.get_ticks / wait / delay and time.sleep use the same clock,
+    so timers and dt based movement behave as at full speed.
+    """
+    virtual = {"ms": pygame.time.get_ticks() if pygame.get_init() else 0}
+
+    def advance(ms: float) -> None:
+        virtual["ms"] += max(0.0, ms)
+
+    class FastClock:
+        def __init__(self, *args, **kwargs):
+            self.frame_ms = 1000 / default_fps
+
+        def tick(self, framerate=0):
+            self.frame_ms = 1000 / framerate if framerate else 1000 / default_fps
+            advance(self.frame_ms)
+            return int(self.frame_ms)
+
+        tick_busy_loop = tick
+
+        def get_time(self):
+            return int(self.frame_ms)
+
+        def get_rawtime(self):
+            return 0
+
+        def get_fps(self):
+            return 1000 / self.frame_ms
+
+    def sleep_ms(ms):
+        advance(ms)
+        return int(ms)
+
+    def sleep(seconds):
+        advance(seconds * 1000)
+
+    pygame.time.Clock = FastClock
+    pygame.time.get_ticks = lambda: int(virtual["ms"])
+    pygame.time.wait = sleep_ms
+    pygame.time.delay = sleep_ms
+    time.sleep = sleep
+
+
+class ConformanceDriver:
+    """
+    Scripted check of the state machine required by the code template (REQUIRED_STATES of the GDD):
+    1. the game starts in START,
+    2. a key press / click switches to PLAYING,
+    3. playing (idle first, then seeded random keys) reaches GAME_OVER within PLAY_SECONDS of virtual time,
+    4. R restarts the game (back to START / PLAYING, or a relaunch by restart_program, recorded by the sandbox).
+    Every transition is reported as passed, failed or not_reached (the previous step never got there).
+    """
+
+    BOOT_FRAMES = 10
+    START_FRAMES = 60
+    START_INPUT_EVERY = 10
+    PLAY_SECONDS = 120
+    PLAY_INPUT_EVERY = 6
+    RESTART_FRAMES = 60
+    FPS = 60
+
+    START = "initial START"
+    TO_PLAYING = "START -> PLAYING"
+    TO_GAME_OVER = "PLAYING -> GAME_OVER"
+    RESTART = "GAME_OVER -> START (R)"
+
+    def __init__(self, pygame, game_file: str, seed: int = 0):
+        self.pygame = pygame
+        self.game_file = game_file
+        self.random = random.Random(seed)
+        self.phase = "boot"
+        self.phase_frames = 0
+        self.state = None
+        self.states: list[str] = []
+        self.checks = {name: {"status": "not_reached", "detail": "", "frame": None}
+                       for name in (self.START, self.TO_PLAYING, self.TO_GAME_OVER, self.RESTART)}
+        self.keys = [pygame.K_SPACE, pygame.K_LEFT, pygame.K_RIGHT, pygame.K_UP, pygame.K_DOWN,
+                     pygame.K_a, pygame.K_d, pygame.K_w, pygame.K_s, pygame.K_RETURN]
+        self.start_inputs = [("key", pygame.K_SPACE), ("key", pygame.K_RETURN), ("click", None), ("key", pygame.K_a)]
+        self.sandbox_events_before_restart = 0
+
+    def _post(self, spec: tuple):
+        pygame = self.pygame
+        if spec[0] == "key":
+            for event_type in (pygame.KEYDOWN, pygame.KEYUP):
+                pygame.event.post(pygame.event.Event(event_type, {"key": spec[1], "mod": 0, "unicode": "",
+                                                                  "scancode": 0}))
+        else:
+            surface = pygame.display.get_surface()
+            width, height = surface.get_size() if surface else (800, 600)
+            pos = spec[1] or (width // 2, height // 2)
+            for event_type in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP):
+                pygame.event.post(pygame.event.Event(event_type, {"pos": pos, "button": 1}))
+
+    def _check(self, name: str, status: str, detail: str = ""):
+        self.checks[name] = {"status": status, "detail": detail, "frame": REPORT["frames"]}
+
+    def _enter(self, phase: str):
+        self.phase = phase
+        self.phase_frames = 0
+        print(f"{CONFORMANCE_STEP_MARKER}{self.current_check()}", file=sys.stderr, flush=True)
+
+    def current_check(self) -> str:
+        return {"boot": self.START, "start": self.TO_PLAYING, "playing": self.TO_GAME_OVER,
+                "game_over": self.RESTART}[self.phase]
+
+    def on_frame(self, caller_frame):
+        state = find_game_state(caller_frame, self.game_file)
+        if state is not None:
+            if state not in self.states:
+                self.states.append(state)
+            self.state = state
+        self.phase_frames += 1
+
+        if self.phase == "boot":
+            if self.state == "START":
+                self._check(self.START, "passed")
+                self._enter("start")
+            elif self.phase_frames >= self.BOOT_FRAMES:
+                if self.state is None:
+                    self._check(self.START, "failed", "no `game_state` variable found (must be \"START\", "
+                                                      "\"PLAYING\" or \"GAME_OVER\")")
+                    raise HarnessStop()
+                self._check(self.START, "failed", f"the game starts in state {self.state!r} instead of 'START'")
+                self._enter("start")
+
+        elif self.phase == "start":
+            if self.state == "PLAYING":
+                self._check(self.TO_PLAYING, "passed")
+                self._enter("playing")
+            elif self.phase_frames >= self.START_FRAMES:
+                self._check(self.TO_PLAYING, "failed",
+                            f"still in state {self.state!r} after pressing SPACE / RETURN / A and clicking "
+                            f"(any key or click must switch to 'PLAYING')")
+                raise HarnessStop()
+            elif self.phase_frames % self.START_INPUT_EVERY == 1:
+                self._post(self.start_inputs[(self.phase_frames // self.START_INPUT_EVERY) % len(self.start_inputs)])
+
+        elif self.phase == "playing":
+            if self.state == "GAME_OVER":
+                self._check(self.TO_GAME_OVER, "passed")
+                self._enter("game_over")
+                return
+            if self.state not in ("PLAYING", None):
+                self._check(self.TO_GAME_OVER, "failed", f"left 'PLAYING' for {self.state!r} instead of 'GAME_OVER'")
+                raise HarnessStop()
+            if self.phase_frames >= self.PLAY_SECONDS * self.FPS:
+                self._check(self.TO_GAME_OVER, "not_reached",
+                            f"no 'GAME_OVER' after {self.PLAY_SECONDS}s of play (idle, then random keys)")
+                raise HarnessStop()
+            # Idle for the first third: most games are lost by doing nothing
+            if self.phase_frames > self.PLAY_SECONDS * self.FPS // 3 and self.phase_frames % self.PLAY_INPUT_EVERY == 0:
+                self._post(("key", self.random.choice(self.keys)))
+
+        elif self.phase == "game_over":
+            if self.phase_frames == 1:
+                self.sandbox_events_before_restart = len(REPORT["sandbox_events"])
+                self._post(("key", self.pygame.K_r))
+            elif self.state in ("START", "PLAYING"):
+                self._check(self.RESTART, "passed")
+                raise HarnessStop()
+            elif self.phase_frames >= self.RESTART_FRAMES:
+                self._check(self.RESTART, "failed", f"still in state {self.state!r} {self.RESTART_FRAMES} frames "
+                                                    f"after pressing R")
+                raise HarnessStop()
+
+    def finish(self, status: str):
+        """Judge the step which was running when the game exited, crashed or ran out of time."""
+        current = self.current_check()
+        if self.checks[current]["status"] != "not_reached":
+            return
+        if status == "crashed":
+            self._check(current, "failed", "the game crashed")
+        elif status == "time_up":
+            self._check(current, "not_reached", "the conformance run ran out of time")
+        elif status == "frozen":
+            self._check(current, "failed", f"the game loop stopped rendering "
+                                           f"(no display.flip for {REPORT['stalled_seconds']}s)")
+        elif status == "exited" and self.phase == "game_over":
+            # restart_program relaunches the script and exits, the sandbox recorded the relaunch
+            script = os.path.basename(self.game_file)
+            if any(script in event["detail"]
+                   for event in REPORT["sandbox_events"][self.sandbox_events_before_restart:]):
+                self._check(self.RESTART, "passed", "restarted by relaunching the script")
+            else:
+                self._check(self.RESTART, "failed", "the game exited when R was pressed instead of restarting")
+        elif status == "exited":
+            self._check(current, "failed", "the game exited")
+
+    def summary(self) -> dict:
+        failed = [f"{name}: {check['detail']}" for name, check in self.checks.items() if check["status"] == "failed"]
+        return {
+            "checks": self.checks,
+            "states": self.states,
+            "failed": failed,
+            "passed": not failed and self.checks[self.TO_PLAYING]["status"] == "passed",
+        }
+
+
+# ---------------------------------------------------------------------------
+# Profiling
+# ---------------------------------------------------------------------------
+
+def percentile(samples: list[float], percent: float) -> float:
+    """Nearest-rank percentile."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = math.ceil(percent / 100 * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+def steadily_growing(samples: list[float], min_growth: float) -> bool:
+    """True when the samples grew by min_growth overall and most of the steps went up (a leak, not a spike)."""
+    if len(samples) < 4:
+        return False
+    steps = [after - before for before, after in zip(samples, samples[1:]) if after != before]
+    rising = sum(step > 0 for step in steps)
+    return samples[-1] - samples[0] >= min_growth and bool(steps) and rising / len(steps) >= 0.7
+
+
+class FrameProfiler:
+    """
+    Per-frame update / draw time, sprite group sizes and traced Python memory of the game.
+    - A frame runs from the end of the previous Clock.tick() (or flip) to the end of its flip;
+      update is the part before the first draw call (pygame.draw.*, Group.draw), draw the rest including the flip.
+      Surface.fill / blit can't be patched, so they count as update / draw depending on where they are called.
+    - With the settrace coverage backend, tracing is paused every other window and only untraced frames are timed.
+    - Sprite groups and memory are sampled every SAMPLE_SECONDS, the first sample is taken after WARMUP_SECONDS
+      (loading assets / fonts is not a leak).
+    """
+
+    SAMPLE_SECONDS = 0.5
+    WARMUP_SECONDS = 1.0
+    # settrace backend: frames traced for coverage, then frames timed without tracing
+    TRACED_WINDOW = 60
+    TIMED_WINDOW = 30
+    MIN_TIMED_FRAMES = 30
+    SPRITE_GROWTH = 200
+
+    def __init__(self, pygame, game_file: str, tracker: CoverageTracker | None,
+                 frame_budget_ms: float, memory_growth_mb: float):
+        self.pygame = pygame
+        self.game_file = game_file
+        self.tracker = tracker
+        self.frame_budget_ms = frame_budget_ms
+        self.memory_growth_mb = memory_growth_mb
+
+        self.update_ms: list[float] = []
+        self.draw_ms: list[float] = []
+        self.interval_ms: list[float] = []
+        self.memory_mb: list[float] = []
+        self.sprites: dict[str, list[int]] = {}
+        self.groups = weakref.WeakSet()
+
+        self.last_flip_end = None
+        self.last_tick_end = 0.0
+        self.draw_start = None
+        self.flip_start = None
+        self.timed = tracker is None or not tracker.pausable
+        self.window_frames = 0
+        self.started = time.perf_counter()
+        self.next_sample = self.started + self.WARMUP_SECONDS
+        self.first_snapshot = self.last_snapshot = None
+
+    def install(self):
+        pygame = self.pygame
+        profiler = self
+
+        tracemalloc.start()
+
+        # pygame.time.Clock is a C type, wrap it to know when tick() returns
+        original_clock = pygame.time.Clock
+
+        class ProfiledClock:
+            def __init__(self, *args, **kwargs):
+                self._clock = original_clock(*args, **kwargs)
+
+            def tick(self, *args, **kwargs):
+                result = self._clock.tick(*args, **kwargs)
+                profiler.last_tick_end = time.perf_counter()
+                return result
+
+            def tick_busy_loop(self, *args, **kwargs):
+                result = self._clock.tick_busy_loop(*args, **kwargs)
+                profiler.last_tick_end = time.perf_counter()
+                return result
+
+            def __getattr__(self, name):
+                return getattr(self._clock, name)
+
+        pygame.time.Clock = ProfiledClock
+
+        def marked(function):
+            def wrapper(*args, **kwargs):
+                if profiler.draw_start is None:
+                    profiler.draw_start = time.perf_counter()
+                return function(*args, **kwargs)
+            return wrapper
+
+        for name in dir(pygame.draw):
+            function = getattr(pygame.draw, name)
+            if not name.startswith("_") and callable(function):
+                setattr(pygame.draw, name, marked(function))
+        for value in vars(pygame.sprite).values():
+            if isinstance(value, type) and "draw" in vars(value):
+                value.draw = marked(value.draw)
+
+        original_group_init = pygame.sprite.AbstractGroup.__init__
+
+        def group_init(group, *args, **kwargs):
+            original_group_init(group, *args, **kwargs)
+            profiler.groups.add(group)
+
+        pygame.sprite.AbstractGroup.__init__ = group_init
+
+    def before_flip(self):
+        self.flip_start = time.perf_counter()
+        if self.draw_start is None:
+            self.draw_start = self.flip_start
+
+    def on_frame(self, caller_frame):
+        now = time.perf_counter()
+        if self.last_flip_end is not None:
+            self.interval_ms.append((now - self.last_flip_end) * 1000)
+            if self.timed:
+                frame_start = max(self.last_flip_end, self.last_tick_end)
+                draw_start = max(self.draw_start or now, frame_start)
+                self.update_ms.append((draw_start - frame_start) * 1000)
+                self.draw_ms.append((now - draw_start) * 1000)
+        self.last_flip_end = now
+        self.draw_start = None
+
+        if now >= self.next_sample:
+            self.next_sample = now + self.SAMPLE_SECONDS
+            self._sample(caller_frame)
+
+        self._schedule_tracing()
+        # Do not count the harness work into the next frame
+        self.last_flip_end = time.perf_counter()
+
+    def _schedule_tracing(self):
+        if self.tracker is None or not self.tracker.pausable:
+            return
+        self.window_frames += 1
+        if self.tracker.paused and self.window_frames >= self.TIMED_WINDOW:
+            self.tracker.resume()
+            self.window_frames = 0
+        elif not self.tracker.paused and self.window_frames >= self.TRACED_WINDOW:
+            self.tracker.pause()
+            self.window_frames = 0
+        # A frame is timed only when it runs entirely without tracing
+        self.timed = self.tracker.paused
+
+    def _sample(self, caller_frame):
+        # Snapshots are taken while the game runs, its objects are freed once HarnessStop unwinds the main loop
+        self.last_snapshot = tracemalloc.take_snapshot()
+        if self.first_snapshot is None:
+            self.first_snapshot = self.last_snapshot
+        self.memory_mb.append(tracemalloc.get_traced_memory()[0] / 1024 / 1024)
+
+        # Name the groups after the variables of the game which hold them
+        names = {}
+        for scope in (caller_frame.f_globals, caller_frame.f_locals, getattr(caller_frame.f_locals.get("self"), "__dict__", {})):
+            for name, value in list(scope.items()):
+                if isinstance(value, self.pygame.sprite.AbstractGroup):
+                    names.setdefault(id(value), name)
+        samples = {}
+        for group in list(self.groups):
+            name = names.get(id(group))
+            if name is not None:
+                samples[name] = samples.get(name, 0) + len(group)
+        for name, size in samples.items():
+            self.sprites.setdefault(name, []).append(size)
+
+    def _top_allocations(self, limit: int = 3) -> list[str]:
+        if self.first_snapshot is None:
+            return []
+        game_filter = [tracemalloc.Filter(True, self.game_file)]
+        stats = self.last_snapshot.filter_traces(game_filter).compare_to(
+            self.first_snapshot.filter_traces(game_filter), "lineno")
+        # The line numbers are the ones of the fuzzed copy (with the injected bot), quote the code instead
+        return [f"`{linecache.getline(self.game_file, stat.traceback[0].lineno).strip()}` "
+                f"+{stat.size_diff / 1024:.0f} KB ({stat.count_diff:+d} blocks)"
+                for stat in stats[:limit] if stat.size_diff > 0]
+
+    def summary(self) -> dict:
+        work_ms = [update + draw for update, draw in zip(self.update_ms, self.draw_ms)]
+        findings = []
+
+        if len(work_ms) >= self.MIN_TIMED_FRAMES and percentile(work_ms, 95) > self.frame_budget_ms:
+            findings.append(
+                f"Frame time over budget: p95 update+draw {percentile(work_ms, 95):.1f} ms > "
+                f"{self.frame_budget_ms:.1f} ms (update p95 {percentile(self.update_ms, 95):.1f} ms, "
+                f"draw p95 {percentile(self.draw_ms, 95):.1f} ms, worst frame {max(work_ms):.1f} ms)")
+
+        if steadily_growing(self.memory_mb, self.memory_growth_mb):
+            sites = self._top_allocations()
+            findings.append(
+                f"Steady memory growth: traced memory grew from {self.memory_mb[0]:.1f} MB to "
+                f"{self.memory_mb[-1]:.1f} MB in {time.perf_counter() - self.started:.0f}s"
+                + (f", growing allocations at {'; '.join(sites)}" if sites else ""))
+
+        for name, sizes in self.sprites.items():
+            if steadily_growing(sizes, self.SPRITE_GROWTH):
+                findings.append(f"Sprite group `{name}` keeps growing: {sizes[0]} -> {sizes[-1]} sprites "
+                                f"(sprites are never removed, e.g. missing kill() when off screen)")
+
+        return {
+            "timed_frames": len(work_ms),
+            "frame_ms_p50": round(percentile(work_ms, 50), 2),
+            "frame_ms_p95": round(percentile(work_ms, 95), 2),
+            "frame_ms_max": round(max(work_ms, default=0.0), 2),
+            "update_ms_p95": round(percentile(self.update_ms, 95), 2),
+            "draw_ms_p95": round(percentile(self.draw_ms, 95), 2),
+            "fps": round(1000 / percentile(self.interval_ms, 50), 1) if self.interval_ms else 0.0,
+            "memory_mb_start": round(self.memory_mb[0], 2) if self.memory_mb else 0.0,
+            "memory_mb_end": round(self.memory_mb[-1], 2) if self.memory_mb else 0.0,
+            "sprites_peak": {name: max(sizes) for name, sizes in self.sprites.items()},
+            "frame_budget_ms": self.frame_budget_ms,
+            "findings": findings,
+        }
+
+
+# ---------------------------------------------------------------------------
+# Frame hook
+# ---------------------------------------------------------------------------
+
+def install_frame_hook(on_frame, before_frame=None) -> bool:
+    """
+    Call on_frame(caller_frame) after every pygame.display.flip()/update() of the game,
+    and before_frame() right before it.
+    :return: False when pygame is not installed
+    """
+    try:
+        import pygame
+    except ImportError:
+        return False
+
+    original_flip = pygame.display.flip
+    original_update = pygame.display.update
+
+    def flip(*args, **kwargs):
+        if before_frame is not None:
+            before_frame()
+        result = original_flip(*args, **kwargs)
+        on_frame(sys._getframe(1))
+        return result
+
+    def update(*args, **kwargs):
+        if before_frame is not None:
+            before_frame()
+        result = original_update(*args, **kwargs)
+        on_frame(sys._getframe(1))
+        return result
+
+    pygame.display.flip = flip
+    pygame.display.update = update
+    return True
+
+
+def game_traceback(error: BaseException, game_file: str) -> str:
+    """The traceback of a crash starting at the first frame of the game (without the harness / runpy frames)."""
+    tb = error.__traceback__
+    while tb is not None and tb.tb_frame.f_code.co_filename != game_file:
+        tb = tb.tb_next
+    return "".join(traceback.format_exception(type(error), error, tb or error.__traceback__))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Run a generated game inside the fuzz harness")
+    parser.add_argument("game_file")
+    parser.add_argument("--report", required=True)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--coverage-guided", action="store_true",
+                        help="Collect the coverage of the game and bias the inputs toward new code")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--profile", action="store_true", help="Record frame times, sprite groups and memory")
+    parser.add_argument("--frame-budget-ms", type=float, default=33.3)
+    parser.add_argument("--memory-growth-mb", type=float, default=20.0)
+    parser.add_argument("--conformance", action="store_true",
+                        help="Play the scripted START -> PLAYING -> GAME_OVER -> restart sequence in fast-forward")
+    args = parser.parse_args()
+
+    game_file = os.path.abspath(args.game_file)
+    started = time.monotonic()
+    deadline = started + args.duration
+
+    tracker = guide = profiler = liveness = driver = None
+    if args.coverage_guided:
+        with open(game_file, "r", encoding="utf-8") as f:
+            tracker = CoverageTracker(game_file, f.read())
+
+    last_frame = {"at": started}
+    report_lock = threading.Lock()
+    report_written = threading.Event()
+
+    def before_frame():
+        if profiler is not None:
+            profiler.before_flip()
+
+    def on_frame(caller_frame):
+        REPORT["frames"] += 1
+        last_frame["at"] = time.monotonic()
+        if guide is not None:
+            guide.on_frame()
+        if driver is not None:
+            driver.on_frame(caller_frame)
+        if liveness is not None:
+            liveness.on_frame(caller_frame)
+        # Last, the profiler does not count the harness work into the next frame
+        if profiler is not None:
+            profiler.on_frame(caller_frame)
+        if time.monotonic() >= deadline:
+            raise HarnessStop()
+
+    install_sandbox()
+    if install_frame_hook(on_frame, before_frame):
+        import pygame
+        if args.conformance:
+            install_fast_forward(pygame)
+            driver = ConformanceDriver(pygame, game_file, seed=args.seed or 0)
+        else:
+            liveness = LivenessMonitor(pygame, game_file)
+        if tracker is not None:
+            guide = CoverageGuide(pygame, tracker, seed=args.seed)
+        if args.profile:
+            profiler = FrameProfiler(pygame, game_file, tracker, args.frame_budget_ms, args.memory_growth_mb)
+            profiler.install()
+
+    # The game sees itself as the main script
+    sys.argv = [game_file]
+    sys.path.insert(0, os.path.dirname(game_file))
+
+    def write_report(status: str) -> bool:
+        """
+        Write the report once: from the main thread when the game stopped, or from the freeze watchdog.
+        :return: False when the report was already written
+        """
+        with report_lock:
+            if report_written.is_set():
+                return False
+            REPORT["status"] = status
+            if tracker is not None:
+                tracker.stop()
+                REPORT["coverage"] = {**tracker.summary(), "guided_inputs": guide.guided_inputs if guide else 0,
+                                      "corpus": len(guide.corpus) if guide else 0}
+            if profiler is not None:
+                REPORT["performance"] = profiler.summary()
+            if liveness is not None:
+                REPORT["liveness"] = liveness.summary()
+                if status == "frozen":
+                    REPORT["liveness"]["errors"].append(
+                        f"Frozen game loop: no display.flip for {REPORT['stalled_seconds']}s "
+                        f"(after {REPORT['frames']} frames)")
+                    REPORT["liveness"]["verified"] = False
+            if driver is not None:
+                driver.finish(status)
+                REPORT["conformance"] = driver.summary()
+            REPORT["elapsed"] = round(time.monotonic() - started, 3)
+            with open(args.report, "w", encoding="utf-8") as f:
+                json.dump(REPORT, f)
+            report_written.set()
+            return True
+
+    main_thread_id = threading.get_ident()
+
+    def watch_for_freeze():
+        # The frame hook stops the game at the deadline, unless the game no longer reaches display.flip()
+        while not report_written.wait(0.25):
+            now = time.monotonic()
+            if now < deadline + FREEZE_GRACE_SECONDS:
+                continue
+            stalled = now - last_frame["at"]
+            REPORT["stalled_seconds"] = round(stalled, 1)
+            # Where the game loop is stuck, for the fixer
+            stack = traceback.extract_stack(sys._current_frames().get(main_thread_id))
+            game_lines = [f'File "{entry.filename}", line {entry.lineno}, in {entry.name}\n    {entry.line}'
+                          for entry in stack if entry.filename == game_file]
+            REPORT["frozen_at"] = "\n".join(game_lines) or None
+            if write_report("frozen" if stalled >= FREEZE_GRACE_SECONDS else "time_up"):
+                # The main thread is stuck in the game, it can't unwind
+                os._exit(1)
+
+    threading.Thread(target=watch_for_freeze, name="harness-watchdog", daemon=True).start()
+
+    exit_code = 0
+    status = "exited"
+    if tracker is not None:
+        tracker.start()
+    try:
+        runpy.run_path(game_file, run_name="__main__")
+    except HarnessStop:
+        status = "time_up"
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except BaseException as e:
+        status = "crashed"
+        REPORT["error"] = game_traceback(e, game_file)
+        print(REPORT["error"], file=sys.stderr)
+        exit_code = 1
+    finally:
+        write_report(status)
+
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,11 @@
+# The prompts below are static system prompts, the code / errors are sent in the user message (*_INPUT).
+# Keeping the long instructions as a fixed prefix lets providers reuse their prompt cache between calls.
+
 # Reviewer / Fixer Prompt (For Syntax & Runtime Errors)
 FIXER_PROMPT = """
 You are a Python Expert and QA Engineer.
 I tried to run a Pygame script, but it crashed or had errors.
-
-【BROKEN CODE】:
-{code}
-
-【ERROR MESSAGE】:
-{error}
+The broken code and the error message are given in the user message.
 
 【TASK】:
 1. Analyze the error.
@@ -30,13 +28,18 @@ I tried to run a Pygame script, but it crashed or had errors.
 Return the fixed code inside a ```python ... ``` block.
 """
 
+FIXER_INPUT = """
+【BROKEN CODE】:
+{code}
+
+【ERROR MESSAGE】:
+{error}
+"""
+
 # Logic Reviewer Prompt (Strict Mode)
 LOGIC_REVIEW_PROMPT = """
 You are a Senior Game Developer reviewing Pygame code.
-Analyze the following code for LOGIC ERRORS. Do NOT hallucinate checks that aren't there.
-
-【CODE】:
-{code}
+Analyze the code given in the user message for LOGIC ERRORS. Do NOT hallucinate checks that aren't there.
 
 【CHECKLIST】:
 1. **Grid Safety (CRITICAL)**:
@@ -58,16 +61,16 @@ If playable and SAFE, output: PASS
 If unsafe (missing None checks), output: FAIL: [Line number/Function] accesses NoneType without check.
 """
 
+LOGIC_REVIEW_INPUT = """
+【CODE】:
+{code}
+"""
+
 # Logic Fixer Prompt
 LOGIC_FIXER_PROMPT = """
 You are a Python Game Developer.
 The code has logical issues (e.g., crashes on empty cells, objects not moving).
-【Error Messages】
-{error}
-
-
-【CODE】:
-{code}
+The code and the error messages are given in the user message.
 
 【TASK】:
 1. **Fix Grid/NoneType Errors (Top Priority)**:
@@ -77,5 +80,44 @@ The code has logical issues (e.g., crashes on empty cells, objects not moving).
 2. **Fix Physics/Controls**: 
    - Ensure `update()` updates position.
    - Ensure Mouse Drag calculates vector correctly.
-3. Output the FULL corrected code in ```python ... ``` block.
-"""
\ No newline at end of file
+3. When the errors have several sections (e.g. runtime errors of the fuzzer AND the logic review), fix ALL of them in one pass.
+4. Output the FULL corrected code in ```python ... ``` block.
+"""
+
+LOGIC_FIXER_INPUT = """
+【GAME RULES】 (controls, entities, states, win / loss conditions of the GDD):
+{rules}
+
+【CODE】:
+{code}
+
+【Error Messages】
+{error}
+"""
+
+# Performance Fixer Prompt (frame time budget / memory or sprite leaks found by the fuzz profiler)
+PERFORMANCE_FIXER_PROMPT = """
+You are a Python Game Developer optimizing Pygame code for weak laptops.
+The game works, but the profiler measured performance problems while playing it.
+The code and the profiler findings are given in the user message.
+
+【TASK】:
+1. **Frame Time (update / draw over budget)**:
+   - Load images, fonts and sounds ONCE at startup, never inside the main loop (`pygame.font.Font(...)` per frame is slow).
+   - Cache rendered text surfaces that do not change; call `.convert()` / `.convert_alpha()` on loaded images.
+   - Avoid O(n^2) loops over all sprites every frame; use `pygame.sprite.spritecollide` / `groupcollide`.
+2. **Memory / Sprite Growth**:
+   - `kill()` sprites which leave the screen or are no longer used (bullets, particles, enemies).
+   - Do not append to lists every frame without removing old entries.
+   - Reset the groups when the game restarts.
+3. Keep the game rules, the states and the controls unchanged.
+4. Output the FULL corrected code in ```python ... ``` block.
+"""
+
+PERFORMANCE_FIXER_INPUT = """
+【CODE】:
+{code}
+
+【PROFILER FINDINGS】
+{error}
+"""
@@ -0,0 +1,156 @@
+import hashlib
+import re
+import time
+from typing import Optional
+
+from config import config
+from src.llm.result import LLMResult
+from src.llm.tokens import count_tokens
+
+
+CHECK_SYNTAX = "syntax"
+CHECK_CONFORMANCE = "conformance"
+CHECK_FUZZ = "fuzz"
+CHECK_REVIEW = "review"
+
+# Cheapest first: ast.parse (ms) -> scripted state machine (< 1s) -> fuzz test (FUZZER_RUNNING_TIME)
+# -> LLM logic review (tokens), which is also gated by the results of the executable checks
+CHECK_ORDER = (CHECK_SYNTAX, CHECK_CONFORMANCE, CHECK_FUZZ, CHECK_REVIEW)
+
+# The checks of a stage run concurrently (Config.FIX_PARALLEL_CHECKS): the fuzz test (CPU / subprocess)
+# and the LLM review (network) only need syntactically valid code
+CHECK_STAGES = ((CHECK_SYNTAX,), (CHECK_CONFORMANCE,), (CHECK_FUZZ, CHECK_REVIEW))
+
+
+def code_hash(code: str) -> str:
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+
+def error_fingerprint(check: str, message: str) -> str:
+    """
+    Fingerprint of an error which ignores what changes between two runs of the same bug:
+    file paths, line numbers, memory addresses, timings.
+    :rtype: str
+    """
+    normalized = message.lower()
+    normalized = re.sub(r'file "[^"]*"', "file", normalized)
+    normalized = re.sub(r"0x[0-9a-f]+", "#", normalized)
+    normalized = re.sub(r"\d+(\.\d+)?", "#", normalized)
+    normalized = re.sub(r"\s+", " ", normalized).strip()
+    return hashlib.sha256(f"{check}\n{normalized}".encode("utf-8")).hexdigest()[:16]
+
+
+class FixBudget:
+    """
+    Wall time / token / attempt budget of one fix loop run (defaults: Config.FIX_MAX_*, 0 = unlimited).
+    The LLM calls of the loop are charged with charge().
+    """
+
+    def __init__(self, max_seconds: Optional[float] = None, max_tokens: Optional[int] = None,
+                 max_attempts: Optional[int] = None):
+        self.max_seconds = config.FIX_MAX_SECONDS if max_seconds is None else max_seconds
+        self.max_tokens = config.FIX_MAX_TOKENS if max_tokens is None else max_tokens
+        self.max_attempts = config.FIX_MAX_ATTEMPTS if max_attempts is None else max_attempts
+        self.started = time.monotonic()
+        self.tokens_used = 0
+        self.attempts = 0
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def remaining_seconds(self) -> float:
+        return self.max_seconds - self.elapsed if self.max_seconds else float("inf")
+
+    @property
+    def remaining_tokens(self) -> float:
+        return self.max_tokens - self.tokens_used if self.max_tokens else float("inf")
+
+    def charge(self, result: LLMResult):
+        self.tokens_used += result.total_tokens
+
+    def exceeded(self) -> Optional[str]:
+        """
+        :return: The reason to stop, None while the budget lasts
+        :rtype: Optional[str]
+        """
+        if self.max_attempts and self.attempts >= self.max_attempts:
+            return f"已達最大修復次數 ({self.max_attempts})"
+        if self.remaining_seconds <= 0:
+            return f"已用完修復時間預算 ({self.max_seconds:.0f}s)"
+        if self.remaining_tokens <= 0:
+            return f"已用完 Token 預算 ({self.tokens_used}/{self.max_tokens})"
+        return None
+
+
+class FixScheduler:
+    """
+    Decide what the fix loop runs next:
+    - a check already passed by the same code is not run again,
+    - code identical to a version which already failed is not checked again (the fix made no progress),
+    - the same error fingerprint twice means the fixer is stuck on it: stop,
+    - a check / fix is only started when the remaining budget can pay for it.
+    """
+
+    def __init__(self, budget: Optional[FixBudget] = None):
+        self.budget = budget or FixBudget()
+        self.passed: dict[str, str] = {}
+        self.failed_hashes: set[str] = set()
+        self.fingerprints: set[str] = set()
+
+    @staticmethod
+    def stages() -> tuple[tuple[str, ...], ...]:
+        """The checks in order, grouped by the ones which run concurrently."""
+        if config.FIX_PARALLEL_CHECKS:
+            return CHECK_STAGES
+        return tuple((check,) for check in CHECK_ORDER)
+
+    def already_passed(self, check: str, hash_: str) -> bool:
+        return self.passed.get(check) == hash_
+
+    def record_pass(self, check: str, hash_: str):
+        self.passed[check] = hash_
+
+    def record_failure(self, check: str, hash_: str, message: str) -> Optional[str]:
+        """
+        :return: The reason to stop when this error was already seen, None otherwise
+        :rtype: Optional[str]
+        """
+        self.failed_hashes.add(hash_)
+        fingerprint = error_fingerprint(check, message)
+        if fingerprint in self.fingerprints:
+            return "修復沒有進展 (相同的錯誤再次出現)"
+        self.fingerprints.add(fingerprint)
+        return None
+
+    def unchanged_since_failure(self, hash_: str) -> bool:
+        return hash_ in self.failed_hashes
+
+    def check_cost_seconds(self, check: str) -> float:
+        if check == CHECK_FUZZ:
+            return config.FUZZER_RUNNING_TIME
+        return 0.0
+
+    def can_afford_check(self, check: str) -> Optional[str]:
+        """
+        :return: The reason why the check can't run in the remaining budget, None when it can
+        :rtype: Optional[str]
+        """
+        if self.check_cost_seconds(check) > self.budget.remaining_seconds:
+            return f"剩餘時間 ({self.budget.remaining_seconds:.0f}s) 不足以執行 {check} 檢查"
+        return None
+
+    def can_afford_fix(self, code: str) -> Optional[str]:
+        """
+        A fix sends the whole code and gets the whole code back: about twice its tokens.
+        :return: The reason why the fix can't run in the remaining budget, None when it can
+        :rtype: Optional[str]
+        """
+        reason = self.budget.exceeded()
+        if reason:
+            return reason
+        estimate = 2 * count_tokens(code)
+        if estimate > self.budget.remaining_tokens:
+            return f"剩餘 Token 預算 ({self.budget.remaining_tokens:.0f}) 不足以修復 (約需 {estimate})"
+        return None
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import threading
+from functools import lru_cache
+
+from config import config
+from src.artifacts.store import ArtifactStore, get_artifact_store
+from src.testing.fuzzer import HARNESS_PATH
+from src.testing.prompts import LOGIC_REVIEW_PROMPT, LOGIC_REVIEW_INPUT
+from src.testing.scheduler import CHECK_SYNTAX, CHECK_CONFORMANCE, CHECK_FUZZ, CHECK_REVIEW
+
+
+# Bump the version of a check when it can give another verdict for the same code (new rules, prompt, budgets...)
+CHECK_VERSIONS = {
+    CHECK_SYNTAX: "1",
+    CHECK_CONFORMANCE: "1",
+    CHECK_FUZZ: "1",
+    CHECK_REVIEW: "1",
+}
+
+# Checks running the game in the harness, their version also follows the harness source
+HARNESS_CHECKS = (CHECK_CONFORMANCE, CHECK_FUZZ)
+# The version of the LLM review also follows its prompt
+PROMPT_CHECKS = {CHECK_REVIEW: (LOGIC_REVIEW_PROMPT, LOGIC_REVIEW_INPUT)}
+
+# Messages of verdicts which say nothing about the code (the check itself could not run)
+UNCACHEABLE_PREFIXES = ("File not found", "Fuzz Test Failed to Run", "Conformance Test Failed to Run")
+
+VERDICT_ARTIFACT = "verdict"
+
+
+@lru_cache(maxsize=1)
+def _harness_digest() -> str:
+    try:
+        with open(HARNESS_PATH, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()[:16]
+    except OSError:
+        return ""
+
+
+@lru_cache(maxsize=None)
+def _prompt_digest(check: str) -> str:
+    return hashlib.sha256("\0".join(PROMPT_CHECKS[check]).encode("utf-8")).hexdigest()[:16]
+
+
+def check_version(check: str) -> str:
+    version = CHECK_VERSIONS.get(check, "0")
+    if check in HARNESS_CHECKS:
+        version += f"+{_harness_digest()}"
+    if check in PROMPT_CHECKS:
+        version += f"+{_prompt_digest(check)}"
+    return version
+
+
+def cacheable(verdict: dict) -> bool:
+    """
+    Verdicts which say nothing about the code (the check itself could not run) are not cached,
+    nor verdicts of harness runs which timed out or froze: a hang can come from a loaded machine.
+    """
+    if not verdict.get("passed") and str(verdict.get("message", "")).startswith(UNCACHEABLE_PREFIXES):
+        return False
+    report = verdict.get("report") or {}
+    return not report.get("timed_out") and report.get("status") != "frozen"
+
+
+def validation_key(check: str, code: str, *inputs) -> str:
+    """
+    :param check: The check name
+    :type check: str
+
+    :param code: The game code
+    :type code: str
+
+    :param inputs: Every other input which changes the verdict (fuzz logic, duration, provider / model...)
+
+    :return: sha256 of the check, its version, the code and the inputs
+    :rtype: str
+    """
+    digest = hashlib.sha256(f"{check}\0{check_version(check)}".encode("utf-8"))
+    for value in (code,) + inputs:
+        digest.update(b"\0")
+        digest.update(str(value if value is not None else "").encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ValidationCache:
+    """
+    Verdicts of the fix loop checks ({"passed", "message", "report"}) keyed by validation_key.
+    They are saved in the artifact store, so every session and worker shares them:
+    code which was already validated (re-validation of an unchanged game, a fix returning identical code)
+    gets its verdict without LLM call or subprocess.
+    """
+
+    def __init__(self, store: ArtifactStore | None = None, enabled: bool | None = None):
+        self.store = store or get_artifact_store()
+        self.enabled = config.VALIDATION_CACHE_ENABLED if enabled is None else enabled
+
+    @staticmethod
+    def _scope(key: str) -> str:
+        return f"vcache-{key[:48]}"
+
+    def get(self, key: str) -> dict | None:
+        if not self.enabled:
+            return None
+        artifact = self.store.get_run_artifact(self._scope(key), VERDICT_ARTIFACT)
+        if artifact is None:
+            return None
+        try:
+            return json.loads(artifact[1])
+        except ValueError:
+            return None
+
+    def put(self, key: str, verdict: dict):
+        if not self.enabled:
+            return
+        if not cacheable(verdict):
+            return
+        try:
+            self.store.save_run_artifacts(self._scope(key),
+                                          **{VERDICT_ARTIFACT: json.dumps(verdict, ensure_ascii=False)})
+        except (OSError, ValueError) as e:
+            # A missing verdict only costs a rerun of the check
+            print(f"[Validation Cache] 無法儲存驗證結果: {e}")
+
+
+_validation_cache: ValidationCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_validation_cache() -> ValidationCache:
+    """Return the shared ValidationCache instance."""
+    global _validation_cache
+    with _cache_lock:
+        if _validation_cache is None:
+            _validation_cache = ValidationCache()
+        return _validation_cache
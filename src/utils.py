@@ -1,7 +1,16 @@
+import hashlib
 import openai
 import requests
+from tenacity import Retrying, retry_if_exception_type, wait_exponential_jitter
 from config import config
+from src.llm.errors import LLMCallError, RateLimitedError, TransientLLMError
+from src.llm.rate_limiter import get_rate_limiter, parse_retry_after
+from src.llm.result import LLMResult
+from src.llm.router import call_with_failover
+from src.llm.tokens import PROVIDER_CONTEXT_WINDOWS, count_tokens, estimate_tokens, fit_max_tokens, ollama_num_ctx
+from typing import Callable
 import os
+import time
 
 
 def get_client_config(provider: str) -> dict | None:
@@ -46,18 +55,19 @@ def call_google_gemini(
         model: str,
         temperature: float,
         max_tokens: int = 8192
-) -> str:
+) -> LLMResult:
     """
     處理 Google Gemini 的特殊邏輯 (需安裝 google-generativeai)
+    失敗時丟出 LLMCallError
     """
     try:
         import google.generativeai as genai
     except ImportError:
-        return "Error: 請安裝 google-generativeai 套件 (pip install google-generativeai)"
+        raise LLMCallError("Error: 請安裝 google-generativeai 套件 (pip install google-generativeai)")
 
     api_key: str = config.GOOGLE_API_KEY
     if not api_key:
-        return "Error: 未設定 GOOGLE_API_KEY"
+        raise LLMCallError("Error: 未設定 GOOGLE_API_KEY")
 
     try:
         genai.configure(api_key=api_key)
@@ -77,9 +87,28 @@ def call_google_gemini(
         )
 
         response = gemini_model.generate_content(user_prompt)
-        return response.text
+
+        finish_reason = None
+        if response.candidates:
+            finish_reason = getattr(response.candidates[0].finish_reason, "name", None)
+        usage = {}
+        usage_metadata = getattr(response, "usage_metadata", None)
+        if usage_metadata:
+            usage = {
+                "prompt_tokens": usage_metadata.prompt_token_count,
+                "completion_tokens": usage_metadata.candidates_token_count,
+                "total_tokens": usage_metadata.total_token_count,
+            }
+            # Gemini 2.5 caches repeated prefixes implicitly (system_instruction is sent first)
+            if getattr(usage_metadata, "cached_content_token_count", None):
+                usage["cached_tokens"] = usage_metadata.cached_content_token_count
+        return LLMResult(content=response.text, provider="google", model=model,
+                         finish_reason=finish_reason, usage=usage)
     except Exception as e:
-        return f"Gemini API Error: {str(e)}"
+        # google.api_core.exceptions.ResourceExhausted == HTTP 429
+        if type(e).__name__ in ("ResourceExhausted", "TooManyRequests"):
+            raise RateLimitedError(f"Gemini API Error: {str(e)}") from e
+        raise LLMCallError(f"Gemini API Error: {str(e)}") from e
 
 
 def call_ollama(
@@ -87,9 +116,15 @@ def call_ollama(
         user_prompt: str,
         model: str,
         temperature: float,
-        num_ctx: int = 4096
-) -> str:
-
+        num_ctx: int = 4096,
+        keep_alive: str | None = None,
+        max_tokens: int | None = None
+) -> LLMResult:
+    """
+    使用 Ollama 原生 API (/api/chat)，失敗時丟出 LLMCallError
+    keep_alive 讓模型常駐記憶體；只要 num_ctx 不變，Ollama 會重用相同 prefix (system prompt) 的 KV cache，
+    num_ctx 改變則會重新載入模型，所以呼叫端應盡量使用固定的 num_ctx (見 ollama_num_ctx 的分級)
+    """
     print(f"Run ollama (Native API): {model}")
 
     base_url = config.OLLAMA_BASE_URL
@@ -111,11 +146,14 @@ def call_ollama(
             {"role": "user", "content": user_prompt}
         ],
         "stream": False,
+        "keep_alive": keep_alive or config.OLLAMA_KEEP_ALIVE,
         "options": {
             "num_ctx": num_ctx,
             "temperature": temperature
         }
     }
+    if max_tokens:
+        payload["options"]["num_predict"] = max_tokens
 
     headers = {
         "Content-Type": "application/json"
@@ -135,20 +173,98 @@ def call_ollama(
             timeout=300
         )
 
+        # 429 (Too Many Requests) 或 503 (佇列已滿) 交給 call_llm 重試
+        if response.status_code in (429, 503):
+            raise RateLimitedError(
+                f"Ollama Error: {response.status_code} {response.reason}",
+                retry_after=parse_retry_after(response.headers)
+            )
+
         # 檢查是否有 401 (Unauthorized) 或 403 (Forbidden) 等錯誤
         if response.status_code == 401:
-            return "Ollama Error: 401 Unauthorized. 請檢查 API Key 是否正確。"
+            raise LLMCallError("Ollama Error: 401 Unauthorized. 請檢查 API Key 是否正確。")
 
         response.raise_for_status()
 
         result = response.json()
-        return result["message"]["content"]
+        prompt_tokens = result.get("prompt_eval_count", 0)
+        completion_tokens = result.get("eval_count", 0)
+        return LLMResult(
+            content=result["message"]["content"],
+            provider="ollama",
+            model=model,
+            finish_reason=result.get("done_reason"),
+            usage={
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            }
+        )
 
     except requests.exceptions.RequestException as e:
         print(f"[Ollama Error] Connection failed: {e}")
-        return f"Ollama Error: {str(e)}"
+        raise LLMCallError(f"Ollama Error: {str(e)}") from e
     except KeyError:
-        return f"Ollama Error: Unexpected response format. {response.text}"
+        raise LLMCallError(f"Ollama Error: Unexpected response format. {response.text}")
+
+
+def prompt_cache_key(system_prompt: str) -> str:
+    """
+    Stable cache key of a static system prompt (same prompt -> same key).
+    """
+    return "sp-" + hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:16]
+
+
+def _wait_for_retry(retry_state) -> float:
+    """
+    Tenacity wait strategy: honor the Retry-After of the provider, otherwise exponential backoff with jitter.
+    """
+    error = retry_state.outcome.exception()
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is not None:
+        return min(retry_after, config.LLM_BACKOFF_MAX_SECONDS)
+    return wait_exponential_jitter(initial=1, max=config.LLM_BACKOFF_MAX_SECONDS)(retry_state)
+
+
+def _stop_retrying(retry_state) -> bool:
+    """
+    Tenacity stop strategy: up to Config.LLM_MAX_RETRIES retries on HTTP 429,
+    Config.LLM_TRANSIENT_RETRIES on connection errors / HTTP 5xx.
+    """
+    retries = retry_state.attempt_number - 1
+    if isinstance(retry_state.outcome.exception(), RateLimitedError):
+        return retries >= config.LLM_MAX_RETRIES
+    return retries >= config.LLM_TRANSIENT_RETRIES
+
+
+# Providers registered at runtime, e.g. the local fake provider of the benchmarks.
+# The function gets (system_prompt, user_prompt, model, temperature, max_tokens) and returns an LLMResult,
+# raising RateLimitedError / LLMCallError like the built-in providers.
+ProviderFunction = Callable[[str, str, str, float, int], LLMResult]
+_registered_providers: dict[str, ProviderFunction] = {}
+
+
+def register_provider(name: str, call: ProviderFunction, context_window: int | None = None):
+    """
+    Register a provider for call_llm. It goes through the same rate limiting, retries, failover and
+    context window accounting as the built-in providers.
+    :param name: The provider name passed to call_llm
+    :type name: str
+
+    :param call: The function sending one request
+    :type call: ProviderFunction
+
+    :param context_window: The context window of its models (tokens)
+    :type context_window: int | None
+    """
+    name = name.lower()
+    _registered_providers[name] = call
+    if context_window:
+        PROVIDER_CONTEXT_WINDOWS[name] = context_window
+
+
+def unregister_provider(name: str):
+    _registered_providers.pop(name.lower(), None)
 
 
 def call_llm(
@@ -157,38 +273,140 @@ def call_llm(
         provider: str = "openai",
         model: str = "gpt-4o-mini",
         temperature: float = 0.7,
-        max_tokens: int = 8192
-) -> str:
+        max_tokens: int = 8192,
+        fallbacks: list[tuple[str, str]] | None = None,
+        hedge: bool | None = None
+) -> LLMResult:
     """
     [統一入口] 支援多種 LLM Provider
     Provider: 'openai', 'groq', 'google', 'ollama', 'mistral', 'deepseek'
+    每個 provider/model 都經過速率限制 (RPM/TPM + 同時請求數)，遇到 429 會自動等待重試
+    主要 Provider 失敗時依序切換到 fallbacks (預設為 Config.LLM_FALLBACKS)，
+    hedge=True 時若請求比平常慢，會同時送出備援請求並採用先完成的結果
+    回傳 LLMResult；失敗時 result.error 不為 None，呼叫端應停止後續流程 (或用 result.unwrap())
     """
-    provider = provider.lower()
+    primary = (provider.lower(), model)
+    if fallbacks is None:
+        fallbacks = config.LLM_FALLBACKS
+    routes = [primary] + [route for route in fallbacks if route != primary]
+
+    if hedge is None:
+        hedge = config.LLM_HEDGE_ENABLED
+
+    def attempt(route_provider: str, route_model: str) -> LLMResult:
+        return _call_with_limits(system_prompt, user_prompt, route_provider, route_model, temperature, max_tokens)
+
+    started = time.monotonic()
+    try:
+        result = call_with_failover(attempt, routes, hedge=hedge)
+    except LLMCallError as e:
+        return LLMResult(provider=primary[0], model=primary[1], latency=time.monotonic() - started,
+                         error=str(e), error_class=type(e.__cause__ or e).__name__)
+
+    result.latency = time.monotonic() - started
+    if result.truncated:
+        print(f"[LLM Warning] {result.provider}/{result.model} 輸出達到 max_tokens 上限，內容可能被截斷")
+    return result
+
+
+def _call_with_limits(
+        system_prompt: str,
+        user_prompt: str,
+        provider: str,
+        model: str,
+        temperature: float,
+        max_tokens: int
+) -> LLMResult:
+    """
+    Send the request through the rate limiter of the provider/model, retrying on HTTP 429,
+    connection errors and HTTP 5xx.
+    """
+    limiter = get_rate_limiter(provider, model)
+    estimated_tokens = (estimate_tokens(system_prompt) + estimate_tokens(user_prompt)
+                        + min(max_tokens, config.LLM_COMPLETION_TOKEN_ESTIMATE))
+
+    def attempt() -> LLMResult:
+        with limiter.slot(estimated_tokens):
+            try:
+                return _dispatch_llm(system_prompt, user_prompt, provider, model, temperature, max_tokens)
+            except RateLimitedError as e:
+                print(f"[LLM Rate Limit] Provider: {provider}, Retry-After: {e.retry_after}")
+                if e.retry_after:
+                    # Hold back every caller of this provider/model, not only this one
+                    limiter.penalize(e.retry_after)
+                raise
+            except TransientLLMError as e:
+                print(f"[LLM Retry] Provider: {provider}, Error: {e}")
+                raise
+
+    retryer = Retrying(
+        retry=retry_if_exception_type((RateLimitedError, TransientLLMError)),
+        stop=_stop_retrying,
+        wait=_wait_for_retry,
+        reraise=True
+    )
+
+    try:
+        return retryer(attempt)
+    except (RateLimitedError, TransientLLMError) as e:
+        print(f"[LLM Call Error] Provider: {provider}, failed after retries: {e}")
+        raise LLMCallError(f"LLM Call Error ({provider}): {str(e)}") from e
+
+
+def _dispatch_llm(
+        system_prompt: str,
+        user_prompt: str,
+        provider: str,
+        model: str,
+        temperature: float,
+        max_tokens: int
+) -> LLMResult:
+    """
+    Send one request to the provider. Raise RateLimitedError on HTTP 429, TransientLLMError on
+    connection errors / HTTP 5xx of the OpenAI compatible providers and LLMCallError on other errors.
+    max_tokens is shrunk to what is left of the context window of the model, so the prompt is never cut silently.
+    """
+    if provider in ["google", "gemini"] and model.startswith("gpt"):
+        model = "gemini-2.5-flash"
+
+    prompt_tokens = count_tokens(system_prompt) + count_tokens(user_prompt)
+    max_tokens = fit_max_tokens(provider, model, prompt_tokens, max_tokens)
+    if max_tokens <= 0:
+        raise LLMCallError(f"Error: Prompt (~{prompt_tokens} tokens) 超出 {provider}/{model} 的 context window")
+
+    registered = _registered_providers.get(provider)
+    if registered is not None:
+        return registered(system_prompt, user_prompt, model, temperature, max_tokens)
 
     # --- Case 1: Google Gemini ---
     if provider in ["google", "gemini"]:
-        if model.startswith("gpt"):
-            model = "gemini-2.5-flash"
         return call_google_gemini(system_prompt, user_prompt, model, temperature, max_tokens=max_tokens)
 
     # --- Case 2: Ollama (Local) ---
     if provider == "ollama":
-        return call_ollama(system_prompt, user_prompt, model, temperature, num_ctx=8192)
+        num_ctx = ollama_num_ctx(prompt_tokens + max_tokens)
+        return call_ollama(system_prompt, user_prompt, model, temperature, num_ctx=num_ctx, max_tokens=max_tokens)
 
     # --- Case 3: OpenAI Compatible APIs (OpenAI, Groq, Mistral, DeepSeek) ---
     openai_config = get_client_config(provider)
     if not openai_config:
-        return f"Error: 不支援的 Provider '{provider}'"
+        raise LLMCallError(f"Error: 不支援的 Provider '{provider}'")
 
     api_key = openai_config.get("api_key")
     base_url = openai_config.get("base_url")
 
     if not api_key:
-        return f"Error: 請在 .env 設定 {provider.upper()}_API_KEY"
+        raise LLMCallError(f"Error: 請在 .env 設定 {provider.upper()}_API_KEY")
 
     try:
-        # 初始化 OpenAI Client
-        client = openai.OpenAI(api_key=api_key, base_url=base_url)
+        # 初始化 OpenAI Client (重試由 call_llm 統一處理，連線錯誤與 5xx 轉成 TransientLLMError)
+        client = openai.OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+
+        # 固定的 system prompt 放在最前面，動態內容放在 user message，讓 provider 的 prompt cache 可以命中
+        extra_args = {}
+        if provider == "openai":
+            # Requests with the same key are routed to the same cache
+            extra_args["prompt_cache_key"] = prompt_cache_key(system_prompt)
 
         response = client.chat.completions.create(
             model=model,
@@ -198,13 +416,35 @@ def call_llm(
             ],
             temperature=temperature,
             timeout=600,  # 強制設定 600秒 超時
-            max_tokens=max_tokens  # 強制設定最大 Token 數
+            max_tokens=max_tokens,  # 強制設定最大 Token 數
+            **extra_args
         )
-        return response.choices[0].message.content
-
+        choice = response.choices[0]
+        usage = {}
+        if response.usage:
+            usage = {
+                "prompt_tokens": response.usage.prompt_tokens,
+                "completion_tokens": response.usage.completion_tokens,
+                "total_tokens": response.usage.total_tokens,
+            }
+            details = getattr(response.usage, "prompt_tokens_details", None)
+            if details is not None and getattr(details, "cached_tokens", None) is not None:
+                usage["cached_tokens"] = details.cached_tokens
+        return LLMResult(content=choice.message.content or "", provider=provider, model=model,
+                         finish_reason=choice.finish_reason, usage=usage)
+
+    except openai.RateLimitError as e:
+        # 額度用完 (insufficient_quota) 重試也沒用
+        if getattr(e, "code", None) == "insufficient_quota":
+            print(f"[LLM Call Error] Provider: {provider}, Error: {e}")
+            raise LLMCallError(f"LLM Call Error ({provider}): {str(e)}") from e
+        raise RateLimitedError(str(e), retry_after=parse_retry_after(e.response.headers)) from e
+    except (openai.APIConnectionError, openai.InternalServerError) as e:
+        # 連線失敗、逾時 (APITimeoutError) 與 5xx 通常是暫時的，交給 call_llm 重試
+        raise TransientLLMError(f"LLM Call Error ({provider}): {str(e)}") from e
     except KeyError as e:
         print(f"[LLM Config Error] Missing key: {e}")
-        return f"Configuration Error: Missing key {str(e)}"
+        raise LLMCallError(f"Configuration Error: Missing key {str(e)}") from e
     except Exception as e:
         print(f"[LLM Call Error] Provider: {provider}, Error: {e}")
-        return f"LLM Call Error ({provider}): {str(e)}"
\ No newline at end of file
+        raise LLMCallError(f"LLM Call Error ({provider}): {str(e)}") from e
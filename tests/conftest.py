@@ -0,0 +1,49 @@
+import os
+import sys
+
+import pytest
+
+# The modules import each other from the repository root (from config import config, from src...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config  # noqa: E402
+from src.llm.result import LLMResult  # noqa: E402
+from src.utils import register_provider, unregister_provider  # noqa: E402
+
+
+@pytest.fixture
+def fast_retries(monkeypatch):
+    """Retry without waiting, so the retry tests do not sleep through the real backoff."""
+    monkeypatch.setattr(config, "LLM_BACKOFF_MAX_SECONDS", 0.0)
+    monkeypatch.setattr(config, "LLM_FALLBACKS", [])
+    monkeypatch.setattr(config, "LLM_HEDGE_ENABLED", False)
+
+
+@pytest.fixture
+def fake_provider(request):
+    """
+    Register a provider for call_llm answering from a list of steps: an exception is raised, a string is returned
+    as the content. The calls are recorded in provider.calls. Each test gets its own provider name, so the rate
+    limiters (kept per provider / model) are not shared between tests.
+    """
+    providers = []
+
+    def register(*steps):
+        name = f"fake-{request.node.name}-{len(providers)}".lower()
+
+        def call(system_prompt: str, user_prompt: str, model: str, temperature: float, max_tokens: int):
+            call.calls.append(model)
+            step = steps[min(len(call.calls), len(steps)) - 1]
+            if isinstance(step, Exception):
+                raise step
+            return LLMResult(content=step, provider=name, model=model, finish_reason="stop")
+
+        call.calls = []
+        call.name = name
+        register_provider(name, call, context_window=128000)
+        providers.append(name)
+        return call
+
+    yield register
+    for name in providers:
+        unregister_provider(name)
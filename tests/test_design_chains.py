@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from src.design.chains import parse_design_response, run_design_phase, validate_design
+from src.llm.errors import LLMCallError
+
+
+VALID_GDD = json.dumps({
+    "title": "Snake",
+    "core_loop": "Eat apples to grow, do not hit the walls.",
+    "controls": [{"input": "Arrow Keys", "action": "Turn"}],
+    "entities": [{"name": "Apple", "description": "Grows the snake"}],
+    "loss_conditions": ["The snake hits a wall"],
+})
+
+
+def test_a_valid_gdd_needs_no_repair_call(fast_retries, fake_provider):
+    provider = fake_provider("unused")
+
+    gdd = validate_design(f"```json\n{VALID_GDD}\n```", provider.name, "m", fallbacks=[])
+
+    assert gdd.title == "Snake" and gdd.structured
+    assert provider.calls == []
+
+
+def test_invalid_json_triggers_exactly_one_repair_call(fast_retries, fake_provider):
+    provider = fake_provider(VALID_GDD)
+
+    gdd = validate_design('{"title": "Snake", "core_loop": ', provider.name, "m", fallbacks=[])
+
+    assert gdd.title == "Snake" and gdd.structured
+    assert len(provider.calls) == 1
+
+
+def test_missing_fields_trigger_a_repair_call(fast_retries, fake_provider):
+    provider = fake_provider(VALID_GDD)
+
+    gdd = validate_design('{"title": "Snake"}', provider.name, "m", fallbacks=[])
+
+    assert gdd.validate() == []
+    assert len(provider.calls) == 1
+
+
+def test_a_failed_repair_keeps_the_answer_as_raw_text(fast_retries, fake_provider):
+    provider = fake_provider("still not json")
+
+    gdd = validate_design("## Snake\nEat apples", provider.name, "m", fallbacks=[])
+
+    assert not gdd.structured and gdd.raw == "## Snake\nEat apples"
+    assert len(provider.calls) == 1
+
+
+def test_a_failed_repair_call_raises(fast_retries, fake_provider):
+    provider = fake_provider(LLMCallError("down"))
+
+    with pytest.raises(LLMCallError):
+        validate_design("not json", provider.name, "m", fallbacks=[])
+
+
+def test_parse_design_response_splits_the_analysis_and_the_gdd():
+    response = json.dumps({"analysis": "A classic.", "gdd": json.loads(VALID_GDD)})
+
+    analysis, gdd_text = parse_design_response(f"```json\n{response}\n```")
+
+    assert analysis == "A classic."
+    assert json.loads(gdd_text)["title"] == "Snake"
+
+
+def test_parse_design_response_without_gdd_field_returns_the_whole_answer():
+    assert parse_design_response(VALID_GDD) == ("", VALID_GDD)
+    assert parse_design_response("plain text") == ("", "plain text")
+
+
+@pytest.mark.parametrize("mode,calls", [("two_step", 2), ("single", 1)])
+def test_design_modes(fast_retries, fake_provider, mode, calls):
+    if mode == "single":
+        provider = fake_provider(json.dumps({"analysis": "A classic.", "gdd": json.loads(VALID_GDD)}))
+    else:
+        provider = fake_provider("A classic snake game.", VALID_GDD)
+
+    gdd = run_design_phase("a snake game", provider.name, "m", mode=mode, fallbacks=[])
+
+    assert gdd.title == "Snake"
+    assert len(provider.calls) == calls
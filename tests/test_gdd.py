@@ -0,0 +1,106 @@
+import json
+
+import pytest
+
+from src.design.gdd import REQUIRED_STATES, GameDesign
+
+
+VALID_GDD = {
+    "title": "Paddle Bounce",
+    "core_loop": "Keep the ball in play with the paddle.",
+    "states": ["START", "PLAYING", "PAUSED", "GAME_OVER"],
+    "controls": [{"input": "Left / Right Arrow Keys", "action": "Move the paddle"}],
+    "constraints": ["The paddle stays inside the screen"],
+    "entities": [{"name": "Ball", "description": "Bounces off the walls"}],
+    "win_conditions": ["Bounce the ball 20 times"],
+    "loss_conditions": ["The ball falls below the paddle"],
+}
+
+
+def test_from_json_parses_every_field():
+    gdd = GameDesign.from_json(json.dumps(VALID_GDD))
+
+    assert gdd.structured and gdd.validate() == []
+    assert gdd.title == "Paddle Bounce"
+    assert gdd.controls == [{"input": "Left / Right Arrow Keys", "action": "Move the paddle"}]
+    assert gdd.states == ["START", "PLAYING", "GAME_OVER", "PAUSED"]
+
+
+def test_from_json_accepts_fenced_json_inside_prose():
+    text = f"Here is the GDD:\n```json\n{json.dumps(VALID_GDD, indent=2)}\n```\nGood luck!"
+
+    assert GameDesign.from_json(text).title == "Paddle Bounce"
+
+
+def test_from_json_accepts_raw_newlines_inside_strings():
+    text = '{"title": "Snake", "core_loop": "Eat apples.\nGrow longer."}'
+
+    assert GameDesign.from_json(text).core_loop == "Eat apples.\nGrow longer."
+
+
+@pytest.mark.parametrize("text", ["no json here", '{"title": "Snake",', "[1, 2]"])
+def test_from_json_rejects_text_without_a_json_object(text):
+    with pytest.raises(ValueError):
+        GameDesign.from_json(text)
+
+
+def test_missing_fields_get_defaults_and_are_reported():
+    gdd = GameDesign.from_json('{"title": "Snake"}')
+
+    assert gdd.states == REQUIRED_STATES
+    assert gdd.controls == [] and gdd.entities == []
+    assert set(gdd.validate()) == {"core_loop is empty", "controls is empty", "entities is empty",
+                                   "win_conditions and loss_conditions are both empty"}
+
+
+def test_loose_types_are_coerced():
+    gdd = GameDesign.from_dict({
+        "title": "Snake",
+        "states": "playing",
+        "controls": ["Arrow Keys → Turn", {"key": "Space", "description": "Pause"}],
+        "entities": "Apple: grows the snake",
+        "win_conditions": "Reach 50 points",
+    })
+
+    assert gdd.states == ["START", "PLAYING", "GAME_OVER"]
+    assert gdd.controls == [{"input": "Arrow Keys", "action": "Turn"}, {"input": "Space", "action": "Pause"}]
+    assert gdd.entities == [{"name": "Apple", "description": "grows the snake"}]
+    assert gdd.win_conditions == ["Reach 50 points"]
+
+
+def test_coerce_keeps_a_markdown_gdd_as_raw():
+    gdd = GameDesign.coerce("### Game Title\nSnake")
+
+    assert not gdd.structured
+    assert gdd.for_stage("code") == "### Game Title\nSnake"
+    assert GameDesign.coerce(gdd.to_json()).raw == gdd.raw
+
+
+def test_json_round_trip():
+    gdd = GameDesign.from_dict(VALID_GDD)
+
+    assert GameDesign.coerce(gdd.to_json()) == gdd
+    assert GameDesign.coerce(gdd.to_dict()) == gdd
+
+
+def test_for_stage_only_renders_the_fields_of_the_stage():
+    gdd = GameDesign.from_dict(VALID_GDD)
+
+    assets = gdd.for_stage("assets")
+    assert "Paddle Bounce" in assets and "Ball" in assets
+    assert "Arrow Keys" not in assets and "Bounce the ball 20 times" not in assets
+
+    fuzzer = gdd.for_stage("fuzzer")
+    assert "Arrow Keys" in fuzzer and "Limit: The paddle stays inside the screen" in fuzzer
+    assert "Paddle Bounce" not in fuzzer and "Bounces off the walls" not in fuzzer
+
+    retrieval = gdd.for_stage("retrieval")
+    assert "Keep the ball in play" in retrieval
+    assert "Limit:" not in retrieval and "Win:" not in retrieval
+
+
+def test_for_stage_of_an_unknown_stage_renders_everything():
+    gdd = GameDesign.from_dict(VALID_GDD)
+
+    assert gdd.for_stage("unknown") == gdd.to_markdown()
+    assert all(part in gdd.to_markdown() for part in ("Paddle Bounce", "PAUSED", "Win:", "Lose:", "Limit:"))
@@ -0,0 +1,223 @@
+import os
+import socket
+import threading
+import time
+from contextlib import closing
+
+import pytest
+
+from src.jobs import worker
+from src.jobs.job_queue import (JOB_FAILED, JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED, JobQueue, _PROCESS_TOKEN,
+                                process_owner)
+from src.jobs.worker import WorkerPool
+
+
+@pytest.fixture
+def job_queue(tmp_path, monkeypatch):
+    """A JobQueue on a temporary JOB_DB_PATH, also returned by get_job_queue."""
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), lease_seconds=0.2)
+    monkeypatch.setattr(worker, "_job_queue", queue)
+    return queue
+
+
+def set_running(job_queue: JobQueue, job_id: str, owner: str, heartbeat_at: float):
+    with closing(job_queue._connect()) as conn:
+        conn.execute("UPDATE jobs SET status = ?, owner = ?, started_at = ?, heartbeat_at = ? WHERE id = ?",
+                     (JOB_RUNNING, owner, heartbeat_at, heartbeat_at, job_id))
+
+
+def test_claim_takes_the_oldest_job_and_leases_it(job_queue):
+    first = job_queue.submit("generate", {"n": 1})
+    job_queue.submit("generate", {"n": 2})
+
+    job = job_queue.claim()
+
+    assert job.id == first and job.payload == {"n": 1}
+    assert job.status == JOB_RUNNING and job.owner == process_owner() and job.attempt == 1
+    stored = job_queue.get(first)
+    assert stored.status == JOB_RUNNING and stored.heartbeat_at == job.heartbeat_at
+
+
+def test_claim_on_an_empty_queue(job_queue):
+    assert job_queue.claim() is None
+
+
+def test_heartbeat_renews_the_lease(job_queue):
+    job_id = job_queue.submit("generate", {})
+    job_queue.claim()
+    time.sleep(0.15)
+
+    assert job_queue.heartbeat([job_id]) == 1
+    time.sleep(0.1)
+
+    # 0.25s after the claim, but only 0.1s after the heartbeat
+    assert job_queue.requeue_expired() == 0
+    assert job_queue.get(job_id).status == JOB_RUNNING
+
+
+def test_heartbeat_ignores_jobs_of_other_owners(job_queue):
+    job_id = job_queue.submit("generate", {})
+    set_running(job_queue, job_id, "other-host:1:token", time.time())
+
+    assert job_queue.heartbeat([job_id]) == 0
+
+
+def test_requeue_expired_puts_the_job_back(job_queue):
+    job_id = job_queue.submit("generate", {})
+    job_queue.claim()
+    time.sleep(0.25)
+
+    assert job_queue.requeue_expired() == 1
+    job = job_queue.get(job_id)
+    assert job.status == JOB_QUEUED and job.owner is None
+
+    # The next claim is a new attempt
+    assert job_queue.claim().attempt == 2
+
+
+def test_requeue_dead_owners_does_not_wait_for_the_lease(job_queue):
+    dead = job_queue.submit("generate", {})
+    alive = job_queue.submit("generate", {})
+    remote = job_queue.submit("generate", {})
+    now = time.time()
+    # Same pid as this process but another token: the process before a restart (e.g. pid 1 in a container)
+    set_running(job_queue, dead, f"{socket.gethostname()}:{os.getpid()}:not-{_PROCESS_TOKEN}", now)
+    set_running(job_queue, alive, process_owner(), now)
+    set_running(job_queue, remote, f"not-{socket.gethostname()}:{os.getpid()}:token", now)
+
+    assert job_queue.requeue_dead_owners() == 1
+    assert [job_queue.get(job_id).status for job_id in (dead, alive, remote)] == [JOB_QUEUED, JOB_RUNNING,
+                                                                                 JOB_RUNNING]
+
+
+def test_dedupe_key_returns_the_queued_or_running_job(job_queue):
+    job_id = job_queue.submit("fix", {}, dedupe_key="run-1")
+
+    assert job_queue.submit("fix", {}, dedupe_key="run-1") == job_id
+    job_queue.claim()
+    assert job_queue.submit("fix", {}, dedupe_key="run-1") == job_id
+    # Another kind or key is a new job
+    assert job_queue.submit("generate", {}, dedupe_key="run-1") != job_id
+    assert job_queue.submit("fix", {}, dedupe_key="run-2") != job_id
+
+
+def test_dedupe_key_requeues_an_expired_running_job(job_queue):
+    job_id = job_queue.submit("fix", {}, dedupe_key="run-1")
+    job_queue.claim()
+    time.sleep(0.25)
+
+    assert job_queue.submit("fix", {}, dedupe_key="run-1") == job_id
+    assert job_queue.get(job_id).status == JOB_QUEUED
+
+
+def test_dedupe_key_of_a_finished_job_adds_a_new_job(job_queue):
+    job_id = job_queue.submit("fix", {}, dedupe_key="run-1")
+    job_queue.complete(job_queue.claim(), {})
+
+    assert job_queue.submit("fix", {}, dedupe_key="run-1") != job_id
+
+
+def test_only_the_current_attempt_finishes_the_job(job_queue):
+    job_id = job_queue.submit("generate", {})
+    stale = job_queue.claim()
+    time.sleep(0.25)
+    job_queue.requeue_expired()
+    current = job_queue.claim()
+
+    assert not job_queue.complete(stale, {"from": "stale"})
+    assert not job_queue.fail(stale, "stale")
+    assert job_queue.get(job_id).status == JOB_RUNNING
+
+    assert job_queue.complete(current, {"from": "current"})
+    assert job_queue.get(job_id).result == {"from": "current"}
+
+
+def test_events_since_resumes_after_last_event_id(job_queue):
+    job_id = job_queue.submit("generate", {})
+    job_queue.claim()
+    for message in ("one", "two", "three"):
+        job_queue.add_event(job_id, message)
+
+    assert job_queue.events_since(job_id) == [(1, "one"), (2, "two"), (3, "three")]
+    assert job_queue.events_since(job_id, 2) == [(3, "three")]
+    assert job_queue.events_since(job_id, 3) == []
+
+
+def test_events_since_only_streams_the_current_attempt(job_queue):
+    job_id = job_queue.submit("generate", {})
+    first = job_queue.claim()
+    job_queue.add_event(job_id, "first attempt", attempt=first.attempt)
+    time.sleep(0.25)
+    job_queue.requeue_expired()
+    second = job_queue.claim()
+    job_queue.add_event(job_id, "late output of the first attempt", attempt=first.attempt)
+    job_queue.add_event(job_id, "second attempt", attempt=second.attempt)
+
+    assert job_queue.events_since(job_id) == [(3, "second attempt")]
+    # A stream which already showed the first attempt continues with the second one
+    assert job_queue.events_since(job_id, 1) == [(3, "second attempt")]
+
+
+def test_job_stream_continues_from_last_event_id(job_queue):
+    pytest.importorskip("flask")
+    from src.frontend.frontend import app
+
+    job_id = job_queue.submit("generate", {})
+    job = job_queue.claim()
+    for message in ("one", "two"):
+        job_queue.add_event(job_id, message)
+    job_queue.complete(job, {})
+
+    response = app.test_client().get(f"/jobs/{job_id}/stream", headers={"Last-Event-ID": "1"})
+
+    body = response.get_data(as_text=True)
+    assert "two" in body and "one" not in body
+    assert "JOB_DONE" in body
+
+
+def test_worker_pool_runs_the_job_and_records_its_events(job_queue):
+    done = threading.Event()
+
+    def handler(job, emit):
+        emit(f"working on {job.payload['n']}")
+        done.set()
+        return {"n": job.payload["n"]}
+
+    def failing(job, emit):
+        raise RuntimeError("boom")
+
+    pool = WorkerPool(job_queue, {"ok": handler, "bad": failing}, num_workers=1, poll_interval=0.05,
+                      heartbeat_interval=0.05)
+    ok_id = job_queue.submit("ok", {"n": 7})
+    bad_id = job_queue.submit("bad", {})
+    pool.start()
+    try:
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline and not (job_queue.get(ok_id).finished and job_queue.get(bad_id).finished):
+            time.sleep(0.05)
+    finally:
+        pool.stop()
+
+    assert done.is_set()
+    assert job_queue.get(ok_id).status == JOB_SUCCEEDED and job_queue.get(ok_id).result == {"n": 7}
+    assert job_queue.events_since(ok_id) == [(1, "working on 7")]
+    assert job_queue.get(bad_id).status == JOB_FAILED and job_queue.get(bad_id).error == "boom"
+
+
+def test_worker_pool_keeps_the_lease_of_a_long_job(job_queue):
+    def slow(job, emit):
+        time.sleep(0.6)  # three times the lease
+        return {}
+
+    pool = WorkerPool(job_queue, {"slow": slow}, num_workers=1, poll_interval=0.05, heartbeat_interval=0.05)
+    job_id = job_queue.submit("slow", {})
+    pool.start()
+    try:
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline and not job_queue.get(job_id).finished:
+            time.sleep(0.05)
+    finally:
+        pool.stop()
+
+    job = job_queue.get(job_id)
+    assert job.status == JOB_SUCCEEDED and job.attempt == 1
@@ -0,0 +1,107 @@
+import time
+
+import pytest
+
+from config import config
+from src.llm.errors import LLMCallError, RateLimitedError, TransientLLMError
+from src.llm.router import call_with_failover
+from src.utils import call_llm
+
+
+def test_rate_limited_call_is_retried_until_it_succeeds(fast_retries, fake_provider):
+    provider = fake_provider(RateLimitedError("429"), RateLimitedError("429"), "ok")
+
+    result = call_llm("system", "user", provider=provider.name, model="m", fallbacks=[])
+
+    assert result.ok and result.content == "ok"
+    assert len(provider.calls) == 3
+
+
+def test_rate_limited_call_stops_after_llm_max_retries(fast_retries, fake_provider, monkeypatch):
+    monkeypatch.setattr(config, "LLM_MAX_RETRIES", 3)
+    provider = fake_provider(RateLimitedError("429"))
+
+    result = call_llm("system", "user", provider=provider.name, model="m", fallbacks=[])
+
+    assert not result.ok
+    assert len(provider.calls) == 4
+
+
+def test_transient_error_stops_after_llm_transient_retries(fast_retries, fake_provider, monkeypatch):
+    monkeypatch.setattr(config, "LLM_MAX_RETRIES", 5)
+    monkeypatch.setattr(config, "LLM_TRANSIENT_RETRIES", 2)
+    provider = fake_provider(TransientLLMError("connection reset"))
+
+    result = call_llm("system", "user", provider=provider.name, model="m", fallbacks=[])
+
+    assert not result.ok and "connection reset" in result.error
+    assert len(provider.calls) == 3
+
+
+def test_transient_error_is_retried_until_it_succeeds(fast_retries, fake_provider):
+    provider = fake_provider(TransientLLMError("502"), "ok")
+
+    result = call_llm("system", "user", provider=provider.name, model="m", fallbacks=[])
+
+    assert result.ok and result.content == "ok"
+    assert len(provider.calls) == 2
+
+
+def test_other_errors_are_not_retried(fast_retries, fake_provider):
+    provider = fake_provider(LLMCallError("invalid api key"))
+
+    result = call_llm("system", "user", provider=provider.name, model="m", fallbacks=[])
+
+    assert not result.ok
+    assert len(provider.calls) == 1
+
+
+def test_call_llm_fails_over_to_the_fallback_provider(fast_retries, fake_provider):
+    primary = fake_provider(LLMCallError("down"))
+    fallback = fake_provider("from fallback")
+
+    result = call_llm("system", "user", provider=primary.name, model="m", fallbacks=[(fallback.name, "f")])
+
+    assert result.ok and result.content == "from fallback"
+    assert result.provider == fallback.name
+    assert (len(primary.calls), fallback.calls) == (1, ["f"])
+
+
+def test_call_llm_reports_the_error_when_every_provider_fails(fast_retries, fake_provider):
+    primary = fake_provider(LLMCallError("primary down"))
+    fallback = fake_provider(LLMCallError("fallback down"))
+
+    result = call_llm("system", "user", provider=primary.name, model="m", fallbacks=[(fallback.name, "f")])
+
+    assert not result.ok and "fallback down" in result.error
+    assert result.provider == primary.name
+
+
+def test_call_with_failover_tries_the_routes_in_order():
+    attempts = []
+
+    def attempt(provider: str, model: str) -> str:
+        attempts.append(provider)
+        if provider != "c":
+            raise LLMCallError(f"{provider} down")
+        return f"{provider}/{model}"
+
+    assert call_with_failover(attempt, [("a", "m"), ("b", "m"), ("c", "m"), ("d", "m")]) == "c/m"
+    assert attempts == ["a", "b", "c"]
+
+
+def test_call_with_failover_without_routes():
+    with pytest.raises(LLMCallError):
+        call_with_failover(lambda provider, model: "unused", [])
+
+
+def test_hedged_call_returns_the_first_success(monkeypatch):
+    monkeypatch.setattr(config, "LLM_HEDGE_DEFAULT_DELAY", 0.01)
+    monkeypatch.setattr(config, "LLM_HEDGE_MIN_DELAY", 0.01)
+
+    def attempt(provider: str, model: str) -> str:
+        if provider == "slow":
+            time.sleep(0.5)
+        return provider
+
+    assert call_with_failover(attempt, [("slow", "m"), ("fast", "m")], hedge=True) == "fast"
@@ -0,0 +1,88 @@
+import time
+
+import pytest
+
+from src.llm.errors import RateLimitedError
+from src.llm.rate_limiter import ProviderLimiter, TokenBucket, get_rate_limiter, parse_retry_after
+from src.utils import call_llm
+
+
+def test_token_bucket_admits_up_to_capacity_without_waiting():
+    bucket = TokenBucket(capacity=3, per_minute=60)
+    now = bucket.updated_at
+
+    assert [bucket.reserve(1, now) for _ in range(3)] == [0.0, 0.0, 0.0]
+
+
+def test_token_bucket_waits_for_the_refill_of_the_missing_tokens():
+    bucket = TokenBucket(capacity=2, per_minute=60)  # 1 token per second
+    now = bucket.updated_at
+    bucket.reserve(2, now)
+
+    assert bucket.reserve(1, now) == pytest.approx(1.0)
+    # The next caller queues behind the reservation of the previous one
+    assert bucket.reserve(1, now) == pytest.approx(2.0)
+
+
+def test_token_bucket_refills_over_time_up_to_capacity():
+    bucket = TokenBucket(capacity=2, per_minute=60)
+    now = bucket.updated_at
+    bucket.reserve(2, now)
+
+    assert bucket.reserve(1, now + 1.0) == 0.0
+    # A long pause never refills more than the capacity
+    assert bucket.reserve(2, now + 100.0) == 0.0
+    assert bucket.reserve(1, now + 100.0) > 0.0
+
+
+def test_token_bucket_caps_a_reservation_at_the_capacity():
+    bucket = TokenBucket(capacity=10, per_minute=600)
+
+    assert bucket.reserve(1000, bucket.updated_at) == 0.0
+
+
+def test_provider_limiter_without_limits_never_waits():
+    limiter = ProviderLimiter(rpm=0, tpm=0, concurrency=None)
+
+    started = time.monotonic()
+    for _ in range(100):
+        with limiter.slot(10_000):
+            pass
+    assert time.monotonic() - started < 0.5
+
+
+def test_provider_limiter_token_limit_delays_the_next_request():
+    limiter = ProviderLimiter(rpm=0, tpm=600, concurrency=None)  # 10 tokens per second
+
+    assert limiter._reserve(600) == 0.0
+    assert limiter._reserve(5) == pytest.approx(0.5, abs=0.05)
+
+
+def test_penalize_blocks_the_limiter_for_retry_after():
+    limiter = ProviderLimiter(rpm=0, tpm=0, concurrency=None)
+    limiter.penalize(0.2)
+
+    assert limiter._reserve(1) == pytest.approx(0.2, abs=0.05)
+    # A shorter Retry-After does not shorten an active block
+    limiter.penalize(0.01)
+    assert limiter._reserve(1) > 0.1
+
+
+def test_429_penalizes_the_limiter_of_the_provider(fast_retries, fake_provider):
+    provider = fake_provider(RateLimitedError("429", retry_after=0.2), "ok")
+
+    started = time.monotonic()
+    result = call_llm("system", "user", provider=provider.name, model="m", fallbacks=[], hedge=False)
+
+    assert result.ok and result.content == "ok"
+    assert len(provider.calls) == 2
+    # The retry waited for the Retry-After through the limiter shared by every caller of the model
+    assert time.monotonic() - started >= 0.2
+    assert get_rate_limiter(provider.name, "m").blocked_until > 0
+
+
+def test_parse_retry_after():
+    assert parse_retry_after({"retry-after": "2.5"}) == 2.5
+    assert parse_retry_after({"Retry-After": "-1"}) == 0.0
+    assert parse_retry_after({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}) is None
+    assert parse_retry_after(None) is None
@@ -0,0 +1,118 @@
+from config import config
+from src.llm.result import LLMResult
+from src.testing.scheduler import (CHECK_CONFORMANCE, CHECK_FUZZ, CHECK_ORDER, CHECK_REVIEW, CHECK_SYNTAX,
+                                   FixBudget, FixScheduler, code_hash, error_fingerprint)
+
+
+def test_stages_run_the_cheapest_checks_first(monkeypatch):
+    for parallel in (True, False):
+        monkeypatch.setattr(config, "FIX_PARALLEL_CHECKS", parallel)
+        stages = FixScheduler(FixBudget()).stages()
+
+        assert [check for stage in stages for check in stage] == list(CHECK_ORDER)
+    assert CHECK_ORDER == (CHECK_SYNTAX, CHECK_CONFORMANCE, CHECK_FUZZ, CHECK_REVIEW)
+
+
+def test_parallel_stages_only_group_the_fuzz_test_and_the_review(monkeypatch):
+    monkeypatch.setattr(config, "FIX_PARALLEL_CHECKS", True)
+    assert FixScheduler.stages() == ((CHECK_SYNTAX,), (CHECK_CONFORMANCE,), (CHECK_FUZZ, CHECK_REVIEW))
+
+    monkeypatch.setattr(config, "FIX_PARALLEL_CHECKS", False)
+    assert all(len(stage) == 1 for stage in FixScheduler.stages())
+
+
+def test_budget_stops_on_the_attempt_limit():
+    budget = FixBudget(max_seconds=0, max_tokens=0, max_attempts=2)
+    budget.attempts = 1
+    assert budget.exceeded() is None
+
+    budget.attempts = 2
+    assert "2" in budget.exceeded()
+
+
+def test_budget_stops_on_the_token_limit():
+    budget = FixBudget(max_seconds=0, max_tokens=1000, max_attempts=0)
+    budget.charge(LLMResult(usage={"prompt_tokens": 600, "completion_tokens": 300}))
+    assert budget.exceeded() is None and budget.remaining_tokens == 100
+
+    budget.charge(LLMResult(usage={"total_tokens": 100}))
+    assert budget.exceeded() is not None
+
+
+def test_budget_stops_on_the_wall_time_limit():
+    budget = FixBudget(max_seconds=60, max_tokens=0, max_attempts=0)
+    assert budget.exceeded() is None
+
+    budget.started -= 61
+    assert budget.exceeded() is not None
+
+
+def test_budget_zero_means_unlimited():
+    budget = FixBudget(max_seconds=0, max_tokens=0, max_attempts=0)
+    budget.attempts = 1000
+    budget.started -= 10_000
+    budget.tokens_used = 10 ** 9
+
+    assert budget.exceeded() is None
+
+
+def test_scheduler_does_not_start_a_fuzz_test_it_cannot_finish(monkeypatch):
+    monkeypatch.setattr(config, "FUZZER_RUNNING_TIME", 30)
+    scheduler = FixScheduler(FixBudget(max_seconds=60, max_tokens=0, max_attempts=0))
+    assert scheduler.can_afford_check(CHECK_FUZZ) is None
+
+    scheduler.budget.started -= 40
+    assert scheduler.can_afford_check(CHECK_FUZZ) is not None
+    # The other checks take no noticeable time
+    assert scheduler.can_afford_check(CHECK_SYNTAX) is None
+
+
+def test_scheduler_does_not_start_a_fix_it_cannot_pay_for():
+    code = "x = 1\n" * 200
+    scheduler = FixScheduler(FixBudget(max_seconds=0, max_tokens=10, max_attempts=0))
+
+    assert scheduler.can_afford_fix(code) is not None
+    assert FixScheduler(FixBudget(max_seconds=0, max_tokens=0, max_attempts=0)).can_afford_fix(code) is None
+
+
+def test_already_passed_is_per_code_version():
+    scheduler = FixScheduler(FixBudget())
+    scheduler.record_pass(CHECK_SYNTAX, code_hash("a"))
+
+    assert scheduler.already_passed(CHECK_SYNTAX, code_hash("a"))
+    assert not scheduler.already_passed(CHECK_SYNTAX, code_hash("b"))
+    assert not scheduler.already_passed(CHECK_FUZZ, code_hash("a"))
+
+
+def test_unchanged_since_failure_short_circuits_identical_code():
+    scheduler = FixScheduler(FixBudget())
+    failed = code_hash("broken = (")
+    scheduler.record_failure(CHECK_SYNTAX, failed, "SyntaxError")
+
+    assert scheduler.unchanged_since_failure(failed)
+    assert not scheduler.unchanged_since_failure(code_hash("fixed = ()"))
+
+
+def test_the_same_error_twice_stops_the_loop():
+    scheduler = FixScheduler(FixBudget())
+    zero_division = 'File "/tmp/{}/game.py", line {}: ZeroDivisionError'
+
+    assert scheduler.record_failure(CHECK_FUZZ, code_hash("v1"), zero_division.format("a", 10)) is None
+    assert scheduler.record_failure(CHECK_FUZZ, code_hash("v2"), 'File "/tmp/b/game.py", line 12: IndexError') is None
+    assert scheduler.record_failure(CHECK_FUZZ, code_hash("v3"), zero_division.format("c", 14)) is not None
+
+
+def test_fingerprint_ignores_paths_line_numbers_and_addresses():
+    first = error_fingerprint(CHECK_FUZZ, 'File "/tmp/run-1/game.py", line 42, in update\n'
+                                          "  AttributeError: <Player object at 0x7f3a2c1b0d90> after 1.52s")
+    second = error_fingerprint(CHECK_FUZZ, 'File "/tmp/run-2/game.py", line 57, in update\n'
+                                           "AttributeError:   <Player object at 0x7f99aa000010> after 3.07s")
+
+    assert first == second
+
+
+def test_fingerprint_tells_errors_and_checks_apart():
+    message = "ZeroDivisionError: division by zero"
+
+    assert error_fingerprint(CHECK_FUZZ, message) != error_fingerprint(CHECK_FUZZ, "IndexError: list index")
+    assert error_fingerprint(CHECK_FUZZ, message) != error_fingerprint(CHECK_REVIEW, message)
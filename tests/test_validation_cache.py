@@ -0,0 +1,95 @@
+import pytest
+
+from src.artifacts.store import ArtifactStore
+from src.testing import validation_cache
+from src.testing.scheduler import CHECK_CONFORMANCE, CHECK_FUZZ, CHECK_REVIEW, CHECK_SYNTAX
+from src.testing.validation_cache import ValidationCache, cacheable, check_version, validation_key
+
+
+CODE = "import pygame\n"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ValidationCache(ArtifactStore(str(tmp_path)), enabled=True)
+
+
+@pytest.fixture
+def prompt_digests():
+    validation_cache._prompt_digest.cache_clear()
+    yield
+    validation_cache._prompt_digest.cache_clear()
+
+
+def test_key_depends_on_the_check_the_code_and_the_inputs():
+    key = validation_key(CHECK_FUZZ, CODE, "logic", 5)
+
+    assert validation_key(CHECK_FUZZ, CODE, "logic", 5) == key
+    assert validation_key(CHECK_CONFORMANCE, CODE, "logic", 5) != key
+    assert validation_key(CHECK_FUZZ, CODE + "\n", "logic", 5) != key
+    assert validation_key(CHECK_FUZZ, CODE, "other logic", 5) != key
+    assert validation_key(CHECK_FUZZ, CODE, "logic", 10) != key
+
+
+def test_key_changes_with_the_check_version(monkeypatch):
+    key = validation_key(CHECK_SYNTAX, CODE)
+    monkeypatch.setitem(validation_cache.CHECK_VERSIONS, CHECK_SYNTAX, "2")
+
+    assert validation_key(CHECK_SYNTAX, CODE) != key
+
+
+def test_key_of_harness_checks_changes_with_the_harness(monkeypatch):
+    keys = {check: validation_key(check, CODE) for check in (CHECK_SYNTAX, CHECK_FUZZ, CHECK_CONFORMANCE)}
+    monkeypatch.setattr(validation_cache, "_harness_digest", lambda: "another-harness")
+
+    assert validation_key(CHECK_FUZZ, CODE) != keys[CHECK_FUZZ]
+    assert validation_key(CHECK_CONFORMANCE, CODE) != keys[CHECK_CONFORMANCE]
+    assert validation_key(CHECK_SYNTAX, CODE) == keys[CHECK_SYNTAX]
+
+
+def test_key_of_the_review_changes_with_its_prompt(monkeypatch, prompt_digests):
+    key = validation_key(CHECK_REVIEW, CODE, "openai", "gpt-4o-mini")
+    version = check_version(CHECK_REVIEW)
+    validation_cache._prompt_digest.cache_clear()
+    prompt, prompt_input = validation_cache.PROMPT_CHECKS[CHECK_REVIEW]
+    monkeypatch.setitem(validation_cache.PROMPT_CHECKS, CHECK_REVIEW, (prompt + "\nNew rule.", prompt_input))
+
+    assert check_version(CHECK_REVIEW) != version
+    assert validation_key(CHECK_REVIEW, CODE, "openai", "gpt-4o-mini") != key
+
+
+def test_cacheable_rejects_timed_out_and_frozen_runs():
+    assert cacheable({"passed": True, "message": "ok", "report": {"status": "time_up"}})
+    assert cacheable({"passed": False, "message": "Runtime Error", "report": {"status": "crashed"}})
+
+    assert not cacheable({"passed": False, "message": "hang", "report": {"timed_out": True}})
+    assert not cacheable({"passed": False, "message": "frozen", "report": {"status": "frozen"}})
+
+
+def test_cacheable_rejects_checks_which_could_not_run():
+    assert not cacheable({"passed": False, "message": "Fuzz Test Failed to Run: no python"})
+    assert not cacheable({"passed": False, "message": "File not found: game.py"})
+
+
+def test_cache_round_trip(cache):
+    key = validation_key(CHECK_FUZZ, CODE)
+    verdict = {"passed": False, "message": "Runtime Error", "report": {"status": "crashed"}}
+
+    assert cache.get(key) is None
+    cache.put(key, verdict)
+    assert cache.get(key) == verdict
+
+
+def test_cache_does_not_store_uncacheable_verdicts(cache):
+    key = validation_key(CHECK_FUZZ, CODE)
+    cache.put(key, {"passed": False, "message": "hang", "report": {"timed_out": True}})
+
+    assert cache.get(key) is None
+
+
+def test_disabled_cache(tmp_path):
+    cache = ValidationCache(ArtifactStore(str(tmp_path)), enabled=False)
+    key = validation_key(CHECK_SYNTAX, CODE)
+    cache.put(key, {"passed": True, "message": "ok"})
+
+    assert cache.get(key) is None